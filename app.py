@@ -1,46 +1,143 @@
-from flask import Flask, render_template
-from flask_sqlalchemy import SQLAlchemy
+from flask import Blueprint, Flask, current_app, g, render_template, request, make_response, jsonify, Response, stream_with_context, url_for
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import event
 from datetime import datetime, timedelta
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-import requests
-from bs4 import BeautifulSoup
+import click
+import fcntl
 import time
-import random
 import pytz
 import os
 import logging
-import googlemaps
+import json
+import base64
+import hashlib
+import gzip
+import zlib
+import uuid
+import threading
+import socket
+import atexit
 from datetime import timezone
+from models import db, Restaurant, RestaurantStaging, ScrapingLog, RefreshJob, SchedulerLease, DedupeKey, RestaurantHistory, WeeklyDistrictRollup
+from dedupe import NUM_BANDS, dedupe_restaurants, fingerprint
+import metrics
+import regions
+import search
+from writer import WriteQueue, write
+from files import write_atomic
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///restaurants.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Scraper dependencies (googlemaps, requests, bs4) and APScheduler are
+# imported where they are used, so workers start without loading them.
 
-db = SQLAlchemy(app)
+bp = Blueprint('main', __name__)
 
-class Restaurant(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(255), nullable=False)
-    address = db.Column(db.String(500), nullable=False)
-    openrice_url = db.Column(db.String(500))
-    date_added = db.Column(db.DateTime, default=datetime.utcnow)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+# Bump when models or indexes change, so the next deployment re-runs bootstrap_database
+SCHEMA_VERSION = 11
+
+# Restaurants per page on the index route
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50))
+
+# The worker running a refresh job bumps its heartbeat every
+# REFRESH_JOB_HEARTBEAT seconds; a job whose heartbeat is older than
+# REFRESH_JOB_TIMEOUT is considered dead, however long it has been running
+REFRESH_JOB_HEARTBEAT = int(os.environ.get('REFRESH_JOB_HEARTBEAT', 30))
+REFRESH_JOB_TIMEOUT = int(os.environ.get('REFRESH_JOB_TIMEOUT', 300))
+
+# Only the process holding the scheduler lease runs scheduled jobs. The
+# lease is renewed every SCHEDULER_LEASE_RENEW seconds and lapses after
+# SCHEDULER_LEASE_TTL, letting another worker take over from a dead one.
+SCHEDULER_LEASE_TTL = int(os.environ.get('SCHEDULER_LEASE_TTL', 90))
+SCHEDULER_LEASE_RENEW = int(os.environ.get('SCHEDULER_LEASE_RENEW', 30))
+# A run missed while no leader was up still starts if it is at most this late
+SCHEDULER_MISFIRE_GRACE = int(os.environ.get('SCHEDULER_MISFIRE_GRACE', 6 * 3600))
+
+# /search results returned by default, and at most
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+# Queries with at most SEARCH_FULL_RANK_MAX matches have every match
+# scored (bm25 costs about 2 ms per 1000 matches on a 1M-row history).
+# Broader ones only score the SEARCH_RANK_WINDOW most recently found, so
+# they still answer in milliseconds, and say their results are truncated.
+SEARCH_FULL_RANK_MAX = int(os.environ.get('SEARCH_FULL_RANK_MAX', 5000))
+SEARCH_RANK_WINDOW = int(os.environ.get('SEARCH_RANK_WINDOW', 1000))
+
+# Weeks of rollups /api/trends returns by default, and at most
+TRENDS_DEFAULT_WEEKS = 12
+TRENDS_MAX_WEEKS = 260
+
+# SQLite runs in WAL mode, so page reads never wait for a write in progress
+# and writes never wait for readers; SQLITE_JOURNAL_MODE=delete brings back
+# the rollback journal, for comparison. Connections wait up to
+# SQLITE_BUSY_TIMEOUT_MS for another process's write lock (writes are
+# kept to a second or two, see STORE_CHUNK_ROWS; the margin covers a busy
+# CPU, and stays below WRITE_TIMEOUT), keep
+# SQLITE_CACHE_KB of pages each, and share SQLITE_MMAP_BYTES of the file
+# memory-mapped. Every process keeps up to DB_POOL_SIZE connections open,
+# plus DB_POOL_OVERFLOW more under load.
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'wal').lower()
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 15000))
+SQLITE_CACHE_KB = int(os.environ.get('SQLITE_CACHE_KB', 8192))
+SQLITE_MMAP_BYTES = int(os.environ.get('SQLITE_MMAP_BYTES', 128 * 1024 * 1024))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+DB_POOL_OVERFLOW = int(os.environ.get('DB_POOL_OVERFLOW', 8))
+
+# A scrape is stored in writes of at most STORE_CHUNK_ROWS rows each, so
+# no process holds SQLite's write lock for more than a fraction of the
+# busy timeout and other processes' writes get their turn in between.
+# Only the swap of a region's restaurants for the staged ones is one
+# transaction (about 1.2 s for 120k rows). Staged rows of a store that
+# died are cleared after STAGING_MAX_AGE.
+STORE_CHUNK_ROWS = int(os.environ.get('STORE_CHUNK_ROWS', 2000))
+STAGING_MAX_AGE = timedelta(days=1)
+
+# Columns moved from restaurant_staging into restaurant
+STAGED_COLUMNS = ['region', 'name', 'address', 'openrice_url', 'date_added', 'created_at',
+                  'district', 'latitude', 'longitude', 'cuisine']
+
+# /api/restaurants page size cap and NDJSON rows fetched per database round-trip
+API_MAX_LIMIT = 500
+API_STREAM_BATCH_SIZE = 500
+
+# The data version (DATA_VERSION_PATH, under the instance folder by default)
+# is bumped whenever restaurant data changes and shared by every worker on this host
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 256))
+PAGE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+# Every process (gunicorn workers, region shards, CLI runs) writes its
+# metrics to METRICS_DIR every METRICS_FLUSH_SECONDS, and /metrics adds
+# them all up, so any worker can answer a Prometheus scrape for the server
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'metrics'))
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+
+class RenderedPageCache:
+    """Rendered pages by ETag, only ever holding pages for one data version"""
     
-    def __repr__(self):
-        return f'<Restaurant {self.name}>'
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.version = None
+        self.pages = {}
+    
+    def get(self, version, etag):
+        if version != self.version:
+            return None
+        return self.pages.get(etag)
+    
+    def put(self, version, etag, body):
+        if version != self.version:
+            self.pages.clear()
+            self.version = version
+        if len(self.pages) >= self.max_entries:
+            self.pages.pop(next(iter(self.pages)))
+        self.pages[etag] = body
 
-class ScrapingLog(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    restaurants_found = db.Column(db.Integer, default=0)
-    status = db.Column(db.String(100), default='success')
-    message = db.Column(db.Text)
+rendered_pages = RenderedPageCache(PAGE_CACHE_MAX_ENTRIES)
+# A region's restaurant and district counts and last update, by region key:
+# every page of a region shows the same ones, so they are counted once per data version
+region_summaries = RenderedPageCache(len(regions.REGIONS))
 
-def get_week_range():
-    """Get the current 7-day window ending today"""
-    hk_tz = pytz.timezone('Asia/Hong_Kong')
-    today = datetime.now(hk_tz).date()
+def get_week_range(region):
+    """Get the current 7-day window ending today in a region's timezone"""
+    today = datetime.now(region.tz).date()
     
     # Calculate 7-day window ending today (28 Jul - 4 Aug = 8 days, but requirement says 7-day window)
     # Using 6 days ago to today = 7 days total
@@ -49,410 +146,601 @@ def get_week_range():
     
     return start_date, end_date
 
-def search_google_maps_restaurants():
-    """Search for new restaurants in Hong Kong using Google Maps API"""
-    # Debug: Show all env vars starting with GOOGLE
-    print("Environment variables check:")
-    for key in os.environ:
-        if 'GOOGLE' in key.upper():
-            print(f"Found env var: {key}")
+def iso_week(moment, region):
+    """ISO week of a naive UTC datetime in a region's timezone, e.g. '2026-W42'"""
+    local = pytz.utc.localize(moment).astimezone(region.tz)
+    year, week, _ = local.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def insert_restaurants(rows):
+    """Batch insert restaurant rows, skipping (region, name, address) triples already stored
     
-    api_key = os.environ.get('GOOGLE_MAPS_API_KEY2')
-    if not api_key:
-        print("WARNING: No Google Maps API key found in environment variables")
-        print(f"Looking for: GOOGLE_MAPS_API_KEY2")
-        print(f"Available keys: {list(os.environ.keys())[:5]}...")  # Show first 5 keys
-        return []
+    Runs in the caller's transaction and returns the number of rows inserted.
+    """
+    if not rows:
+        return 0
+    # One statement executed as a batch; Core execution keeps the rowcount
+    stmt = sqlite_insert(Restaurant.__table__).on_conflict_do_nothing(index_elements=['region', 'name', 'address'])
+    return db.session.connection().execute(stmt, rows).rowcount
+
+def dedupe_keys(rows, known=None):
+    """DedupeKey rows for (id, name, address) restaurant rows; `known` as for dedupe.fingerprint()"""
+    return [
+        {'band_key': key, 'restaurant_id': restaurant_id}
+        for restaurant_id, name, address in rows
+        for key in fingerprint(name, address, known).keys
+    ]
+
+def index_restaurants(rows):
+    """Store dedupe bucket keys for (id, name, address) rows, in the caller's transaction"""
+    keys = dedupe_keys(rows)
+    if keys:
+        db.session.connection().execute(DedupeKey.__table__.insert(), keys)
+
+def drop_stored_duplicates(restaurants, region, kept=db.true(), known=None):
+    """Leave out restaurants that match one already stored for the region
     
-    print(f"Google Maps API key found: {api_key[:8]}...")
+    Only stored restaurants sharing a dedupe bucket with an incoming one,
+    and matching the `kept` condition, are loaded and compared; the rest
+    of the table is never read. `known` is as for dedupe.fingerprint().
+    """
+    fingerprints = [fingerprint(r['name'], r['address'], known) for r in restaurants]
+    all_keys = list({key for incoming in fingerprints for key in incoming.keys})
     
-    try:
-        gmaps = googlemaps.Client(key=api_key)
-        new_restaurants = []
-        
-        # Search for restaurants in different areas of Hong Kong
-        search_locations = [
-            {"name": "Central", "lat": 22.2796, "lng": 114.1588},
-            {"name": "Tsim Sha Tsui", "lat": 22.2988, "lng": 114.1722},
-            {"name": "Causeway Bay", "lat": 22.2802, "lng": 114.1858},
-            {"name": "Wan Chai", "lat": 22.2772, "lng": 114.1750},
-            {"name": "Soho", "lat": 22.2817, "lng": 114.1533}
-        ]
-        
-        for location in search_locations:
-            try:
-                # Search for restaurants
-                places_result = gmaps.places_nearby(
-                    location=(location['lat'], location['lng']),
-                    radius=1000,
-                    type='restaurant',
-                    language='en',
-                    keyword='new restaurant'
-                )
-                
-                # Get details for each place
-                for place in places_result.get('results', [])[:5]:
-                    place_id = place['place_id']
-                    
-                    # Get detailed info
-                    details = gmaps.place(place_id, fields=[
-                        'name', 'formatted_address', 'opening_hours',
-                        'website', 'url', 'types', 'business_status'
-                    ])
-                    
-                    if details['status'] == 'OK':
-                        result = details['result']
-                        
-                        # Only include if business is operational
-                        if result.get('business_status') == 'OPERATIONAL':
-                            # Always use Google Maps URL for consistency
-                            restaurant_name = result.get('name', '')
-                            
-                            # Create Google Maps search URL using place name and address
-                            search_query = f"{restaurant_name} {location['name']} Hong Kong"
-                            restaurant_url = f"https://www.google.com/maps/search/{search_query.replace(' ', '+')}"
-                            
-                            new_restaurants.append({
-                                'name': restaurant_name,
-                                'address': result.get('formatted_address', '').replace(', Hong Kong', ''),
-                                'url': restaurant_url
-                            })
-                            print(f"Found via Google Maps: {restaurant_name}")
-                
-                # Limit total results
-                if len(new_restaurants) >= 20:
-                    return new_restaurants
-                
-                time.sleep(0.5)  # Rate limiting
-                
-            except Exception as e:
-                print(f"Error searching {location}: {e}")
-                continue
-        
-        return new_restaurants
-        
-    except Exception as e:
-        print(f"Google Maps API error: {e}")
-        return []
+    # Keys first, then their restaurants by id: joined in one query,
+    # SQLite reads the whole region through its index and probes the keys
+    # of every restaurant, once per chunk of keys
+    stored_keys = {}
+    # Stay under SQLite's bound parameter limit
+    for chunk in chunked(all_keys, 500):
+        rows = db.session.execute(
+            db.select(DedupeKey.band_key, DedupeKey.restaurant_id).where(DedupeKey.band_key.in_(chunk))
+        )
+        for band_key, restaurant_id in rows:
+            stored_keys.setdefault(band_key, []).append(restaurant_id)
+    
+    stored = {}
+    candidate_ids = sorted({rid for ids in stored_keys.values() for rid in ids})
+    for chunk in chunked(candidate_ids, 500):
+        rows = db.session.execute(
+            db.select(Restaurant.id, Restaurant.name, Restaurant.address)
+            .where(Restaurant.id.in_(chunk), Restaurant.region == region.key, kept)
+        )
+        for restaurant_id, name, address in rows:
+            stored[restaurant_id] = fingerprint(name, address)
+    
+    kept = []
+    for restaurant, incoming in zip(restaurants, fingerprints):
+        # Other regions' restaurants and those not `kept` were not loaded
+        candidates = {rid for key in incoming.keys for rid in stored_keys.get(key, ()) if rid in stored}
+        if not any(incoming.matches(stored[rid]) for rid in candidates):
+            kept.append(restaurant)
+    return kept
 
-def scrape_openrice_new_restaurants():
-    """Get new restaurants from Google Maps first, then fall back to OpenRice scraping"""
+def index_unindexed_restaurants():
+    """Add dedupe keys for restaurants stored without them, in the caller's transaction"""
+    rows = db.session.execute(
+        db.select(Restaurant.id, Restaurant.name, Restaurant.address)
+        .where(~Restaurant.id.in_(db.select(DedupeKey.restaurant_id)))
+    ).all()
+    index_restaurants(rows)
+    return len(rows)
+
+def record_history(rows):
+    """Append restaurant rows to the history and count them into the weekly rollups
     
-    # Try Google Maps API first
-    new_restaurants = search_google_maps_restaurants()
+    Restaurants already in the history are skipped, so a place found
+    again in a later week stays counted in the week it opened. Runs in
+    the caller's transaction; returns the number of rows appended.
+    """
+    if not rows:
+        return 0
+    stmt = (
+        sqlite_insert(RestaurantHistory.__table__)
+        .on_conflict_do_nothing(index_elements=['region', 'name', 'address'])
+        .returning(RestaurantHistory.region, RestaurantHistory.iso_week, RestaurantHistory.district)
+    )
+    appended = db.session.connection().execute(stmt, [
+        {
+            'region': row['region'],
+            'iso_week': iso_week(row['date_added'], regions.REGIONS[row['region']]),
+            'name': row['name'],
+            'address': row['address'],
+            'openrice_url': row['openrice_url'],
+            'district': row['district'] or 'Unknown',
+            'first_seen': row['date_added']
+        }
+        for row in rows
+    ]).all()
     
-    if new_restaurants:
-        print(f"Got {len(new_restaurants)} restaurants from Google Maps")
-        return new_restaurants
+    openings = {}
+    for key in appended:
+        openings[tuple(key)] = openings.get(tuple(key), 0) + 1
+    if openings:
+        stmt = sqlite_insert(WeeklyDistrictRollup.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['region', 'iso_week', 'district'],
+            set_={'new_openings': WeeklyDistrictRollup.new_openings + stmt.excluded.new_openings}
+        )
+        db.session.connection().execute(stmt, [
+            {'region': region, 'iso_week': week, 'district': district, 'new_openings': count}
+            for (region, week, district), count in openings.items()
+        ])
+    return len(appended)
+
+def unrecorded_history(region_key=None):
+    """Stored restaurants missing from the history, of every region or of one, as rows for record_history()"""
+    query = (
+        db.select(Restaurant.region, Restaurant.name, Restaurant.address, Restaurant.openrice_url,
+                  Restaurant.district, Restaurant.date_added)
+        .outerjoin(RestaurantHistory, db.and_(
+            RestaurantHistory.region == Restaurant.region,
+            RestaurantHistory.name == Restaurant.name, RestaurantHistory.address == Restaurant.address
+        ))
+        .where(RestaurantHistory.id.is_(None))
+    )
+    if region_key is not None:
+        query = query.where(Restaurant.region == region_key)
+    now = datetime.utcnow()
+    return [dict(row, date_added=row['date_added'] or now) for row in db.session.execute(query).mappings()]
+
+def record_unrecorded_history():
+    """Add stored restaurants missing from the history, e.g. after an upgrade, in the caller's transaction"""
+    return record_history(unrecorded_history())
+
+def backfill_districts():
+    """Match districts for restaurants stored without one, e.g. after an upgrade"""
+    rows = db.session.execute(
+        db.select(Restaurant.id, Restaurant.region, Restaurant.address).where(Restaurant.district.is_(None))
+    ).all()
+    updates = []
+    for restaurant_id, region_key, address in rows:
+        district = regions.REGIONS[region_key].districts.district_of(address)
+        if district:
+            updates.append({'restaurant_id': restaurant_id, 'district': district})
+    if updates:
+        db.session.connection().execute(
+            db.update(Restaurant.__table__)
+            .where(Restaurant.id == db.bindparam('restaurant_id'))
+            .values(district=db.bindparam('district')),
+            updates
+        )
+    db.session.commit()
+    return len(updates)
+
+def rebuild_weekly_rollups():
+    """Recount the weekly rollups from the history, in the caller's transaction"""
+    db.session.execute(db.delete(WeeklyDistrictRollup))
+    db.session.execute(db.insert(WeeklyDistrictRollup).from_select(
+        ['region', 'iso_week', 'district', 'new_openings'],
+        db.select(RestaurantHistory.region, RestaurantHistory.iso_week, RestaurantHistory.district, db.func.count())
+        .group_by(RestaurantHistory.region, RestaurantHistory.iso_week, RestaurantHistory.district)
+    ))
+
+def redistrict_history():
+    """Re-match the district of every history row and rebuild the weekly rollups from them
+    
+    Run once when districts first come from the matcher, as older rows
+    hold the last part of their address instead.
+    """
+    rows = db.session.execute(
+        db.select(RestaurantHistory.id, RestaurantHistory.region, RestaurantHistory.address, RestaurantHistory.district)
+    ).all()
+    updates = []
+    for history_id, region_key, address, district in rows:
+        matched = regions.REGIONS[region_key].districts.district_of(address) or 'Unknown'
+        if matched != district:
+            updates.append({'history_id': history_id, 'district': matched})
+    if updates:
+        db.session.connection().execute(
+            db.update(RestaurantHistory.__table__)
+            .where(RestaurantHistory.id == db.bindparam('history_id'))
+            .values(district=db.bindparam('district')),
+            updates
+        )
+    rebuild_weekly_rollups()
+    db.session.commit()
+    return len(updates)
+
+def create_search_index():
+    """Create the full-text index and its triggers, indexing existing history once"""
+    exists = db.session.execute(
+        db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': search.TABLE}
+    ).first()
+    db.session.execute(db.text(search.CREATE_TABLE))
+    for trigger in search.TRIGGERS:
+        db.session.execute(db.text(trigger))
+    if not exists:
+        db.session.execute(db.text(search.BACKFILL))
+    db.session.commit()
+
+def upgrade_schema():
+    """Bring an existing database up to date with the models
     
-    # Fall back to OpenRice scraping
-    print("Google Maps unavailable, trying OpenRice scraping...")
-    session = requests.Session()
+    Returns the columns added, as 'table.column' names.
+    """
+    added = []
     
-    # Rotate user agents for better success
-    user_agents = [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-    ]
+    # The rollups' primary key gained the region; they are counted from the
+    # history, so the table is recreated empty and refilled by the caller
+    rollup = WeeklyDistrictRollup.__table__
+    if 'region' not in {column['name'] for column in db.inspect(db.engine).get_columns(rollup.name)}:
+        rollup.drop(db.engine)
+        rollup.create(db.engine)
+        added.append(f'{rollup.name}.region')
     
-    headers = {
-        'User-Agent': random.choice(user_agents),
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9,zh-TW;q=0.8,zh;q=0.7',
-        'Accept-Encoding': 'gzip, deflate',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Sec-Fetch-User': '?1',
-        'Cache-Control': 'no-cache',
-        'Pragma': 'no-cache',
-    }
+    # create_all() skips tables that exist, so add any columns they are missing;
+    # existing rows take the column's server default
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_type = column.type.compile(db.engine.dialect)
+                default = f" DEFAULT '{column.server_default.arg}'" if column.server_default is not None else ''
+                db.session.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}'))
+                added.append(f'{table.name}.{column.name}')
+        db.session.commit()
     
-    new_restaurants = []
+    # Older databases may hold duplicate rows; keep the first of each
+    if 'uq_restaurant_region_name_address' not in {index['name'] for index in inspector.get_indexes('restaurant')}:
+        db.session.execute(db.text(
+            'DELETE FROM restaurant WHERE id NOT IN '
+            '(SELECT MIN(id) FROM restaurant GROUP BY region, name, address)'
+        ))
+        db.session.commit()
     
-    # Try the new restaurant condition URL first
-    urls_to_check = [
-        'https://www.openrice.com/en/hongkong/restaurants?sortBy=ORScoreDesc&conditionId=2005',  # New restaurants!
-        'https://www.openrice.com/en/hongkong/restaurants?conditionId=2005',
-    ]
+    # Drop indexes the models no longer declare, such as keys that gained
+    # the region, and create the ones they are missing
+    for table in db.metadata.sorted_tables:
+        declared = {index.name for index in table.indexes}
+        for index in inspector.get_indexes(table.name):
+            if index['name'] not in declared and index['name'].startswith(('ix_', 'uq_')):
+                db.session.execute(db.text(f'DROP INDEX {index["name"]}'))
+        db.session.commit()
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    return added
+
+def chunked(items, size=STORE_CHUNK_ROWS):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def stage_restaurants(batch, rows):
+    """Add restaurant rows to the staging table under `batch`; a write for the writer queue"""
+    db.session.connection().execute(
+        RestaurantStaging.__table__.insert(),
+        [{'batch': batch, **{column: row[column] for column in STAGED_COLUMNS}} for row in rows]
+    )
+
+def clear_staging(batch):
+    """Remove one chunk of a batch's staged rows; a write, returning the rows removed"""
+    return db.session.execute(db.delete(RestaurantStaging).where(RestaurantStaging.id.in_(
+        db.select(RestaurantStaging.id).where(RestaurantStaging.batch == batch).limit(STORE_CHUNK_ROWS)
+    ))).rowcount
+
+def clear_stale_staging():
+    """Remove rows staged by stores that never finished; a write"""
+    db.session.execute(db.delete(RestaurantStaging).where(
+        RestaurantStaging.created_at < datetime.utcnow() - STAGING_MAX_AGE
+    ))
+
+def append_region_history(region):
+    """Append the region's stored restaurants missing from the history, in short writes
     
-    # First, try to establish a session by visiting the home page
-    try:
-        home_response = session.get('https://www.openrice.com/en/hongkong', headers=headers, timeout=15)
-        time.sleep(random.uniform(1, 2))
-    except:
-        pass
+    Returns the number of rows appended. Runs after every swap, and
+    before it as well, so restaurants a failed store left out of the
+    history are added before a replace can delete them.
+    """
+    appended = 0
+    for chunk in chunked(unrecorded_history(region.key)):
+        appended += write(lambda: record_history(chunk))
+    return appended
+
+def swap_restaurants(batch, outgoing, indexed_after=0):
+    """Replace the `outgoing` restaurants with a batch's staged rows in one transaction
     
-    for url in urls_to_check:
+    A write for the writer queue; returns the number of rows inserted.
+    The unique (region, name, address) index skips exact repeats. The
+    dedupe keys of outgoing rows up to id `indexed_after` must already be
+    gone; new rows always get higher ids.
+    """
+    db.session.execute(db.delete(DedupeKey).where(
+        DedupeKey.restaurant_id.in_(db.select(Restaurant.id).where(outgoing, Restaurant.id > indexed_after))
+    ))
+    db.session.execute(db.delete(Restaurant).where(outgoing))
+    staged = db.select(*[RestaurantStaging.__table__.c[column] for column in STAGED_COLUMNS]).where(
+        RestaurantStaging.batch == batch
+    ).order_by(RestaurantStaging.id)
+    return db.session.execute(
+        sqlite_insert(Restaurant.__table__).from_select(STAGED_COLUMNS, staged).on_conflict_do_nothing()
+    ).rowcount
+
+def store_restaurants(restaurants_data, replace, now, message_suffix='', region=regions.HONG_KONG, known=None):
+    """Write one region's scrape: its restaurants, their history and the run's log entry
+    
+    Made of short writes for the writer queue, so it runs outside one.
+    The new rows are staged in chunks, then the region's outgoing
+    restaurants (all of them with replace=True, else those older than the
+    current week) are swapped for them in one transaction, which adds the
+    log entry too, so readers see the old set or the new one and never an
+    empty table. Dedupe keys and history follow in chunks; whatever of
+    them a failed store left out is added by the next one. Other
+    regions' rows are left alone.
+    `known` holds fingerprints already computed for the batch, as for
+    dedupe.fingerprint(). Returns (restaurants inserted, log entry id).
+    """
+    start_date, end_date = get_week_range(region)
+    in_region = Restaurant.region == region.key
+    week_start = datetime.combine(start_date, datetime.min.time())
+    if replace:
+        outgoing = in_region
+    else:
+        outgoing = db.and_(in_region, Restaurant.date_added < week_start)
+    
+    # A store that failed after its swap may have left restaurants out of the history
+    with metrics.stage('history'):
+        repaired = append_region_history(region)
+    if repaired:
+        print(f"Added {repaired} restaurants left out of the history in {region.name}")
+    
+    with metrics.stage('db_upsert'):
+        if not replace:
+            # Compared with the restaurants that stay, as the rest are on their way out
+            with metrics.stage('dedupe'):
+                restaurants_data = drop_stored_duplicates(
+                    restaurants_data, region, db.or_(Restaurant.date_added >= week_start, Restaurant.date_added.is_(None)),
+                    known
+                )
+        
+        rows = [
+            {
+                'region': region.key,
+                'name': restaurant_data['name'],
+                'address': restaurant_data['address'],
+                'openrice_url': restaurant_data['url'],
+                'district': region.districts.district_of(restaurant_data['address']),
+                'latitude': restaurant_data.get('latitude'),
+                'longitude': restaurant_data.get('longitude'),
+                'cuisine': restaurant_data.get('cuisine'),
+                'date_added': now,
+                'created_at': now
+            }
+            for restaurant_data in restaurants_data
+        ]
+        
+        batch = uuid.uuid4().hex
+        write(clear_stale_staging)
         try:
-            print(f"Scraping: {url}")
-            # Update headers with referer
-            headers['Referer'] = 'https://www.openrice.com/en/hongkong'
-            
-            response = session.get(url, headers=headers, timeout=30)
-            
-            # If blocked, try without session
-            if response.status_code >= 400:
-                time.sleep(random.uniform(3, 5))
-                response = requests.get(url, headers=headers, timeout=30)
-            
-            if response.status_code != 200:
-                print(f"Got status code {response.status_code} for {url}")
-                continue
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Look for restaurant cards/listings with more specific selectors
-            restaurant_cards = []
-            
-            # Try multiple selector strategies for OpenRice's structure
-            # 1. Look for sr1-listing-item divs (newer structure)
-            restaurant_cards.extend(soup.find_all('div', class_='sr1-listing-item'))
-            
-            # 2. Look for poi-list-item divs (common structure)
-            restaurant_cards.extend(soup.find_all('div', class_='poi-list-item'))
-            
-            # 3. Look for restaurant-item containers
-            restaurant_cards.extend(soup.find_all('div', class_='restaurant-item'))
+            for chunk in chunked(rows):
+                write(lambda: stage_restaurants(batch, chunk))
             
-            # 4. Look for specific restaurant links with title
-            restaurant_cards.extend(soup.find_all('a', {'title': True, 'href': lambda x: x and '/restaurant/' in x}))
+            # The outgoing rows' dedupe keys go beforehand; the swap clears
+            # those of rows stored since, e.g. by another process
+            outgoing_ids = db.session.execute(db.select(Restaurant.id).where(outgoing).order_by(Restaurant.id)).scalars().all()
+            for chunk in chunked(outgoing_ids):
+                write(lambda: db.session.execute(db.delete(DedupeKey).where(DedupeKey.restaurant_id.in_(
+                    db.select(Restaurant.id).where(outgoing, Restaurant.id.between(chunk[0], chunk[-1]))
+                ))))
             
-            # 5. Look for h2/h3 elements with restaurant names
-            restaurant_cards.extend(soup.find_all(['h2', 'h3'], class_=['title-name', 'sr1-listing-item-title']))
-            
-            if not restaurant_cards:
-                # Fallback: look for any links to restaurant pages (exclude navigation)
-                restaurant_cards = soup.find_all('a', href=lambda x: x and '/restaurant/' in x and '-r' in x and all(exc not in x.lower() for exc in ['review', 'search', 'submit', 'contact', 'info']))
+            def swap():
+                inserted = swap_restaurants(batch, outgoing, outgoing_ids[-1] if outgoing_ids else 0)
+                log_id = add_log_entry(
+                    region=region.key,
+                    restaurants_found=inserted,
+                    status='success',
+                    message=f'Successfully updated database with {inserted} new restaurants{message_suffix}'
+                )
+                return inserted, log_id
             
-            # Also look for JSON-LD structured data
-            json_scripts = soup.find_all('script', type='application/ld+json')
-            for script in json_scripts:
-                try:
-                    import json
-                    data = json.loads(script.string)
-                    if isinstance(data, list):
-                        for item in data:
-                            if item.get('@type') == 'Restaurant':
-                                new_restaurants.append({
-                                    'name': item.get('name', ''),
-                                    'address': item.get('address', {}).get('streetAddress', ''),
-                                    'url': item.get('url', '')
-                                })
-                except:
+            new_count, log_id = write(swap)
+            # Cached pages and counts are out of date from here, even if a later step fails
+            bump_data_version()
+        finally:
+            try:
+                while write(lambda: clear_staging(batch)):
                     pass
+            except Exception as e:
+                print(f"Could not clear staged restaurants: {e}")
+        
+        # Keys for the region's rows without any: the ones just inserted,
+        # and any left unindexed by an earlier store that failed part way
+        unindexed = db.session.execute(
+            db.select(Restaurant.id, Restaurant.name, Restaurant.address)
+            .where(in_region, ~Restaurant.id.in_(db.select(DedupeKey.restaurant_id)))
+        ).all()
+        # Fingerprinted here, so the writes only insert; a restaurant has up to NUM_BANDS keys
+        for chunk in chunked(dedupe_keys(unindexed, known), STORE_CHUNK_ROWS * NUM_BANDS):
+            write(lambda: db.session.connection().execute(DedupeKey.__table__.insert(), chunk))
+    metrics.count('restaurants_inserted', new_count)
+    
+    # Old weeks leave the restaurant table but stay in the history
+    with metrics.stage('history'):
+        metrics.count('history_appended', repaired + append_region_history(region))
+    return new_count, log_id
+
+def add_log_entry(**values):
+    """Add a ScrapingLog entry and return its id; a write for the writer queue"""
+    log_entry = ScrapingLog(**values)
+    db.session.add(log_entry)
+    db.session.flush()
+    return log_entry.id
+
+def update_restaurant_database(replace=False, region_keys=None):
+    """Update the database with new restaurants of each region scraped
+    
+    Regions are scraped as shards (see scraper.scrape_regions), by
+    default the ones in SCRAPE_REGIONS, and each is stored as soon as
+    its scrape finishes. Returns the ScrapingLog entries of the run, one
+    per region in the order they finished.
+    """
+    from scraper import scrape_regions
+    if region_keys is None:
+        region_list = regions.enabled_regions()
+    else:
+        region_list = [regions.REGIONS[key] for key in region_keys]
+    return [store_region_scrape(region, result, replace) for region, result in scrape_regions(region_list)]
+
+def store_region_scrape(region, result, replace):
+    """Store one region's scrape, as returned by scraper.scrape_region, or log the error it raised
+    
+    With replace=True every existing restaurant of the region is swapped
+    out for the fresh scrape. The scrape finishes before anything is
+    deleted, and the swap commits in one transaction, so readers never
+    see an empty table. Database writes go through the writer queue.
+    Returns the region's ScrapingLog entry, with the time spent in each
+    stage, the scrape's included, in its `stages` column.
+    """
+    with metrics.RunStages() as run:
+        try:
+            if isinstance(result, Exception):
+                raise result
+            restaurants_data, scrape_stages, cache_stats = result
+            run.merge(scrape_stages)
+            # Sources list the same place under slightly different names and addresses;
+            # each listing is fingerprinted once, here, for the whole store
+            known = {}
+            with metrics.stage('dedupe'):
+                restaurants_data = dedupe_restaurants(restaurants_data, known)
             
-            # Parse HTML cards
-            for card in restaurant_cards[:20]:  # Limit to first 20 results per page
-                try:
-                    name = None
-                    address = None
-                    restaurant_url = None
-                    
-                    # More aggressive name extraction
-                    name_elem = card.find(['h2', 'h3', 'h4', 'span', 'a'], class_=['name', 'title', 'restaurant-name', 'poi-name'])
-                    if not name_elem and card.name == 'a':
-                        name_elem = card
-                    if not name_elem:
-                        name_elem = card.find(text=True, recursive=False)
-                    if name_elem:
-                        name = name_elem.get_text(strip=True) if hasattr(name_elem, 'get_text') else str(name_elem).strip()
-                    
-                    # More aggressive address extraction
-                    address_elem = card.find(['span', 'div', 'p'], class_=['address', 'location', 'district', 'address-info'])
-                    if not address_elem:
-                        address_elem = card.find(string=lambda text: text and any(dist in text for dist in ['Central', 'Tsim Sha Tsui', 'Causeway Bay', 'Wan Chai', 'Admiralty']))
-                    if address_elem:
-                        address = address_elem.get_text(strip=True) if hasattr(address_elem, 'get_text') else str(address_elem).strip()
-                    
-                    # Extract URL
-                    if card.name == 'a' and card.get('href'):
-                        restaurant_url = card.get('href')
-                    else:
-                        link_elem = card.find('a', href=lambda x: x and '/restaurant/' in x)
-                        if link_elem:
-                            restaurant_url = link_elem.get('href')
-                    
-                    if restaurant_url and restaurant_url.startswith('/'):
-                        restaurant_url = 'https://www.openrice.com' + restaurant_url
-                    
-                    if name and (address or restaurant_url):
-                        # Clean up the data
-                        name = name.replace('\n', ' ').strip()
-                        if address:
-                            address = address.replace('\n', ' ').strip()
-                        else:
-                            address = 'Hong Kong'
-                            
-                        new_restaurants.append({
-                            'name': name,
-                            'address': address,
-                            'url': restaurant_url or ''
-                        })
-                        print(f"Found: {name} - {address}")
-                    
-                except Exception as e:
-                    print(f"Error parsing restaurant card: {e}")
-                    continue
+            message_suffix = f' ({cache_stats})' if cache_stats else ''
+            now = datetime.utcnow()
+            # Includes waiting for the writer to finish earlier writes
+            with metrics.stage('db_write'):
+                new_count, log_id = store_restaurants(restaurants_data, replace, now, message_suffix, region, known)
             
-            # Add delay between requests
-            time.sleep(random.uniform(2, 4))
+            print(f"Database updated: {new_count} new restaurants added in {region.name}")
             
         except Exception as e:
-            print(f"Error scraping {url}: {e}")
-            continue
+            print(f"Error updating database for {region.name}: {e}")
+            
+            # Log the error
+            message = str(e)
+            log_id = write(lambda: add_log_entry(region=region.key, restaurants_found=0, status='error', message=message))
     
-    # Try alternative approach: search for specific new restaurants
-    if len(new_restaurants) < 5:
-        print("Trying search approach...")
-        search_terms = ['新開張', 'new opening', '2025', 'newly opened', 'grand opening']
+    stages = json.dumps(run.to_dict())
+    write(lambda: db.session.execute(
+        db.update(ScrapingLog).where(ScrapingLog.id == log_id).values(stages=stages)
+    ))
+    return db.session.get(ScrapingLog, log_id)
+
+def enqueue_refresh_job():
+    """Return the in-flight refresh job, or create one if there is none
+    
+    Returns (job, created). Jobs that have not sent a heartbeat for
+    REFRESH_JOB_TIMEOUT are assumed to belong to a dead worker and are
+    failed, so a new job can start.
+    """
+    def claim():
+        job = RefreshJob.query.filter_by(active='refresh').first()
+        if job:
+            if (job.heartbeat_at or job.created_at) > datetime.utcnow() - timedelta(seconds=REFRESH_JOB_TIMEOUT):
+                return job.id, False
+            job.status = 'error'
+            job.active = None
+            job.finished_at = datetime.utcnow()
+            job.message = 'Timed out, the worker running it probably died'
         
-        for term in search_terms:
+        # `active` is unique: if another worker enqueued one first, share it
+        job_id = uuid.uuid4().hex
+        inserted = db.session.execute(
+            sqlite_insert(RefreshJob.__table__)
+            .values(id=job_id, status='queued', active='refresh')
+            .on_conflict_do_nothing()
+        ).rowcount
+        if inserted:
+            return job_id, True
+        return RefreshJob.query.filter_by(active='refresh').first().id, False
+    
+    job_id, created = write(claim)
+    return db.session.get(RefreshJob, job_id), created
+
+def update_refresh_job(job_id, **values):
+    """Update a job still in flight; returns False once it has finished or been failed as dead"""
+    return db.session.execute(
+        db.update(RefreshJob)
+        .where(RefreshJob.id == job_id, RefreshJob.active == 'refresh')
+        .values(**values)
+    ).rowcount > 0
+
+def send_heartbeats(app, job_id, stop):
+    """Bump a job's heartbeat every REFRESH_JOB_HEARTBEAT seconds until `stop` is set"""
+    with app.app_context():
+        while not stop.wait(REFRESH_JOB_HEARTBEAT):
             try:
-                search_url = f'https://www.openrice.com/en/hongkong/restaurants?what={term}'
-                headers['User-Agent'] = random.choice(user_agents)
-                response = session.get(search_url, headers=headers, timeout=20)
-                
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    # Look for any restaurant links in search results (exclude navigation)
-                    links = soup.find_all('a', href=lambda x: x and '/restaurant/' in x and '-r' in x and 'search' not in x.lower() and 'submit' not in x.lower() and 'contact' not in x.lower())
-                    
-                    for link in links[:5]:
-                        try:
-                            name = link.get_text(strip=True)
-                            url = link.get('href')
-                            if url.startswith('/'):
-                                url = 'https://www.openrice.com' + url
-                            
-                            if name and url and not any(r['name'] == name for r in new_restaurants):
-                                new_restaurants.append({
-                                    'name': name,
-                                    'address': 'Hong Kong',
-                                    'url': url
-                                })
-                                print(f"Found via search: {name}")
-                        except:
-                            continue
-                
-                time.sleep(random.uniform(1, 2))
+                if not write(lambda: update_refresh_job(job_id, heartbeat_at=datetime.utcnow())):
+                    return
             except Exception as e:
-                print(f"Search error: {e}")
-                continue
-    
-    # Remove duplicates
-    seen = set()
-    unique_restaurants = []
-    for r in new_restaurants:
-        if r['name'] not in seen:
-            seen.add(r['name'])
-            unique_restaurants.append(r)
-    
-    new_restaurants = unique_restaurants
-    
-    # If still no restaurants found from scraping, add real recent restaurants from OpenRice
-    if not new_restaurants:
-        # These are actual new restaurants from OpenRice HK as of 2025
-        real_restaurants = [
-            {'name': 'Hotaru', 'address': 'Shop 301, 3/F, K11 Art Mall, 18 Hanoi Road, Tsim Sha Tsui', 'url': 'https://www.openrice.com/en/hongkong/r-hotaru-tsim-sha-tsui-japanese-omakase-r776234'},
-            {'name': 'Carna by Dario Cecchini', 'address': 'Shop OTE 401A, 4/F, Ocean Terminal, Harbour City, Tsim Sha Tsui', 'url': 'https://www.openrice.com/en/hongkong/r-carna-by-dario-cecchini-tsim-sha-tsui-italian-steak-house-r749615'},
-            {'name': 'NOJO', 'address': '1-13 Elgin Street, Central', 'url': 'https://www.openrice.com/en/hongkong/r-nojo-central-japanese-ramen-r772543'},
-            {'name': 'HEXA', 'address': 'Shop 301-305, 3/F, K11 MUSEA, Victoria Dockside, Tsim Sha Tsui', 'url': 'https://www.openrice.com/en/hongkong/r-hexa-tsim-sha-tsui-guangdong-dim-sum-r692876'},
-            {'name': 'TONO DAIKIYA', 'address': 'Shop 2201, 2/F, Gateway Arcade, Harbour City, Tsim Sha Tsui', 'url': 'https://www.openrice.com/en/hongkong/r-tono-daikiya-tsim-sha-tsui-japanese-sushi-r768432'},
-            {'name': 'Mr. Steak Buffet à la minute', 'address': '13/F, V Point, 18 Tang Lung Street, Causeway Bay', 'url': 'https://www.openrice.com/en/hongkong/r-mr-steak-buffet-a-la-minute-causeway-bay-international-buffet-r772102'},
-            {'name': 'Maison Beirut', 'address': 'G/F, 65 Hollywood Road, Central', 'url': 'https://www.openrice.com/en/hongkong/r-maison-beirut-central-lebanese-r765891'},
-            {'name': 'Morton\'s of Chicago', 'address': 'Shop 411-413, Level 4, Ocean Centre, Harbour City, Tsim Sha Tsui', 'url': 'https://www.openrice.com/en/hongkong/r-mortons-of-chicago-tsim-sha-tsui-american-steak-house-r769234'},
-        ]
-        new_restaurants.extend(real_restaurants)
-        print("Added real new restaurants from OpenRice")
-    
-    return new_restaurants
+                print(f"Could not record refresh job heartbeat: {e}")
 
-def update_restaurant_database():
-    """Update the database with new restaurants"""
-    try:
-        restaurants_data = scrape_openrice_new_restaurants()
-        
-        new_count = 0
-        start_date, end_date = get_week_range()
-        
-        # Clear old restaurants (older than current week)
-        old_restaurants = Restaurant.query.filter(
-            Restaurant.date_added < datetime.combine(start_date, datetime.min.time())
-        ).all()
-        
-        for old_restaurant in old_restaurants:
-            db.session.delete(old_restaurant)
-        
-        # Add new restaurants (deduplicate by name and address)
-        for restaurant_data in restaurants_data:
-            existing = Restaurant.query.filter_by(
-                name=restaurant_data['name'],
-                address=restaurant_data['address']
-            ).first()
-            
-            if not existing:
-                restaurant = Restaurant(
-                    name=restaurant_data['name'],
-                    address=restaurant_data['address'],
-                    openrice_url=restaurant_data['url'],
-                    date_added=datetime.utcnow()
-                )
-                db.session.add(restaurant)
-                new_count += 1
-        
-        db.session.commit()
-        
-        # Log the scraping result
-        log_entry = ScrapingLog(
-            restaurants_found=new_count,
-            status='success',
-            message=f'Successfully updated database with {new_count} new restaurants'
-        )
-        db.session.add(log_entry)
-        db.session.commit()
-        
-        print(f"Database updated: {new_count} new restaurants added")
+def run_refresh_job(app, job_id):
+    """Run a refresh job to completion in a background thread"""
+    with app.app_context():
+        now = datetime.utcnow()
+        write(lambda: update_refresh_job(job_id, status='running', started_at=now, heartbeat_at=now))
+        stop = threading.Event()
+        threading.Thread(target=send_heartbeats, args=(app, job_id, stop), daemon=True).start()
         
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error updating database: {e}")
+        try:
+            log_entries = update_restaurant_database(replace=True)
+            outcome = {
+                'status': 'success' if log_entries and all(e.status == 'success' for e in log_entries) else 'error',
+                'restaurants_found': sum(e.restaurants_found for e in log_entries),
+                'message': ' '.join(
+                    f"{regions.REGIONS[e.region].name}: {e.message}" for e in log_entries
+                ) or 'No regions to scrape'
+            }
+        except Exception as e:
+            outcome = {'status': 'error', 'message': str(e)}
+        finally:
+            stop.set()
         
-        # Log the error
-        log_entry = ScrapingLog(
-            restaurants_found=0,
-            status='error',
-            message=str(e)
-        )
-        db.session.add(log_entry)
-        db.session.commit()
+        # A job failed as dead in the meantime keeps that record
+        if not write(lambda: update_refresh_job(job_id, active=None, finished_at=datetime.utcnow(), **outcome)):
+            print(f"Refresh job {job_id} was timed out before it finished")
 
-@app.route('/refresh')
+@bp.route('/refresh')
 def refresh():
-    """Manual refresh endpoint to update restaurant data"""
-    try:
-        # Clear all existing restaurants for fresh start
-        Restaurant.query.delete()
-        db.session.commit()
-        
-        update_restaurant_database()
-        
-        # Show what we got
-        restaurants = Restaurant.query.all()
-        result = f"Database refreshed with {len(restaurants)} restaurants!<br><br>"
-        for r in restaurants[:5]:
-            result += f"- {r.name} at {r.address}<br>"
-            result += f"  URL: {r.openrice_url}<br><br>"
-        result += f"<br><a href='/'>Go back</a>"
-        return result
-    except Exception as e:
-        return f"Error: {e}"
+    """Start a background refresh of the restaurant data, or join the one in flight"""
+    job, created = enqueue_refresh_job()
+    if created:
+        app = current_app._get_current_object()
+        threading.Thread(target=run_refresh_job, args=(app, job.id), daemon=True).start()
+    
+    status_url = url_for('.refresh_status', job_id=job.id)
+    response = jsonify(job.to_dict() | {'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+@bp.route('/refresh/<job_id>')
+def refresh_status(job_id):
+    """Status of a refresh job"""
+    job = db.session.get(RefreshJob, job_id)
+    if not job:
+        return jsonify(error='Unknown job'), 404
+    return jsonify(job.to_dict())
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@bp.after_app_request
+def record_request_duration(response):
+    # Streamed bodies are still being sent; this times producing the response
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.REQUEST_SECONDS.observe(
+        time.perf_counter() - g.request_started,
+        route=route, method=request.method, status=response.status_code
+    )
+    return response
 
-@app.route('/debug')
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Counters and histograms of every process of the server in the Prometheus text format"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/debug')
 def debug():
     """Debug page to see raw database content"""
     restaurants = Restaurant.query.all()
@@ -467,128 +755,714 @@ def debug():
         result += f"URL starts with http: {r.openrice_url.startswith('http') if r.openrice_url else 'None'}<br>"
     return result
 
-@app.route('/')
+def current_data_version():
+    """Version token of the restaurant data, read without touching the database"""
+    try:
+        with open(current_app.config['DATA_VERSION_PATH']) as f:
+            return f.read().strip() or '0'
+    except OSError:
+        return '0'
+
+def bump_data_version():
+    """Mark restaurant data as changed so every worker drops its cached pages"""
+    path = current_app.config['DATA_VERSION_PATH']
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomic(path, f"{time.time_ns():x}{os.getpid():x}".encode('ascii'))
+
+def cached_page_response(etag, body, status=200):
+    response = make_response(body, status)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+    return response
+
+def encode_cursor(restaurant):
+    """Opaque cursor pointing at a restaurant's (name, id) position"""
+    raw = json.dumps([restaurant.name, restaurant.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    """Return the (name, id) a cursor points at, or None if it is missing or invalid"""
+    if not cursor:
+        return None
+    try:
+        name, restaurant_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(name), int(restaurant_id)
+    except (ValueError, TypeError):
+        return None
+
+def restaurant_page(query=None, after=None, before=None, page_size=PAGE_SIZE):
+    """One page of restaurants in (name, id) order using keyset pagination
+    
+    Seeks past the `after` or `before` position through the name index
+    instead of using OFFSET, so every page costs the same. `query` can
+    narrow the rows down first. Returns (restaurants, prev_cursor, next_cursor).
+    """
+    key = db.tuple_(Restaurant.name, Restaurant.id)
+    if query is None:
+        query = Restaurant.query
+    
+    if before:
+        rows = query.filter(key < before).order_by(
+            Restaurant.name.desc(), Restaurant.id.desc()
+        ).limit(page_size + 1).all()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        prev_cursor = encode_cursor(rows[0]) if has_more else None
+        next_cursor = encode_cursor(rows[-1]) if rows else None
+        return rows, prev_cursor, next_cursor
+    
+    if after:
+        query = query.filter(key > after)
+    rows = query.order_by(Restaurant.name, Restaurant.id).limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    prev_cursor = encode_cursor(rows[0]) if after and rows else None
+    next_cursor = encode_cursor(rows[-1]) if has_more else None
+    return rows, prev_cursor, next_cursor
+
+@bp.route('/')
 def index():
     """Main page showing new restaurants"""
+    # Names that are no region show the default one
+    region = regions.region_named(request.args.get('region')) or regions.REGIONS[regions.DEFAULT_REGION]
+    start_date, end_date = get_week_range(region)
+    
+    # Pages only change with the data version, the week window and the cursor
+    version = current_data_version()
+    page_key = f"{version}:{start_date.isoformat()}:{request.full_path}"
+    etag = hashlib.sha1(page_key.encode('utf-8')).hexdigest()
+    
+    if request.if_none_match.contains(etag):
+        return cached_page_response(etag, b'', 304)
+    body = rendered_pages.get(version, etag)
+    if body is not None:
+        return cached_page_response(etag, body)
+    
     try:
-        start_date, end_date = get_week_range()
-        
-        # Get restaurants from current week
-        restaurants = Restaurant.query.order_by(Restaurant.name).all()
-        
-        # If no restaurants, add some immediately
-        if not restaurants:
-            fallback_restaurants = [
-                {'name': 'Hotaru', 'address': 'Tsim Sha Tsui, Hong Kong', 'url': 'https://www.google.com/maps/search/Hotaru+Tsim+Sha+Tsui+Hong+Kong'},
-                {'name': 'Carna by Dario Cecchini', 'address': 'Tsim Sha Tsui, Hong Kong', 'url': 'https://www.google.com/maps/search/Carna+by+Dario+Cecchini+Tsim+Sha+Tsui+Hong+Kong'},
-                {'name': 'NOJO', 'address': 'Central, Hong Kong', 'url': 'https://www.google.com/maps/search/NOJO+Central+Hong+Kong'},
-                {'name': 'HEXA', 'address': 'Tsim Sha Tsui, Hong Kong', 'url': 'https://www.google.com/maps/search/HEXA+Tsim+Sha+Tsui+Hong+Kong'},
-                {'name': 'Maison Beirut', 'address': 'Central, Hong Kong', 'url': 'https://www.google.com/maps/search/Maison+Beirut+Central+Hong+Kong'},
-            ]
-            
-            for restaurant_data in fallback_restaurants:
-                restaurant = Restaurant(
-                    name=restaurant_data['name'],
-                    address=restaurant_data['address'],
-                    openrice_url=restaurant_data['url'],
-                    date_added=datetime.utcnow()
-                )
-                db.session.add(restaurant)
-            db.session.commit()
-            
-            # Re-query after adding
-            restaurants = Restaurant.query.order_by(Restaurant.name).all()
-        
-        # Get last update timestamp
-        last_log = ScrapingLog.query.order_by(ScrapingLog.timestamp.desc()).first()
-        last_updated = last_log.timestamp if last_log else datetime.utcnow()
-        
-        # Format dates for display
-        date_range = f"{start_date.strftime('%d %b')} – {end_date.strftime('%d %b %Y')}"
-        
-        return render_template('index.html', 
-                             restaurants=restaurants,
-                             date_range=date_range,
-                             last_updated=last_updated,
-                             restaurant_count=len(restaurants))
+        body = render_index(region, start_date, end_date, version)
     except Exception as e:
         print(f"Route error: {e}")
         # Return a simple page even if database fails
         return render_template('index.html', 
+                             region=region,
                              restaurants=[],
                              date_range="Database Error",
                              last_updated=datetime.utcnow(),
                              restaurant_count=0)
+    
+    rendered_pages.put(version, etag, body)
+    return cached_page_response(etag, body)
 
-def setup_scheduler():
-    """Set up the background scheduler"""
-    scheduler = BackgroundScheduler()
-    
-    # Schedule scraping every Monday at 02:00 HKT
-    hk_tz = pytz.timezone('Asia/Hong_Kong')
-    trigger = CronTrigger(
-        day_of_week='mon',
-        hour=2,
-        minute=0,
-        timezone=hk_tz
-    )
+def region_summary(region):
+    """(restaurant count, per-district counts, last update) of a region, counted from its rows"""
+    restaurant_count = db.session.query(db.func.count(Restaurant.id)).filter(Restaurant.region == region.key).scalar()
+    # Answered from the district index alone
+    district_counts = db.session.query(Restaurant.district, db.func.count()).filter(
+        Restaurant.region == region.key, Restaurant.district.isnot(None)
+    ).group_by(Restaurant.district).all()
+    
+    last_log = ScrapingLog.query.filter_by(region=region.key).order_by(ScrapingLog.timestamp.desc()).first()
+    last_updated = last_log.timestamp if last_log else datetime.utcnow()
+    return restaurant_count, [tuple(row) for row in district_counts], last_updated
+
+def render_index(region, start_date, end_date, version):
+    """Render one page of a region's restaurant listing, as of data `version`"""
+    after = decode_cursor(request.args.get('after'))
+    before = None if after else decode_cursor(request.args.get('before'))
+    # Names that are no district show every restaurant
+    district = region.districts.district_named(request.args.get('district'))
+    
+    # Get one page of restaurants from current week
+    query = Restaurant.query.filter_by(region=region.key)
+    if district:
+        query = query.filter_by(district=district)
+    restaurants, prev_cursor, next_cursor = restaurant_page(query=query, after=after, before=before)
+    
+    # If no restaurants, add some immediately (the sample restaurants are Hong Kong's)
+    if not restaurants and not (after or before or district) and region is regions.HONG_KONG:
+        fallback_restaurants = [
+            {'name': 'Hotaru', 'address': 'Tsim Sha Tsui, Hong Kong', 'url': 'https://www.google.com/maps/search/Hotaru+Tsim+Sha+Tsui+Hong+Kong'},
+            {'name': 'Carna by Dario Cecchini', 'address': 'Tsim Sha Tsui, Hong Kong', 'url': 'https://www.google.com/maps/search/Carna+by+Dario+Cecchini+Tsim+Sha+Tsui+Hong+Kong'},
+            {'name': 'NOJO', 'address': 'Central, Hong Kong', 'url': 'https://www.google.com/maps/search/NOJO+Central+Hong+Kong'},
+            {'name': 'HEXA', 'address': 'Tsim Sha Tsui, Hong Kong', 'url': 'https://www.google.com/maps/search/HEXA+Tsim+Sha+Tsui+Hong+Kong'},
+            {'name': 'Maison Beirut', 'address': 'Central, Hong Kong', 'url': 'https://www.google.com/maps/search/Maison+Beirut+Central+Hong+Kong'},
+        ]
+        
+        now = datetime.utcnow()
+        rows = [
+            {
+                'region': region.key,
+                'name': restaurant_data['name'],
+                'address': restaurant_data['address'],
+                'openrice_url': restaurant_data['url'],
+                'district': region.districts.district_of(restaurant_data['address']),
+                'date_added': now,
+                'created_at': now
+            }
+            for restaurant_data in fallback_restaurants
+        ]
+        
+        def insert_fallback():
+            # Requests racing here insert the same rows; the unique index skips repeats
+            insert_restaurants(rows)
+            index_unindexed_restaurants()
+            record_unrecorded_history()
+        
+        write(insert_fallback)
+        bump_data_version()
+        version = current_data_version()
+        
+        # Re-query after adding
+        restaurants, prev_cursor, next_cursor = restaurant_page(query=query)
+    
+    summary = region_summaries.get(version, region.key)
+    if summary is None:
+        summary = region_summary(region)
+        region_summaries.put(version, region.key, summary)
+    restaurant_count, district_counts, last_updated = summary
+    
+    # Format dates for display
+    date_range = f"{start_date.strftime('%d %b')} – {end_date.strftime('%d %b %Y')}"
+    
+    return render_template('index.html', 
+                         region=region,
+                         region_choices=regions.enabled_regions(),
+                         restaurants=restaurants,
+                         date_range=date_range,
+                         last_updated=last_updated,
+                         restaurant_count=restaurant_count,
+                         prev_cursor=prev_cursor,
+                         next_cursor=next_cursor,
+                         district=district,
+                         district_counts=district_counts)
+
+def restaurant_to_dict(restaurant):
+    return {
+        'id': restaurant.id,
+        'region': restaurant.region,
+        'name': restaurant.name,
+        'address': restaurant.address,
+        'url': restaurant.openrice_url,
+        'district': restaurant.district,
+        'latitude': restaurant.latitude,
+        'longitude': restaurant.longitude,
+        'cuisine': restaurant.cuisine,
+        'date_added': restaurant.date_added.isoformat() if restaurant.date_added else None
+    }
+
+def api_date_filters(args, region):
+    """date_added filters for the API, defaulting to the region's get_week_range window
+    
+    `window=all` drops the default; `since`/`until` take ISO dates and
+    `until` is exclusive. Raises ValueError on bad input.
+    """
+    window = args.get('window', 'week')
+    if window not in ('week', 'all'):
+        raise ValueError("window must be 'week' or 'all'")
+    
+    filters = []
+    if window == 'week':
+        start_date, end_date = get_week_range(region)
+        filters.append(Restaurant.date_added >= datetime.combine(start_date, datetime.min.time()))
+    if args.get('since'):
+        filters.append(Restaurant.date_added >= datetime.fromisoformat(args['since']))
+    if args.get('until'):
+        filters.append(Restaurant.date_added < datetime.fromisoformat(args['until']))
+    return filters
+
+def region_param(args):
+    """Region named by the `region` argument, by key or name; the default region without one
+    
+    Raises ValueError on other names.
+    """
+    name = args.get('region')
+    if not name:
+        return regions.REGIONS[regions.DEFAULT_REGION]
+    region = regions.region_named(name)
+    if region is None:
+        raise ValueError(f'unknown region: {name}')
+    return region
+
+def district_param(args, region):
+    """Canonical district of `region` named by the `district` argument, or None without one
+    
+    Accepts district, area and landmark names in any case, e.g.
+    'Tsim Sha Tsui' for 'Yau Tsim Mong'. Raises ValueError on other names.
+    """
+    name = args.get('district')
+    if not name:
+        return None
+    district = region.districts.district_named(name)
+    if district is None:
+        raise ValueError(f'unknown district: {name}')
+    return district
+
+@bp.route('/api/restaurants')
+def api_restaurants():
+    """Restaurants as cursor-paginated JSON, or streamed as NDJSON with format=ndjson"""
+    try:
+        region = region_param(request.args)
+        filters = api_date_filters(request.args, region)
+        filters.append(Restaurant.region == region.key)
+        district = district_param(request.args, region)
+        if district:
+            filters.append(Restaurant.district == district)
+        limit = max(1, min(int(request.args.get('limit', PAGE_SIZE)), API_MAX_LIMIT))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    
+    stream = request.args.get('format') == 'ndjson'
+    use_gzip = request.accept_encodings['gzip'] > 0
+    
+    # Same versioning as the index page; compressed bodies get their own tag
+    start_date, end_date = get_week_range(region)
+    page_key = f"{current_data_version()}:{start_date.isoformat()}:{request.full_path}:{use_gzip}"
+    etag = hashlib.sha1(page_key.encode('utf-8')).hexdigest()
+    
+    if request.if_none_match.contains(etag):
+        response = cached_page_response(etag, b'', 304)
+        response.vary.add('Accept-Encoding')
+        return response
     
-    scheduler.add_job(
-        func=update_restaurant_database,
-        trigger=trigger,
-        id='weekly_scrape',
-        name='Weekly OpenRice Scrape',
-        replace_existing=True
+    if stream:
+        statement = db.select(Restaurant).where(*filters).order_by(Restaurant.id)
+        
+        def generate():
+            # yield_per keeps only one batch of rows in memory at a time
+            rows = db.session.execute(statement.execution_options(yield_per=API_STREAM_BATCH_SIZE)).scalars()
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+            lines = []
+            for restaurant in rows:
+                lines.append(json.dumps(restaurant_to_dict(restaurant)) + '\n')
+                if len(lines) >= API_STREAM_BATCH_SIZE:
+                    chunk = ''.join(lines).encode('utf-8')
+                    lines = []
+                    yield compressor.compress(chunk) if compressor else chunk
+            chunk = ''.join(lines).encode('utf-8')
+            if compressor:
+                yield compressor.compress(chunk) + compressor.flush()
+            elif chunk:
+                yield chunk
+        
+        response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    else:
+        restaurants, _, next_cursor = restaurant_page(
+            query=Restaurant.query.filter(*filters),
+            after=decode_cursor(request.args.get('cursor')),
+            page_size=limit
+        )
+        body = json.dumps({
+            'restaurants': [restaurant_to_dict(r) for r in restaurants],
+            'next_cursor': next_cursor
+        }).encode('utf-8')
+        if use_gzip:
+            body = gzip.compress(body, 6)
+        response = Response(body, mimetype='application/json')
+    
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+    return response
+
+@bp.route('/search')
+def search_restaurants():
+    """Restaurants ever found whose name or address matches `q`, best first
+    
+    Words match by prefix, so results come in while typing; Chinese
+    text matches anywhere in a name or address. Searches the full
+    history through the FTS5 index rather than scanning with LIKE, and
+    ranks every match by bm25 unless there are more than
+    SEARCH_FULL_RANK_MAX. Then only the SEARCH_RANK_WINDOW newest matches
+    are ranked and `truncated` is true: older matches may be missing.
+    """
+    expression = search.match_query(request.args.get('q'))
+    if expression is None:
+        return jsonify(error='q is required'), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT))
+    except ValueError:
+        return jsonify(error='limit must be a number'), 400
+    
+    # Counting stops one past the limit, so broad queries are not counted in full
+    matches = db.session.execute(db.text(f"""
+        SELECT count(*) FROM (
+            SELECT rowid FROM {search.TABLE} WHERE {search.TABLE} MATCH :expression LIMIT :cap
+        )
+    """), {'expression': expression, 'cap': SEARCH_FULL_RANK_MAX + 1}).scalar()
+    truncated = matches > SEARCH_FULL_RANK_MAX
+    
+    if truncated:
+        scored = f"""
+            SELECT rowid, {search.RANK} AS rank FROM {search.TABLE}
+            WHERE {search.TABLE} MATCH :expression
+            ORDER BY rowid DESC LIMIT :window
+        """
+    else:
+        scored = f"""
+            SELECT rowid, {search.RANK} AS rank FROM {search.TABLE}
+            WHERE {search.TABLE} MATCH :expression
+        """
+    rows = db.session.execute(db.text(f"""
+        SELECT h.id, h.region, h.name, h.address, h.openrice_url, h.district, h.iso_week, h.first_seen, r.rank
+        FROM (
+            SELECT rowid, rank FROM ({scored})
+            ORDER BY rank LIMIT :limit
+        ) AS r
+        JOIN restaurant_history AS h ON h.id = r.rowid
+        ORDER BY r.rank
+    """).columns(first_seen=db.DateTime), {
+        'expression': expression, 'window': SEARCH_RANK_WINDOW, 'limit': limit
+    }).mappings()
+    
+    return jsonify(query=request.args.get('q'), truncated=truncated, results=[
+        {
+            'id': row['id'],
+            'region': row['region'],
+            'name': row['name'],
+            'address': row['address'],
+            'url': row['openrice_url'],
+            'district': row['district'],
+            'week': row['iso_week'],
+            'first_seen': row['first_seen'].isoformat(),
+            'score': round(-row['rank'], 4)
+        }
+        for row in rows
+    ])
+
+@bp.route('/api/trends')
+def api_trends():
+    """New openings per ISO week and district of a region, read from the weekly rollups
+    
+    `region` picks the region, `weeks` sets how many of the latest weeks
+    to return and `district` narrows them to one district. Raw history
+    rows are never scanned.
+    """
+    try:
+        weeks = max(1, min(int(request.args.get('weeks', TRENDS_DEFAULT_WEEKS)), TRENDS_MAX_WEEKS))
+    except ValueError:
+        return jsonify(error='weeks must be a number'), 400
+    try:
+        region = region_param(request.args)
+        district = district_param(request.args, region)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    
+    # ISO week labels sort in time order
+    first_week = iso_week(datetime.utcnow() - timedelta(weeks=weeks - 1), region)
+    query = db.select(WeeklyDistrictRollup).where(
+        WeeklyDistrictRollup.region == region.key, WeeklyDistrictRollup.iso_week >= first_week
     )
+    if district:
+        query = query.where(WeeklyDistrictRollup.district == district)
     
-    scheduler.start()
-    print("Scheduler started - will scrape every Monday at 02:00 HKT")
+    by_week = {}
+    for rollup in db.session.execute(query.order_by(WeeklyDistrictRollup.iso_week)).scalars():
+        week = by_week.setdefault(rollup.iso_week, {'week': rollup.iso_week, 'new_openings': 0, 'districts': {}})
+        week['new_openings'] += rollup.new_openings
+        week['districts'][rollup.district] = rollup.new_openings
+    return jsonify(region=region.key, weeks=list(by_week.values()))
 
-# Initialize database when module loads (for Gunicorn)
-try:
-    with app.app_context():
-        db.create_all()
-        print("Database initialized successfully")
+def run_weekly_scrape(region_key=regions.DEFAULT_REGION):
+    """Scheduled entry point for a region's weekly scrape"""
+    # Stored jobs reference this function by name, so the app comes from the leader
+    with scheduler_leader.app.app_context():
+        update_restaurant_database(region_keys=[region_key])
+
+def try_acquire_lease(name, owner):
+    """Take or renew a named lease; True if `owner` holds it afterwards
+    
+    The claim is a single UPDATE that only matches a free, expired or
+    already owned lease, so concurrent workers cannot both win.
+    """
+    def claim():
+        now = datetime.utcnow()
+        db.session.execute(
+            sqlite_insert(SchedulerLease.__table__)
+            .values(name=name, owner=None, expires_at=now - timedelta(seconds=SCHEDULER_LEASE_TTL))
+            .on_conflict_do_nothing(index_elements=['name'])
+        )
+        result = db.session.execute(
+            db.update(SchedulerLease)
+            .where(SchedulerLease.name == name)
+            .where(db.or_(SchedulerLease.owner == owner, SchedulerLease.expires_at < now))
+            .values(owner=owner, expires_at=now + timedelta(seconds=SCHEDULER_LEASE_TTL))
+        )
+        return result.rowcount == 1
+    
+    return write(claim)
+
+def release_lease(name, owner):
+    write(lambda: db.session.execute(
+        db.update(SchedulerLease)
+        .where(SchedulerLease.name == name, SchedulerLease.owner == owner)
+        .values(owner=None, expires_at=datetime.utcnow())
+    ))
+
+class SchedulerLeader:
+    """Runs the job scheduler only while this process holds the scheduler lease"""
+    
+    lease_name = 'scheduler'
+    
+    def __init__(self, app):
+        self.app = app
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.scheduler = None
+        # Monotonic time until which the last successful claim holds the lease
+        self.held_until = 0.0
+    
+    def start_scheduler(self):
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from apscheduler.triggers.cron import CronTrigger
+        from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+        
+        # Jobs live in the database, so a new leader picks up where the old one stopped
+        scheduler = BackgroundScheduler(
+            jobstores={'default': SQLAlchemyJobStore(engine=db.engine)},
+            job_defaults={
+                'coalesce': True,
+                'max_instances': 1,
+                'misfire_grace_time': SCHEDULER_MISFIRE_GRACE
+            }
+        )
+        scheduler.start(paused=True)
+        
+        # Each region is scraped weekly at the local time its schedule gives
+        triggers = {
+            f'weekly_scrape:{region.key}': (region, CronTrigger(timezone=region.tz, **region.schedule))
+            for region in regions.enabled_regions()
+        }
+        
+        # Drop jobs of regions no longer scraped, and the single job from before regions
+        for job in scheduler.get_jobs():
+            if job.id not in triggers:
+                job.remove()
         
-        # Only run initial scrape if database is completely empty
+        for job_id, (region, trigger) in triggers.items():
+            # Keep a stored job as is, so a run missed during a restart still fires
+            job = scheduler.get_job(job_id)
+            if job is None:
+                scheduler.add_job(
+                    func=run_weekly_scrape,
+                    trigger=trigger,
+                    args=[region.key],
+                    id=job_id,
+                    name=f'Weekly OpenRice Scrape ({region.name})'
+                )
+            elif str(job.trigger) != str(trigger):
+                job.reschedule(trigger)
+        
+        scheduler.resume()
+        self.scheduler = scheduler
+        print(f"Scheduler started in {self.owner} - weekly scrapes: "
+              + ', '.join(f"{region.name} {trigger}" for region, trigger in triggers.values()))
+    
+    def stop_scheduler(self, reason):
+        self.scheduler.shutdown(wait=False)
+        self.scheduler = None
+        print(f"Scheduler stopped in {self.owner}, {reason}")
+    
+    def tick(self):
+        """Renew or take the lease, and start or stop the scheduler to match
+        
+        A renewal that fails (a busy database, a write timeout) says nothing
+        about who holds the lease, so the scheduler keeps running until the
+        last successful claim would have expired. Only a claim another
+        worker won stops it straight away.
+        """
+        claimed_at = time.monotonic()
         try:
-            restaurant_count = Restaurant.query.count()
-            if restaurant_count == 0:
-                print("Database empty, adding fallback data...")
-                # Add fallback data without running the scraper
-                fallback_restaurants = [
-                    {'name': 'Hotaru', 'address': 'Shop 301, 3/F, K11 Art Mall, 18 Hanoi Road, Tsim Sha Tsui', 'url': 'https://www.google.com/maps/search/Hotaru+Tsim+Sha+Tsui+Hong+Kong'},
-                    {'name': 'Carna by Dario Cecchini', 'address': 'Shop OTE 401A, 4/F, Ocean Terminal, Harbour City, Tsim Sha Tsui', 'url': 'https://www.google.com/maps/search/Carna+by+Dario+Cecchini+Tsim+Sha+Tsui+Hong+Kong'},
-                    {'name': 'NOJO', 'address': '1-13 Elgin Street, Central', 'url': 'https://www.google.com/maps/search/NOJO+Central+Hong+Kong'},
-                ]
-                
-                for restaurant_data in fallback_restaurants:
-                    restaurant = Restaurant(
-                        name=restaurant_data['name'],
-                        address=restaurant_data['address'],
-                        openrice_url=restaurant_data['url'],
-                        date_added=datetime.utcnow()
-                    )
-                    db.session.add(restaurant)
-                db.session.commit()
-                print("Fallback data added")
-            else:
-                print(f"Database has {restaurant_count} restaurants")
+            with self.app.app_context():
+                leader = try_acquire_lease(self.lease_name, self.owner)
+                if leader:
+                    self.held_until = claimed_at + SCHEDULER_LEASE_TTL
+                    if self.scheduler is None:
+                        self.start_scheduler()
         except Exception as e:
-            print(f"Initial data setup error: {e}")
+            print(f"Scheduler lease error: {e}")
+            if self.scheduler is not None and time.monotonic() >= self.held_until:
+                self.stop_scheduler('lease expired')
+            return
+        if not leader and self.scheduler is not None:
+            self.stop_scheduler('lease taken by another worker')
+    
+    def run(self):
+        while True:
+            self.tick()
+            time.sleep(SCHEDULER_LEASE_RENEW)
+    
+    def release(self):
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+        try:
+            with self.app.app_context():
+                release_lease(self.lease_name, self.owner)
+        except Exception:
+            pass
 
-    # Set up scheduler (don't crash if this fails)
+scheduler_leader = None
+
+def start_scheduler(app):
+    """Join the scheduler leadership election in a background thread
+    
+    Called once per serving process: from __main__, or from gunicorn's
+    post_worker_init hook. Importing the app never starts it.
+    """
+    global scheduler_leader
+    if scheduler_leader is not None:
+        return scheduler_leader
     try:
-        setup_scheduler()
+        scheduler_leader = SchedulerLeader(app)
+        threading.Thread(target=scheduler_leader.run, name='scheduler-lease', daemon=True).start()
+        # Hand the lease over straight away on a clean shutdown
+        atexit.register(scheduler_leader.release)
     except Exception as e:
         print(f"Scheduler setup error: {e}")
+    return scheduler_leader
+
+def bootstrap_database():
+    """Create tables and indexes, and seed fallback rows into an empty database"""
+    db.create_all()
+    added_columns = upgrade_schema()
+    
+    restaurant_count = Restaurant.query.count()
+    if restaurant_count == 0:
+        print("Database empty, adding fallback data...")
+        # Add fallback data without running the scraper
+        fallback_restaurants = [
+            {'name': 'Hotaru', 'address': 'Shop 301, 3/F, K11 Art Mall, 18 Hanoi Road, Tsim Sha Tsui', 'url': 'https://www.google.com/maps/search/Hotaru+Tsim+Sha+Tsui+Hong+Kong'},
+            {'name': 'Carna by Dario Cecchini', 'address': 'Shop OTE 401A, 4/F, Ocean Terminal, Harbour City, Tsim Sha Tsui', 'url': 'https://www.google.com/maps/search/Carna+by+Dario+Cecchini+Tsim+Sha+Tsui+Hong+Kong'},
+            {'name': 'NOJO', 'address': '1-13 Elgin Street, Central', 'url': 'https://www.google.com/maps/search/NOJO+Central+Hong+Kong'},
+        ]
         
-except Exception as e:
-    print(f"Critical initialization error: {e}")
-    # Don't crash - let the app run without full initialization
+        for restaurant_data in fallback_restaurants:
+            restaurant = Restaurant(
+                name=restaurant_data['name'],
+                address=restaurant_data['address'],
+                openrice_url=restaurant_data['url'],
+                district=regions.HONG_KONG.districts.district_of(restaurant_data['address']),
+                date_added=datetime.utcnow()
+            )
+            db.session.add(restaurant)
+        db.session.commit()
+        bump_data_version()
+        print("Fallback data added")
+    else:
+        print(f"Database has {restaurant_count} restaurants")
+    
+    indexed = index_unindexed_restaurants()
+    if indexed:
+        print(f"Added dedupe keys for {indexed} restaurants")
+    matched = backfill_districts()
+    if matched:
+        print(f"Matched districts for {matched} restaurants")
+    if 'restaurant.district' in added_columns:
+        redistricted = redistrict_history()
+        print(f"Re-matched districts for {redistricted} history rows")
+    elif 'weekly_district_rollup.region' in added_columns:
+        rebuild_weekly_rollups()
+        db.session.commit()
+        print("Recounted the weekly rollups per region")
+    create_search_index()
+    recorded = record_unrecorded_history()
+    if recorded:
+        print(f"Added {recorded} restaurants to the history")
+    
+    db.session.execute(db.text(f'PRAGMA user_version = {SCHEMA_VERSION}'))
+    db.session.commit()
+
+def ensure_database(app):
+    """Bootstrap the database unless this schema version already did
+    
+    The check is one PRAGMA read, so workers of an already bootstrapped
+    deployment skip straight to serving. A file lock keeps workers that
+    start together from bootstrapping at the same time.
+    """
+    try:
+        with app.app_context():
+            if db.session.execute(db.text('PRAGMA user_version')).scalar() == SCHEMA_VERSION:
+                return
+            os.makedirs(app.instance_path, exist_ok=True)
+            with open(os.path.join(app.instance_path, 'bootstrap.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                # Another worker may have finished while we waited
+                db.session.rollback()
+                if db.session.execute(db.text('PRAGMA user_version')).scalar() != SCHEMA_VERSION:
+                    bootstrap_database()
+                    print("Database initialized successfully")
+    except Exception as e:
+        print(f"Critical initialization error: {e}")
+        # Don't crash - let the app run without full initialization
+
+@click.command('init-db')
+def init_db_command():
+    """Create tables, indexes and fallback data (run once per deployment)
+    
+    create_app() has already bootstrapped the database under the
+    bootstrap lock, as a starting worker would; this only runs it again
+    if that failed, under the same lock, and fails loudly if it still has.
+    """
+    ensure_database(current_app._get_current_object())
+    db.session.rollback()
+    if db.session.execute(db.text('PRAGMA user_version')).scalar() != SCHEMA_VERSION:
+        raise click.ClickException('Database initialization failed, see the errors above')
+    click.echo('Database initialized')
+
+@click.command('scrape')
+@click.option('--region', 'region_keys', multiple=True, type=click.Choice(list(regions.REGIONS)),
+              help='Region to scrape; repeat for several. Defaults to SCRAPE_REGIONS.')
+def scrape_command(region_keys):
+    """Run one scrape and update the database, as the weekly jobs do"""
+    for log_entry in update_restaurant_database(region_keys=region_keys or None):
+        click.echo(f"{regions.REGIONS[log_entry.region].name}: {log_entry.message}")
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """Pragmas for a new SQLite connection, and the functions the search triggers call"""
+    cursor = dbapi_connection.cursor()
+    # The journal mode is stored in the database file; switching needs it to be idle
+    if cursor.execute('PRAGMA journal_mode').fetchone()[0] != SQLITE_JOURNAL_MODE:
+        cursor.execute(f'PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}')
+    # In WAL mode a power cut can lose the last commits but never corrupts the file
+    cursor.execute(f"PRAGMA synchronous = {'NORMAL' if SQLITE_JOURNAL_MODE == 'wal' else 'FULL'}")
+    cursor.execute(f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_KB}')
+    cursor.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_BYTES}')
+    cursor.execute('PRAGMA temp_store = MEMORY')
+    cursor.close()
+    search.register_functions(dbapi_connection)
+
+def create_app():
+    """Application factory used by gunicorn (`app:create_app()`) and the flask CLI"""
+    app = Flask(__name__)
+    database_url = os.environ.get('DATABASE_URL', 'sqlite:///restaurants.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if ':memory:' not in database_url and database_url != 'sqlite://':
+        # In-memory databases get a single shared connection instead of a pool
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_POOL_OVERFLOW}
+    app.config['HTTP_CACHE_DIR'] = os.environ.get('HTTP_CACHE_DIR', os.path.join(app.instance_path, 'http_cache'))
+    app.config['DATA_VERSION_PATH'] = os.environ.get('DATA_VERSION_PATH', os.path.join(app.instance_path, 'data_version'))
+    
+    db.init_app(app)
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', configure_sqlite_connection)
+    # Every write of this process goes through one writer thread
+    app.extensions['writer'] = WriteQueue(app)
+    metrics.registry.share(METRICS_DIR, METRICS_FLUSH_SECONDS)
+    app.register_blueprint(bp)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(scrape_command)
+    
+    ensure_database(app)
+    return app
 
 if __name__ == '__main__':
     # Start Flask server (for local development only)
+    app = create_app()
+    start_scheduler(app)
     port = int(os.environ.get('PORT', 7860))
     print(f"Starting Flask server on 0.0.0.0:{port}")
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,94 @@
+"""Benchmark update_restaurant_database against growing scrape sizes
+
+Each size runs on a fresh SQLite file, seeded with as many existing rows
+as incoming ones and with their dedupe keys and history, as earlier
+stores would have left them: half are stale and get pruned, and half of
+the incoming rows are already stored and get skipped. The scraper is
+replaced with a function returning synthetic rows, so the time is that
+of deduplicating and storing them; the slowest stages of the store are
+listed from its log entry.
+
+    python benchmarks/bench_db_update.py [--sizes 20,1000,10000,50000]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_db_update_')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as tracker
+import scraper
+
+
+# Made-up names of four syllables, picked by a hash of the row number:
+# "Restaurant 123" would be "123" once normalized, and numbered names
+# share most of their shingles, so every LSH bucket as well
+SYLLABLES = [c + v + e for c in 'bdfghjklmnprstvwz' for v in 'aeiou' for e in ('', 'n', 'ng')]
+
+
+def synthetic_name(i):
+    digest = hashlib.blake2b(str(i).encode('utf-8'), digest_size=4).digest()
+    syllables = [SYLLABLES[b % len(SYLLABLES)] for b in digest]
+    return f"{''.join(syllables[:2]).title()} {''.join(syllables[2:]).title()}"
+
+
+def synthetic_rows(start, count):
+    return [
+        {'name': synthetic_name(i), 'address': f'{i} Queen\'s Road, Central', 'url': f'https://example.com/r{i}'}
+        for i in range(start, start + count)
+    ]
+
+
+def seed(size):
+    stale = datetime.utcnow() - timedelta(days=30)
+    fresh = datetime.utcnow()
+    rows = []
+    for i, data in enumerate(synthetic_rows(0, size)):
+        added = stale if i < size // 2 else fresh
+        rows.append({'name': data['name'], 'address': data['address'], 'openrice_url': data['url'],
+                     'date_added': added, 'created_at': added})
+    tracker.insert_restaurants(rows)
+    tracker.index_unindexed_restaurants()
+    tracker.record_unrecorded_history()
+    tracker.db.session.commit()
+
+
+def run(size):
+    # A database of its own, so no rows, keys or history carry over from a smaller size
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, f'bench_{size}.db')}"
+    with tracker.create_app().app_context():
+        seed(size)
+        incoming = synthetic_rows(size // 2, size)
+        scraper.scrape_openrice_new_restaurants = lambda region: incoming
+
+        start = time.perf_counter()
+        tracker.update_restaurant_database()
+        elapsed = time.perf_counter() - start
+
+        log = tracker.ScrapingLog.query.order_by(tracker.ScrapingLog.id.desc()).first()
+        assert log.status == 'success', log.message
+        stages = json.loads(log.stages)['stages']
+        return elapsed, log.restaurants_found, stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='20,1000,10000,50000')
+    args = parser.parse_args()
+
+    print(f"{'incoming':>9} {'inserted':>9} {'total ms':>10} {'us/row':>8}   slowest stages")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        elapsed, inserted, stages = run(size)
+        slowest = sorted(stages.items(), key=lambda item: -item[1]['seconds'])[:4]
+        print(f"{size:>9} {inserted:>9} {elapsed * 1000:>10.1f} {elapsed / size * 1e6:>8.1f}   "
+              + ', '.join(f"{name} {stage['seconds'] * 1000:.0f}ms" for name, stage in slowest))
+
+
+if __name__ == '__main__':
+    main()
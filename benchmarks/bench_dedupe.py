@@ -0,0 +1,169 @@
+"""Fuzzy dedupe benchmark on synthetic restaurant listings
+
+Builds --count listings from distinct restaurants (English and Chinese
+names, chains with several branches) where a share of them are
+re-listed as variants: branch suffixes, punctuation, case, full-width
+characters and abbreviated addresses. Reports:
+
+- LSH clustering time, compared with all-pairs matching timed on a
+  sample and extrapolated to the full size
+- precision and recall of the merged pairs against the known duplicates
+- checking a fresh batch against the listings stored in SQLite through
+  the dedupe_key table, i.e. what update_restaurant_database does
+
+    python benchmarks/bench_dedupe.py [--count 100000] [--batch 1000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='bench_dedupe_'), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['DATA_VERSION_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'data_version')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import dedupe
+
+SYLLABLES = ['ka', 'mi', 'to', 'ra', 'ne', 'so', 'lu', 'chi', 'bo', 'ya', 'shi', 'po', 'ten', 'gin', 'ma', 'ro',
+             'la', 'vi', 'do', 'ce', 'ban', 'kok', 'yum', 'fu', 'zen', 'tai', 'mo', 'pi', 'sa', 'le', 'dan', 'wok']
+WORDS = ['Kitchen', 'Bistro', 'Noodle', 'House', 'Grill', 'Cafe', 'Dim Sum', 'Ramen', 'Bar', 'Steak', 'Sushi', 'Tea']
+CJK = '龍鳳金滿福記茶餐廳麵家華興利源海港粥粉樓軒閣苑味香園'
+STREETS = ['Queen\'s Road Central', 'Elgin Street', 'Nathan Road', 'Hennessy Road', 'Lockhart Road',
+           'Hanoi Road', 'Peel Street', 'Wellington Street', 'Canton Road', 'Des Voeux Road']
+DISTRICTS = ['Central', 'Tsim Sha Tsui', 'Causeway Bay', 'Wan Chai', 'Mong Kok', 'Sheung Wan']
+ABBREVIATIONS = {'Road': 'Rd', 'Street': 'St'}
+
+
+def make_restaurant(rng):
+    if rng.random() < 0.2:
+        name = ''.join(rng.choice(CJK) for _ in range(rng.randint(3, 5)))
+    else:
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+        if rng.random() < 0.6:
+            name += ' ' + rng.choice(WORDS)
+    street = rng.choice(STREETS)
+    address = f"Shop {rng.randint(1, 999)}, {rng.randint(1, 30)}/F, {rng.randint(1, 300)} {street}, {rng.choice(DISTRICTS)}"
+    return {'name': name, 'address': address, 'url': ''}
+
+
+def make_variant(rng, restaurant):
+    name, address = restaurant['name'], restaurant['address']
+    change = rng.randrange(5)
+    if change == 0:
+        name = f"{name} ({address.split(', ')[-1]})"
+    elif change == 1:
+        name = name.upper() + '!'
+    elif change == 2:
+        # Full-width, as pasted from Chinese listings
+        name = ''.join(chr(ord(c) + 0xFEE0) if '!' <= c <= '~' else c for c in name)
+    elif change == 3:
+        address = address.split(', ')[-1] + ', Hong Kong'
+    for word, short in ABBREVIATIONS.items():
+        address = address.replace(word, short)
+    return {'name': name, 'address': address, 'url': ''}
+
+
+def synthetic_listings(count, rng, duplicate_share=0.2):
+    """Listings and, per listing, the id of the restaurant it really is"""
+    listings, truth = [], []
+    restaurants = []
+    while len(listings) < count:
+        if restaurants and rng.random() < duplicate_share:
+            source = rng.randrange(len(restaurants))
+            listings.append(make_variant(rng, restaurants[source]))
+        else:
+            restaurant = make_restaurant(rng)
+            # Chains: another branch under the same name at a different address
+            if restaurants and rng.random() < 0.05:
+                restaurant['name'] = restaurants[rng.randrange(len(restaurants))]['name']
+            restaurants.append(restaurant)
+            source = len(restaurants) - 1
+            listings.append(restaurant)
+        truth.append(source)
+    return listings, truth
+
+
+def pairs(groups):
+    found = set()
+    for group in groups:
+        for i in group:
+            for j in group:
+                if i < j:
+                    found.add((i, j))
+    return found
+
+
+def all_pairs_seconds(fingerprints):
+    start = time.perf_counter()
+    for i, a in enumerate(fingerprints):
+        for b in fingerprints[i + 1:]:
+            a.matches(b)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    listings, truth = synthetic_listings(args.count + args.batch, rng)
+    stored, batch = listings[:args.count], listings[args.count:]
+    print(f"{args.count} listings, {len(set(truth[:args.count]))} distinct restaurants")
+
+    start = time.perf_counter()
+    fingerprints = [dedupe.Fingerprint(r['name'], r['address']) for r in stored]
+    for fingerprint in fingerprints:
+        fingerprint.keys
+    fingerprint_time = time.perf_counter() - start
+    start = time.perf_counter()
+    groups = dedupe.cluster(fingerprints)
+    cluster_time = time.perf_counter() - start
+    print(f"fingerprint {fingerprint_time:7.2f} s   LSH cluster {cluster_time:7.2f} s   -> {len(groups)} groups")
+
+    sample = fingerprints[:2000]
+    estimate = all_pairs_seconds(sample) * (args.count / len(sample)) ** 2
+    print(f"all-pairs matching, extrapolated from {len(sample)}: {estimate:9.0f} s")
+
+    by_source = {}
+    for i in range(args.count):
+        by_source.setdefault(truth[i], []).append(i)
+    expected = pairs(by_source.values())
+    merged = pairs(groups)
+    true_positive = len(merged & expected)
+    print(f"pairs precision {true_positive / max(1, len(merged)):.3f}   recall {true_positive / max(1, len(expected)):.3f}")
+
+    import app as tracker
+    with tracker.create_app().app_context():
+        now = datetime.utcnow()
+        tracker.db.session.execute(tracker.db.delete(tracker.Restaurant))
+        tracker.db.session.execute(tracker.db.delete(tracker.DedupeKey))
+        unique = [stored[group[0]] for group in groups]
+        tracker.insert_restaurants([
+            {'name': r['name'], 'address': r['address'], 'openrice_url': '', 'date_added': now, 'created_at': now}
+            for r in unique
+        ])
+        tracker.index_restaurants(tracker.db.session.execute(
+            tracker.db.select(tracker.Restaurant.id, tracker.Restaurant.name, tracker.Restaurant.address)
+        ).all())
+        tracker.db.session.commit()
+
+        start = time.perf_counter()
+        known = {}
+        fresh = tracker.drop_stored_duplicates(
+            dedupe.dedupe_restaurants(batch, known), tracker.regions.HONG_KONG, known=known
+        )
+        check_time = time.perf_counter() - start
+        new_sources = {truth[args.count + i] for i in range(len(batch))} - set(truth[:args.count])
+        print(f"batch of {len(batch)} against {len(unique)} stored: {check_time * 1000:.0f} ms, "
+              f"{len(fresh)} kept ({len(new_sources)} genuinely new)")
+
+
+if __name__ == '__main__':
+    main()
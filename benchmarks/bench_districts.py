@@ -0,0 +1,122 @@
+"""District matching and district filters on a large restaurant table
+
+Builds --rows synthetic addresses (English and Chinese, with areas,
+malls and street names that repeat other areas' names) and reports:
+
+- addresses per second through the compiled matcher, against checking
+  every alias with `in` one by one
+- the /api/restaurants?district= page (Flask test client included),
+  read through the district index, against the LIKE '%...%' scan over
+  address it replaces. Like the page, the LIKE query walks the name
+  index and stops at 50 matches, so it is only cheap for common areas;
+  rare ones scan the whole table.
+
+    python benchmarks/bench_districts.py [--rows 200000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_districts_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}"
+os.environ['DATA_VERSION_PATH'] = os.path.join(WORKDIR, 'data_version')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import districts
+
+STREETS = ["Queen's Road Central", 'Nathan Road', 'Hennessy Road', 'Tai Po Road', 'Castle Peak Road',
+           'Canton Road', 'Kwun Tong Road', 'Elgin Street', '彌敦道', '軒尼詩道', '大埔道']
+PLACES = ['Central', 'Tsim Sha Tsui', 'Causeway Bay', 'Mong Kok', 'Sham Shui Po', 'Sha Tin', 'Tsuen Wan',
+          'Harbour City', 'K11 MUSEA', 'Times Square', 'apm', 'New Town Plaza', '尖沙咀', '旺角', '銅鑼灣']
+
+# (district argument, LIKE pattern an address filter would need)
+QUERIES = [
+    ('Yau Tsim Mong', '%Tsim Sha Tsui%'),
+    ('Wan Chai', '%Causeway Bay%'),
+    ('Sha Tin', '%Sha Tin%'),
+    ('Islands', '%Tung Chung%'),
+]
+
+
+def synthetic_addresses(count, rng):
+    for _ in range(count):
+        place = rng.choice(PLACES)
+        street = rng.choice(STREETS)
+        if not place.isascii():
+            yield f"{place}{street}{rng.randint(1, 300)}號"
+        else:
+            yield f"Shop {rng.randint(1, 999)}, {rng.randint(1, 300)} {street}, {place}"
+
+
+def naive_district_of(text, aliases):
+    """Every alias tried in turn with `in`, first one found wins"""
+    for alias, district in aliases:
+        if alias in text:
+            return district
+    return None
+
+
+def timed(run, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    addresses = list(synthetic_addresses(args.rows, random.Random(args.seed)))
+    aliases = [(alias, district) for district, names in districts.DISTRICT_ALIASES.items() for alias in names]
+    print(f"{len(aliases)} names over {len(districts.DISTRICTS)} districts")
+
+    start = time.perf_counter()
+    matched = [districts.district_of(address) for address in addresses]
+    matcher_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for address in addresses:
+        naive_district_of(address, aliases)
+    naive_seconds = time.perf_counter() - start
+    print(f"{'matcher':<24} {args.rows / matcher_seconds:>10.0f} addresses/s  "
+          f"({sum(d is not None for d in matched)} matched)")
+    print(f"{'alias-by-alias scan':<24} {args.rows / naive_seconds:>10.0f} addresses/s")
+
+    import app as tracker
+    app = tracker.create_app()
+    client = app.test_client()
+    with app.app_context():
+        db = tracker.db
+        now = datetime.utcnow()
+        db.session.execute(db.delete(tracker.Restaurant))
+        db.session.connection().execute(tracker.Restaurant.__table__.insert(), [
+            {'name': f'Restaurant {i}', 'address': address, 'openrice_url': '', 'district': district,
+             'date_added': now, 'created_at': now}
+            for i, (address, district) in enumerate(zip(addresses, matched))
+        ])
+        db.session.commit()
+
+        print(f"{'district':<16} {'rows':>8} {'/api ms':>9} {'LIKE ms':>9}")
+        for name, pattern in QUERIES:
+            api_ms, response = timed(lambda: client.get(
+                '/api/restaurants', query_string={'district': name, 'window': 'all', 'limit': 50}
+            ), args.repeat)
+            assert response.status_code == 200
+            like = db.text('SELECT * FROM restaurant WHERE address LIKE :pattern ORDER BY name, id LIMIT 50')
+            like_ms, _ = timed(lambda: db.session.execute(like, {'pattern': pattern}).all(), args.repeat)
+            rows = db.session.query(tracker.Restaurant).filter_by(district=name).count()
+            print(f"{name:<16} {rows:>8} {api_ms:>9.2f} {like_ms:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Parse benchmark for OpenRice listing and search pages
+
+Runs the single-pass extractor and the previous multi-pass
+BeautifulSoup code over every page in benchmarks/fixtures/openrice and
+reports pages per second and peak memory for each. The shipped fixtures
+are synthetic pages that mirror OpenRice's listing markup; saved real
+pages can be dropped into the same directory.
+
+    python benchmarks/bench_extractor.py [--rounds 20] [fixtures_dir]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bs4 import BeautifulSoup
+import extractor
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'openrice')
+
+
+def legacy_extract(html):
+    """The scraper's original parsing code, kept as a baseline"""
+    soup = BeautifulSoup(html, 'html.parser')
+    restaurants = []
+
+    restaurant_cards = []
+    restaurant_cards.extend(soup.find_all('div', class_='sr1-listing-item'))
+    restaurant_cards.extend(soup.find_all('div', class_='poi-list-item'))
+    restaurant_cards.extend(soup.find_all('div', class_='restaurant-item'))
+    restaurant_cards.extend(soup.find_all('a', {'title': True, 'href': lambda x: x and '/restaurant/' in x}))
+    restaurant_cards.extend(soup.find_all(['h2', 'h3'], class_=['title-name', 'sr1-listing-item-title']))
+    if not restaurant_cards:
+        restaurant_cards = soup.find_all('a', href=lambda x: x and '/restaurant/' in x and '-r' in x and all(exc not in x.lower() for exc in ['review', 'search', 'submit', 'contact', 'info']))
+
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            data = json.loads(script.string)
+            if isinstance(data, list):
+                for item in data:
+                    if item.get('@type') == 'Restaurant':
+                        restaurants.append({
+                            'name': item.get('name', ''),
+                            'address': item.get('address', {}).get('streetAddress', ''),
+                            'url': item.get('url', '')
+                        })
+        except Exception:
+            pass
+
+    for card in restaurant_cards[:20]:
+        name = address = restaurant_url = None
+        name_elem = card.find(['h2', 'h3', 'h4', 'span', 'a'], class_=['name', 'title', 'restaurant-name', 'poi-name'])
+        if not name_elem and card.name == 'a':
+            name_elem = card
+        if not name_elem:
+            name_elem = card.find(string=True, recursive=False)
+        if name_elem:
+            name = name_elem.get_text(strip=True) if hasattr(name_elem, 'get_text') else str(name_elem).strip()
+        address_elem = card.find(['span', 'div', 'p'], class_=['address', 'location', 'district', 'address-info'])
+        if not address_elem:
+            address_elem = card.find(string=lambda text: text and any(dist in text for dist in ['Central', 'Tsim Sha Tsui', 'Causeway Bay', 'Wan Chai', 'Admiralty']))
+        if address_elem:
+            address = address_elem.get_text(strip=True) if hasattr(address_elem, 'get_text') else str(address_elem).strip()
+        if card.name == 'a' and card.get('href'):
+            restaurant_url = card.get('href')
+        else:
+            link_elem = card.find('a', href=lambda x: x and '/restaurant/' in x)
+            if link_elem:
+                restaurant_url = link_elem.get('href')
+        if name and (address or restaurant_url):
+            restaurants.append({'name': name, 'address': address or 'Hong Kong', 'url': restaurant_url or ''})
+
+    links = soup.find_all('a', href=lambda x: x and '/restaurant/' in x and '-r' in x and 'search' not in x.lower() and 'submit' not in x.lower() and 'contact' not in x.lower())
+    for link in links[:5]:
+        restaurants.append({'name': link.get_text(strip=True), 'address': 'Hong Kong', 'url': link.get('href')})
+    return restaurants
+
+
+def single_pass_extract(html):
+    found = extractor.extract_candidates(html)
+    cards = found['cards'] or found['links']
+    return found['json_ld'] + cards[:20] + found['links'][:5]
+
+
+def measure(extract, pages, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            extract(html)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for html in pages:
+        extract(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return len(pages) * rounds / elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('fixtures_dir', nargs='?', default=FIXTURES_DIR)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures_dir, '*.html')))
+    if not paths:
+        sys.exit(f"No .html fixtures in {args.fixtures_dir}")
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    size_kb = sum(len(p) for p in pages) / 1024
+    print(f"{len(pages)} pages ({size_kb:.0f} KiB), {args.rounds} rounds, parser backend: {extractor.PARSER}")
+
+    for label, extract in [('legacy multi-pass', legacy_extract), ('single-pass extractor', single_pass_extract)]:
+        pages_per_sec, peak = measure(extract, pages, args.rounds)
+        print(f"{label:<24} {pages_per_sec:8.1f} pages/s   peak {peak / 1024 / 1024:6.2f} MiB")
+
+    for label, extract in [('legacy multi-pass', legacy_extract), ('single-pass extractor', single_pass_extract)]:
+        names = {r['name'] for page in pages for r in extract(page) if r['name']}
+        print(f"{label:<24} {len(names):8d} distinct names")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Places coverage benchmark against a local stub of the Places API
+
+Starts the stub in places_stub.py, which answers nearbysearch and
+details requests over synthetic restaurants: dense clusters around busy
+districts plus a sparse scatter over the territory. The old five
+fixed search points and the quadtree sweep in search_google_maps_restaurants
+are run against it, reporting API calls made and the share of
+restaurants found.
+
+    python benchmarks/bench_geosweep.py [--places 5000] [--seed 1]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_geosweep_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}"
+os.environ['DATA_VERSION_PATH'] = os.path.join(WORKDIR, 'data_version')
+os.environ['GOOGLE_MAPS_API_KEY2'] = 'AIzaStubKey'
+os.environ['PLACES_QPS'] = '1000'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from places_stub import StubPlaces, serve, synthetic_places
+
+LEGACY_LOCATIONS = [
+    (22.2796, 114.1588), (22.2988, 114.1722), (22.2802, 114.1858), (22.2772, 114.1750), (22.2817, 114.1533)
+]
+
+
+def legacy_search(base_url):
+    """The five fixed 1 km searches used before the sweep, paging through each"""
+    import googlemaps
+    gmaps = googlemaps.Client(key='AIzaStubKey', base_url=base_url, queries_per_second=1000)
+    found = {}
+    for location in LEGACY_LOCATIONS:
+        result = gmaps.places_nearby(location=location, radius=1000, type='restaurant')
+        while True:
+            for place in result.get('results', []):
+                found[place['place_id']] = place
+            if not result.get('next_page_token'):
+                break
+            result = gmaps.places_nearby(page_token=result['next_page_token'])
+    for place_id in found:
+        gmaps.place(place_id)
+    return len(found)
+
+
+def report(label, stub, found, total):
+    calls = stub.calls['nearby'] + stub.calls['details']
+    print(f"{label:<24} {stub.calls['nearby']:>8} {stub.calls['details']:>8} {calls:>8} "
+          f"{found:>8} {found / total:>9.1%}")
+    stub.calls = {'nearby': 0, 'details': 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--places', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    stub = StubPlaces(synthetic_places(args.places, random.Random(args.seed)))
+    server = serve(stub)
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    os.environ['PLACES_BASE_URL'] = base_url
+
+    import app as tracker
+    import geosweep
+    import scraper
+    scraper.PAGE_TOKEN_DELAY = 0
+
+    print(f"{args.places} stub restaurants")
+    print(f"{'':<24} {'nearby':>8} {'details':>8} {'calls':>8} {'found':>8} {'coverage':>9}")
+    report('five fixed points', stub, legacy_search(base_url), args.places)
+
+    with tracker.create_app().app_context():
+        found = scraper.search_google_maps_restaurants()
+    report('quadtree sweep', stub, len(found), args.places)
+
+    root = geosweep.Tile(*geosweep.HONG_KONG_BOUNDS, scraper.PLACES_MIN_TILE_RADIUS)
+    depth = 0
+    while root.radius / 2 ** depth / 2 >= scraper.PLACES_MIN_TILE_RADIUS:
+        depth += 1
+    print(f"a uniform grid of the smallest tiles would take {4 ** depth} nearby calls")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""End-to-end benchmark of update_restaurant_database on recorded traffic
+
+For each size, a synthetic territory of that many restaurants is served
+by the Places stub (places_stub.py) and one full run is recorded to
+fixtures (HTTP_FIXTURES_MODE=record). A fresh process then replays those
+fixtures with the given latency and error rate (HTTP_FIXTURES_MODE=replay)
+and runs update_restaurant_database against an empty database, with
+politeness delays off. Reported per size: listings stored, run time,
+listings per second, HTTP latency percentiles as seen by the scraper,
+peak RSS, and the slowest stages.
+
+The OpenRice fallback is replayed the same way from the pages in
+benchmarks/fixtures/openrice, which stand in for the two listing URLs,
+plus a generated page for every restaurant listed without an address,
+for the enrichment stage to read it from.
+
+    python benchmarks/bench_pipeline.py [--sizes 100,10000,100000] [--latency-ms 5]
+                                        [--jitter-ms 2] [--error-rate 0.001]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+OPENRICE_PAGES = {
+    'https://www.openrice.com/en/hongkong/restaurants?sortBy=ORScoreDesc&conditionId=2005': 'listing_sort_orscore.html',
+    'https://www.openrice.com/en/hongkong/restaurants?conditionId=2005': 'listing_condition_2005.html',
+}
+
+# Share of stub restaurants scattered over the territory instead of clustered
+SCATTER_SHARE = 0.6
+
+AREAS = ['Central', 'Sheung Wan', 'Wan Chai', 'Causeway Bay', 'Tsim Sha Tsui', 'Mong Kok']
+CUISINES = ['Japanese', 'Italian', 'Cantonese', 'French', 'Korean', 'Thai']
+
+
+def child_env(workdir, **extra):
+    os.makedirs(workdir, exist_ok=True)
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'DATA_VERSION_PATH': os.path.join(workdir, 'data_version'),
+        'HTTP_CACHE_DIR': os.path.join(workdir, 'http_cache'),
+        'POLITENESS_DELAYS': '0',
+        'PLACES_QPS': '100000',
+        'PLACES_CACHE_MAX_ENTRIES': '1000000',
+    })
+    env.update({key: str(value) for key, value in extra.items()})
+    return env
+
+
+def run_child(args, env):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__)] + args,
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    # The pipeline prints progress; the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def percentile(ordered, share):
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))] * 1000 if ordered else 0.0
+
+
+def run_pipeline():
+    """One update_restaurant_database run in this process, with its measurements"""
+    import app as tracker
+    import scraper
+
+    with tracker.create_app().app_context():
+        start = time.perf_counter()
+        [log] = tracker.update_restaurant_database()
+        elapsed = time.perf_counter() - start
+        assert log.status == 'success', log.message
+        stages = json.loads(log.stages)['stages']
+    transport = scraper.fixture_transport()
+    timings = sorted(getattr(transport, 'timings', []))
+    return {
+        'listings': log.restaurants_found,
+        'seconds': elapsed,
+        'requests': len(timings),
+        'misses': getattr(transport, 'misses', 0),
+        'p50_ms': percentile(timings, 0.50),
+        'p95_ms': percentile(timings, 0.95),
+        'p99_ms': percentile(timings, 0.99),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'stages': {name: stage['seconds'] for name, stage in stages.items()},
+    }
+
+
+def record(size, seed):
+    """Serve `size` stub restaurants and record one run's Places traffic"""
+    from places_stub import StubPlaces, serve, synthetic_places
+    places = synthetic_places(size, random.Random(seed), scatter_share=SCATTER_SHARE, realistic_names=True)
+    server = serve(StubPlaces(places))
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    os.environ['PLACES_BASE_URL'] = base_url
+    result = run_pipeline()
+    server.shutdown()
+    return dict(result, base_url=base_url)
+
+
+def restaurant_page(name, rng):
+    """A restaurant's own page, giving its details in JSON-LD"""
+    data = {
+        '@context': 'https://schema.org',
+        '@type': 'Restaurant',
+        'name': name,
+        'address': {
+            '@type': 'PostalAddress',
+            'streetAddress': f"Shop {rng.randint(1, 99)}, G/F, {rng.randint(1, 300)} {name.split()[0]} Street",
+            'addressLocality': rng.choice(AREAS),
+        },
+        'geo': {'latitude': 22.28 + rng.random() / 10, 'longitude': 114.15 + rng.random() / 10},
+        'servesCuisine': rng.choice(CUISINES),
+    }
+    return (f'<html><head><script type="application/ld+json">{json.dumps(data)}</script></head>'
+            f'<body><h1>{name}</h1></body></html>').encode('utf-8')
+
+
+def store_openrice_pages(fixtures_dir, seed=1):
+    import enrich
+    import extractor
+    import replay
+    store = replay.FixtureStore(fixtures_dir)
+    rng = random.Random(seed)
+    html_headers = {'Content-Type': 'text/html; charset=utf-8'}
+    for url, filename in OPENRICE_PAGES.items():
+        with open(os.path.join(BENCH_DIR, 'fixtures', 'openrice', filename), 'rb') as f:
+            page = f.read()
+        store.save('GET', url, 200, html_headers, page)
+        for restaurant in extractor.extract_listing(page):
+            if enrich.needs_details(restaurant):
+                store.save('GET', restaurant['url'], 200, html_headers, restaurant_page(restaurant['name'], rng))
+
+
+def report(label, result):
+    slowest = sorted(result['stages'].items(), key=lambda item: -item[1])[:3]
+    print(f"{label:>9} {result['listings']:>9} {result['seconds']:>9.2f} "
+          f"{result['listings'] / result['seconds']:>10.0f} {result['requests']:>9} "
+          f"{result['p50_ms']:>7.2f} {result['p95_ms']:>7.2f} {result['p99_ms']:>7.2f} "
+          f"{result['peak_rss_mb']:>8.0f}   " + ', '.join(f"{name} {seconds:.1f}s" for name, seconds in slowest))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,10000,100000')
+    parser.add_argument('--latency-ms', type=float, default=5)
+    parser.add_argument('--jitter-ms', type=float, default=2)
+    parser.add_argument('--error-rate', type=float, default=0.001)
+    parser.add_argument('--seed', type=int, default=1)
+    # Used by the child processes this script starts
+    parser.add_argument('--child', choices=['record', 'replay'])
+    parser.add_argument('--size', type=int)
+    args = parser.parse_args()
+
+    if args.child == 'record':
+        print(json.dumps(record(args.size, args.seed)))
+        return
+    if args.child == 'replay':
+        print(json.dumps(run_pipeline()))
+        return
+
+    replay_options = {
+        'HTTP_FIXTURES_MODE': 'replay',
+        'HTTP_REPLAY_LATENCY_MS': args.latency_ms,
+        'HTTP_REPLAY_JITTER_MS': args.jitter_ms,
+        'HTTP_REPLAY_ERROR_RATE': args.error_rate,
+    }
+    print(f"replaying with {args.latency_ms:g} ms latency (±{args.jitter_ms:g}), "
+          f"{args.error_rate:.1%} errors")
+    print(f"{'size':>9} {'listings':>9} {'seconds':>9} {'listings/s':>10} {'requests':>9} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'RSS MB':>8}   slowest stages")
+
+    for size in [int(s) for s in args.sizes.split(',')]:
+        workdir = tempfile.mkdtemp(prefix=f'bench_pipeline_{size}_')
+        fixtures_dir = os.path.join(workdir, 'fixtures')
+        recorded = run_child(['--child', 'record', '--size', str(size), '--seed', str(args.seed)], child_env(
+            os.path.join(workdir, 'record'), GOOGLE_MAPS_API_KEY2='AIzaStubKey',
+            HTTP_FIXTURES_MODE='record', HTTP_FIXTURES_DIR=fixtures_dir
+        ))
+        result = run_child(['--child', 'replay'], child_env(
+            os.path.join(workdir, 'replay'), GOOGLE_MAPS_API_KEY2='AIzaStubKey',
+            HTTP_FIXTURES_DIR=fixtures_dir, PLACES_BASE_URL=recorded['base_url'], **replay_options
+        ))
+        report(str(size), result)
+
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_openrice_')
+    fixtures_dir = os.path.join(workdir, 'fixtures')
+    store_openrice_pages(fixtures_dir, args.seed)
+    env = child_env(os.path.join(workdir, 'replay'), HTTP_FIXTURES_DIR=fixtures_dir, **replay_options)
+    env.pop('GOOGLE_MAPS_API_KEY2', None)
+    report('openrice', run_child(['--child', 'replay'], env))
+
+
+if __name__ == '__main__':
+    main()
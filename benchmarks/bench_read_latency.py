@@ -0,0 +1,199 @@
+"""Page read latency while a large scrape result is written
+
+Seeds a database with --rows restaurants, then starts --readers reader
+processes (standing in for gunicorn workers) that request pages of `/`
+at random cursors, so every request reads the database, and one more
+process (another worker) makes a small write every --small-write-interval
+seconds, as enqueue_refresh_job() does for /refresh. After a quiet spell
+one more process stores a fresh --rows restaurant scrape with
+replace=True, as /refresh does: the prune, inserts, history and search
+index updates. Reported per journal mode: read and small write latency
+percentiles before/after the store and while it runs, and reads and
+writes that failed (a write fails once it has waited the busy timeout
+for SQLite's write lock).
+
+With the rollback journal a write that outgrows the page cache takes
+the exclusive lock before it commits, and readers wait on it; in WAL
+mode they keep reading the last committed snapshot. Writers always
+take turns, so the store is made of short transactions.
+
+    python benchmarks/bench_read_latency.py [--rows 50000] [--readers 4] [--modes wal,delete]
+        [--small-write-interval 0.2]
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+AREAS = ['Central', 'Sheung Wan', 'Wan Chai', 'Causeway Bay', 'Tsim Sha Tsui', 'Mong Kok', 'Sha Tin', 'Tsuen Wan']
+
+
+def restaurants(count, seed, prefix):
+    rng = random.Random(seed)
+    return [
+        {
+            'name': f'{prefix} {i:06d}',
+            'address': f"Shop {rng.randint(1, 999)}, {rng.randint(1, 300)} Stub Street, {rng.choice(AREAS)}",
+            'url': '',
+        }
+        for i in range(count)
+    ]
+
+
+def child_env(workdir, mode):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'DATA_VERSION_PATH': os.path.join(workdir, 'data_version'),
+        'SQLITE_JOURNAL_MODE': mode,
+    })
+    return env
+
+
+def start_child(args, env):
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__)] + args, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+
+def result(process):
+    output, _ = process.communicate()
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def app_module():
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    import app as tracker
+    return tracker
+
+
+def seed(rows):
+    tracker = app_module()
+    app = tracker.create_app()
+    with app.app_context():
+        tracker.store_restaurants(restaurants(rows, 1, 'Seed'), True, datetime.utcnow())
+    print(json.dumps({'rows': rows}))
+
+
+def read(stop_path, seed_value):
+    """Request `/` at random cursors until `stop_path` exists; (time, seconds, failed) per request"""
+    tracker = app_module()
+    app = tracker.create_app()
+    client = app.test_client()
+    rng = random.Random(seed_value)
+    with app.app_context():
+        keys = tracker.db.session.execute(tracker.db.select(tracker.Restaurant.name, tracker.Restaurant.id)).all()
+    cursors = [base64.urlsafe_b64encode(json.dumps([name, rid]).encode('utf-8')).decode('ascii')
+               for name, rid in keys]
+    samples = []
+    while not os.path.exists(stop_path):
+        start = time.time()
+        response = client.get('/', query_string={'after': rng.choice(cursors)})
+        body = response.get_data()
+        samples.append((start, time.time() - start, response.status_code != 200 or b'Database Error' in body))
+    print(json.dumps(samples))
+
+
+def small_writes(stop_path, interval):
+    """Claim and finish a refresh job every `interval` seconds until `stop_path` exists; (time, seconds, failed)"""
+    tracker = app_module()
+    app = tracker.create_app()
+    samples = []
+    with app.app_context():
+        while not os.path.exists(stop_path):
+            start = time.time()
+            try:
+                job, _ = tracker.enqueue_refresh_job()
+                job_id = job.id
+                tracker.write(lambda: tracker.update_refresh_job(job_id, active=None, status='success'))
+                failed = False
+            except Exception:
+                tracker.db.session.rollback()
+                failed = True
+            samples.append((start, time.time() - start, failed))
+            time.sleep(interval)
+    print(json.dumps(samples))
+
+
+def write_scrape(rows, before, after, stop_path):
+    tracker = app_module()
+    app = tracker.create_app()
+    fresh = restaurants(rows, 2, 'Fresh')
+    time.sleep(before)
+    with app.app_context():
+        start = time.time()
+        tracker.store_restaurants(fresh, True, datetime.utcnow())
+        end = time.time()
+    time.sleep(after)
+    open(stop_path, 'w').close()
+    print(json.dumps({'start': start, 'end': end}))
+
+
+def percentiles(latencies):
+    ordered = sorted(latencies)
+    if not ordered:
+        return '      -       -       -'
+    pick = lambda share: ordered[min(len(ordered) - 1, int(share * len(ordered)))] * 1000
+    return f"{pick(0.5):>7.1f} {pick(0.99):>7.1f} {ordered[-1] * 1000:>7.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--modes', default='wal,delete')
+    parser.add_argument('--quiet-seconds', type=float, default=3)
+    parser.add_argument('--small-write-interval', type=float, default=0.2)
+    # Used by the child processes this script starts
+    parser.add_argument('--child', choices=['seed', 'read', 'write', 'small-writes'])
+    parser.add_argument('--stop-path')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.child == 'seed':
+        seed(args.rows)
+        return
+    if args.child == 'read':
+        read(args.stop_path, args.seed)
+        return
+    if args.child == 'small-writes':
+        small_writes(args.stop_path, args.small_write_interval)
+        return
+    if args.child == 'write':
+        write_scrape(args.rows, args.quiet_seconds, args.quiet_seconds, args.stop_path)
+        return
+
+    print(f"{args.readers} readers and one small writer, {args.rows}-row store; latency in ms")
+    print(f"{'mode':<7} {'window':<7} {'kind':<6} {'count':>6} {'failed':>6} {'p50':>7} {'p99':>7} {'max':>7}   store s")
+    for mode in args.modes.split(','):
+        workdir = tempfile.mkdtemp(prefix=f'bench_read_latency_{mode}_')
+        env = child_env(workdir, mode)
+        stop_path = os.path.join(workdir, 'stop')
+        result(start_child(['--child', 'seed', '--rows', str(args.rows)], env))
+        readers = [start_child(['--child', 'read', '--stop-path', stop_path, '--seed', str(i)], env)
+                   for i in range(args.readers)]
+        small_writer = start_child(['--child', 'small-writes', '--stop-path', stop_path,
+                                    '--small-write-interval', str(args.small_write_interval)], env)
+        writer = start_child(['--child', 'write', '--rows', str(args.rows), '--stop-path', stop_path,
+                              '--quiet-seconds', str(args.quiet_seconds)], env)
+        window = result(writer)
+        reads = [sample for reader in readers for sample in result(reader)]
+        writes = result(small_writer)
+
+        overlaps = lambda s: s[0] < window['end'] and s[0] + s[1] > window['start']
+        for label in ('quiet', 'store'):
+            for kind, samples in (('read', reads), ('write', writes)):
+                chosen = [s for s in samples if overlaps(s) == (label == 'store')]
+                ok = [s[1] for s in chosen if not s[2]]
+                failed = sum(1 for s in chosen if s[2])
+                print(f"{mode:<7} {label:<7} {kind:<6} {len(chosen):>6} {failed:>6} {percentiles(ok)}"
+                      + (f"   {window['end'] - window['start']:.1f}" if label == 'store' and kind == 'read' else ''))
+
+
+if __name__ == '__main__':
+    main()
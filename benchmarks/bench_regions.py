@@ -0,0 +1,157 @@
+"""Scraping several regions: sharded in worker processes against one after another
+
+Generates OpenRice traffic for Hong Kong and Macau (two listing pages per
+region, whose restaurants come without an address, and each restaurant's
+own page) and replays it with the given latency and OpenRice pacing. Each
+scenario runs update_restaurant_database in a fresh process against an
+empty database and reports, per region, the restaurants stored and when
+its results were committed, counted from the start of the run:
+
+- Hong Kong alone
+- both regions, one after another in one process (REGION_WORKERS=0)
+- both regions, each in a shard process of its own
+
+    python benchmarks/bench_regions.py [--restaurants 20] [--latency-ms 50] [--delay 0.2]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+AREAS = {
+    'hongkong': ['Central', 'Sheung Wan', 'Wan Chai', 'Causeway Bay', 'Tsim Sha Tsui', 'Mong Kok'],
+    'macau': ['Taipa', 'Cotai', 'Coloane', 'NAPE', 'Senado Square', 'Taipa Village'],
+}
+CUISINES = ['Japanese', 'Italian', 'Cantonese', 'Macanese', 'Portuguese', 'Thai']
+
+SCENARIOS = [
+    ('Hong Kong alone', 'hongkong', 4),
+    ('both, one after another', 'hongkong,macau', 0),
+    ('both, sharded', 'hongkong,macau', 4),
+]
+
+
+def listing_page(region, restaurants):
+    """A listing page like OpenRice's: one card per restaurant, linking to its page"""
+    cards = ''.join(
+        f'<div class="sr1-listing-item"><h2 class="sr1-listing-item-title">'
+        f'<a class="title-name" href="{path}">{name}</a></h2></div>'
+        for name, path in restaurants
+    )
+    return f'<html><body><div class="sr1-listing-container">{cards}</div></body></html>'.encode('utf-8')
+
+
+def restaurant_page(region_key, name, rng):
+    data = {
+        '@context': 'https://schema.org',
+        '@type': 'Restaurant',
+        'name': name,
+        'address': {
+            '@type': 'PostalAddress',
+            'streetAddress': f"Shop {rng.randint(1, 99)}, G/F, {rng.randint(1, 300)} {name.split()[0]} Street",
+            'addressLocality': rng.choice(AREAS[region_key]),
+        },
+        'servesCuisine': rng.choice(CUISINES),
+    }
+    return (f'<html><head><script type="application/ld+json">{json.dumps(data)}</script></head>'
+            f'<body><h1>{name}</h1></body></html>').encode('utf-8')
+
+
+def store_pages(fixtures_dir, count, seed):
+    import regions
+    import replay
+    store = replay.FixtureStore(fixtures_dir)
+    rng = random.Random(seed)
+    headers = {'Content-Type': 'text/html; charset=utf-8'}
+    for region in regions.REGIONS.values():
+        store.save('GET', region.openrice_url(), 200, headers, b'<html><body></body></html>')
+        listings = [
+            region.openrice_url(f'/restaurants?sortBy=ORScoreDesc&conditionId={region.new_condition_id}'),
+            region.openrice_url(f'/restaurants?conditionId={region.new_condition_id}'),
+        ]
+        for page, url in enumerate(listings):
+            restaurants = []
+            for i in range(count):
+                name = f"{rng.choice(CUISINES)} {region.name} {page}-{i}"
+                path = f"/en/{region.key}/restaurant/{name.lower().replace(' ', '-')}-r{page * 1000 + i}"
+                restaurants.append((name, path))
+                store.save('GET', f'https://www.openrice.com{path}', 200, headers,
+                           restaurant_page(region.key, name, rng))
+            store.save('GET', url, 200, headers, listing_page(region, restaurants))
+
+
+def run_update():
+    """One update_restaurant_database run in this process: per region, stored count and commit time"""
+    import app as tracker
+    with tracker.create_app().app_context():
+        start = time.time()
+        log_entries = tracker.update_restaurant_database()
+        wall = time.time() - start
+        # Log timestamps are naive UTC
+        return {
+            'seconds': wall,
+            'regions': {
+                entry.region: {
+                    'stored': entry.restaurants_found,
+                    'status': entry.status,
+                    'done': entry.timestamp.timestamp() - time.timezone - start,
+                }
+                for entry in log_entries
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--restaurants', type=int, default=20, help='per listing page')
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--delay', type=float, default=0.2, help='OpenRice pacing, seconds between requests')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--child', action='store_true')
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_update()))
+        return
+
+    workdir = tempfile.mkdtemp(prefix='bench_regions_')
+    fixtures_dir = os.path.join(workdir, 'fixtures')
+    store_pages(fixtures_dir, args.restaurants, args.seed)
+
+    print(f"{args.restaurants * 2} restaurants per region, {args.latency_ms:g} ms latency, "
+          f"{args.delay:g} s between requests to a host")
+    print(f"{'':<26} {'seconds':>8} {'HK stored':>10} {'HK done s':>10} {'Macau stored':>13} {'Macau done s':>13}")
+    for label, scrape_regions, workers in SCENARIOS:
+        rundir = os.path.join(workdir, label.replace(' ', '_').replace(',', ''))
+        os.makedirs(rundir)
+        env = dict(os.environ)
+        env.pop('GOOGLE_MAPS_API_KEY2', None)
+        env.update({
+            'DATABASE_URL': f"sqlite:///{os.path.join(rundir, 'bench.db')}",
+            'DATA_VERSION_PATH': os.path.join(rundir, 'data_version'),
+            'HTTP_CACHE_DIR': os.path.join(rundir, 'http_cache'),
+            'HTTP_FIXTURES_MODE': 'replay',
+            'HTTP_FIXTURES_DIR': fixtures_dir,
+            'HTTP_REPLAY_LATENCY_MS': str(args.latency_ms),
+            'OPENRICE_MIN_DELAY': str(args.delay),
+            'OPENRICE_INITIAL_DELAY': str(args.delay),
+            'SCRAPE_REGIONS': scrape_regions,
+            'REGION_WORKERS': str(workers),
+        })
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], env=env,
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        hk = result['regions'].get('hongkong', {})
+        macau = result['regions'].get('macau', {})
+        print(f"{label:<26} {result['seconds']:>8.2f} {hk.get('stored', '-'):>10} {hk.get('done', 0):>10.2f} "
+              f"{macau.get('stored', '-'):>13} " + (f"{macau['done']:>13.2f}" if macau else f"{'-':>13}"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Search latency over a large restaurant history: FTS5 against LIKE
+
+Fills restaurant_history with --rows synthetic restaurants (English and
+Chinese names and addresses) through the sync triggers, then times the
+/search requests (Flask test client included) for a mix of search box
+inputs against LIKE '%...%' scans for the same text. The LIKE query
+stops at the first 20 matches in table order, unranked, so it is only
+cheap for frequent terms; rare terms scan the whole table. Queries with
+more than SEARCH_FULL_RANK_MAX matches only rank the newest ones and
+are reported as truncated.
+
+    python benchmarks/bench_search.py [--rows 1000000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_search_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}"
+os.environ['DATA_VERSION_PATH'] = os.path.join(WORKDIR, 'data_version')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+SYLLABLES = ['ka', 'mi', 'to', 'ra', 'ne', 'so', 'lu', 'chi', 'bo', 'ya', 'shi', 'po', 'ten', 'gin', 'ma', 'ro',
+             'la', 'vi', 'do', 'ce', 'ban', 'kok', 'yum', 'fu', 'zen', 'tai', 'mo', 'pi', 'sa', 'le', 'dan', 'wok']
+WORDS = ['Kitchen', 'Bistro', 'Noodle', 'House', 'Grill', 'Cafe', 'Dim Sum', 'Ramen', 'Bar', 'Steak', 'Sushi', 'Tea']
+CJK = '龍鳳金滿福記茶餐廳麵家華興利源海港粥粉樓軒閣苑味香園新開張'
+STREETS = ['Queen\'s Road Central', 'Elgin Street', 'Nathan Road', 'Hennessy Road', 'Lockhart Road',
+           'Hanoi Road', 'Peel Street', 'Wellington Street', 'Canton Road', 'Des Voeux Road', '彌敦道', '軒尼詩道']
+DISTRICTS = ['Central', 'Tsim Sha Tsui', 'Causeway Bay', 'Wan Chai', 'Mong Kok', 'Sheung Wan', '尖沙咀', '旺角']
+
+# (search box input, LIKE pattern on name or address)
+QUERIES = [
+    ('kitchen', '%kitchen%'),
+    ('kamito', '%kamito%'),
+    ('sush', '%sush%'),
+    ('dim sum', '%dim sum%'),
+    ('hennessy', '%hennessy%'),
+    ('茶餐廳', '%茶餐廳%'),
+    ('新開張', '%新開張%'),
+    ('旺角', '%旺角%'),
+    ('zenpo noodle', '%zenpo noodle%'),
+]
+
+
+def synthetic_rows(count, rng, start):
+    for i in range(count):
+        if rng.random() < 0.3:
+            name = ''.join(rng.choice(CJK) for _ in range(rng.randint(3, 6)))
+        else:
+            name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+            if rng.random() < 0.6:
+                name += ' ' + rng.choice(WORDS)
+        district = rng.choice(DISTRICTS)
+        address = f"Shop {rng.randint(1, 999)}, {rng.randint(1, 300)} {rng.choice(STREETS)}, {district}"
+        seen = start + timedelta(minutes=i)
+        yield {
+            'iso_week': f"{seen.isocalendar()[0]}-W{seen.isocalendar()[1]:02d}",
+            'name': f"{name} {i}",
+            'address': address,
+            'openrice_url': '',
+            'district': district,
+            'first_seen': seen,
+        }
+
+
+def timed(run, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    import app as tracker
+    app = tracker.create_app()
+    client = app.test_client()
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        db = tracker.db
+        start = time.perf_counter()
+        rows = synthetic_rows(args.rows, rng, datetime(2020, 1, 1))
+        while True:
+            batch = [row for _, row in zip(range(10000), rows)]
+            if not batch:
+                break
+            db.session.connection().execute(tracker.RestaurantHistory.__table__.insert(), batch)
+        db.session.commit()
+        print(f"{args.rows} history rows indexed in {time.perf_counter() - start:.1f} s")
+
+        print(f"{'query':<16} {'matches':>8} {'truncated':>9} {'/search ms':>11} {'LIKE ms':>9}")
+        for text, pattern in QUERIES:
+            search_ms, response = timed(lambda: client.get('/search', query_string={'q': text}), args.repeat)
+            assert response.status_code == 200
+            like = db.text(
+                'SELECT id FROM restaurant_history WHERE name LIKE :pattern OR address LIKE :pattern LIMIT 20'
+            )
+            like_ms, _ = timed(lambda: db.session.execute(like, {'pattern': pattern}).all(), max(1, args.repeat // 10))
+            matches = db.session.execute(
+                db.text(f'SELECT count(*) FROM {tracker.search.TABLE} WHERE {tracker.search.TABLE} MATCH :q'),
+                {'q': tracker.search.match_query(text)}
+            ).scalar()
+            truncated = 'yes' if response.get_json()['truncated'] else 'no'
+            print(f"{text:<16} {matches:>8} {truncated:>9} {search_ms:>11.2f} {like_ms:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
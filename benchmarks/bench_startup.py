@@ -0,0 +1,109 @@
+"""Cold start benchmark: time from interpreter start to the first response
+to GET /
+
+Every round runs in a fresh subprocess against an already bootstrapped
+SQLite file, the way a new gunicorn worker starts. The time is split into
+importing the app module, building the app, and serving the first
+request, and the heavy modules left in sys.modules are listed. --rev
+measures an older commit (checked out to a temporary git worktree) next
+to the working tree, for a before/after comparison.
+
+    python benchmarks/bench_startup.py [--rounds 5] [--rev a0b7ad3]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+HEAVY_MODULES = ['googlemaps', 'bs4', 'requests', 'apscheduler', 'lxml']
+
+# Runs inside the child; trees from before the app factory expose `app.app`
+# and start their scheduler on import, newer ones expose create_app()
+CHILD = r'''
+import json, os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, os.getcwd())
+import app as module
+imported = time.perf_counter()
+flask_app = module.create_app() if hasattr(module, 'create_app') else module.app
+created = time.perf_counter()
+response = flask_app.test_client().get('/')
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create': created - imported,
+    'first_get': served - created,
+    'total': served - start,
+    'heavy': [name for name in %r if name in sys.modules],
+}))
+'''
+
+
+def run_child(tree, env):
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD % HEAVY_MODULES],
+        cwd=tree, env=env, capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        sys.exit(f"Startup failed in {tree}:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(tree, rounds):
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+               DATA_VERSION_PATH=os.path.join(workdir, 'data_version'),
+               HTTP_CACHE_DIR=os.path.join(workdir, 'http_cache'),
+               # A lease renew interval longer than the run keeps old trees' schedulers idle
+               SCHEDULER_LEASE_RENEW='3600')
+    env.pop('GOOGLE_MAPS_API_KEY2', None)
+    try:
+        # The first start bootstraps the database; later ones are ordinary worker starts
+        run_child(tree, env)
+        return [run_child(tree, env) for _ in range(rounds)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def report(label, samples):
+    def median(key):
+        return statistics.median(s[key] for s in samples) * 1000
+    print(f"{label:<22} {median('import'):>9.1f} {median('create'):>9.1f} "
+          f"{median('first_get'):>10.1f} {median('total'):>9.1f}   {', '.join(samples[0]['heavy']) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--rev', help='git revision to compare against the working tree')
+    args = parser.parse_args()
+
+    trees = []
+    worktree = None
+    if args.rev:
+        worktree = tempfile.mkdtemp(prefix='bench_startup_rev_')
+        subprocess.run(['git', 'worktree', 'add', '--detach', worktree, args.rev],
+                       cwd=ROOT, check=True, capture_output=True)
+        trees.append((args.rev, worktree))
+    trees.append(('working tree', ROOT))
+
+    print(f"median of {args.rounds} cold starts, ms")
+    print(f"{'':<22} {'import':>9} {'create':>9} {'first GET':>10} {'total':>9}   heavy modules loaded")
+    try:
+        for label, tree in trees:
+            report(label, measure(tree, args.rounds))
+    finally:
+        if worktree:
+            subprocess.run(['git', 'worktree', 'remove', '--force', worktree], cwd=ROOT, capture_output=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Local stand-in for the Google Places nearbysearch and details endpoints
+
+Serves synthetic restaurants over HTTP: dense clusters around busy
+districts plus a sparse scatter over the territory. Like the real API it
+returns pages of 20, at most 60 results per search, most prominent
+first, and hands out next_page_token for the rest. Shared by the
+benchmarks that need Places traffic.
+"""
+import json
+import math
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import geosweep
+
+# (lat, lng, share of clustered restaurants, spread in metres)
+CLUSTERS = [
+    (22.2810, 114.1580, 0.18, 500),   # Central
+    (22.2980, 114.1720, 0.16, 600),   # Tsim Sha Tsui
+    (22.3190, 114.1690, 0.16, 600),   # Mong Kok
+    (22.2800, 114.1850, 0.14, 500),   # Causeway Bay
+    (22.3810, 114.1880, 0.08, 900),   # Sha Tin
+    (22.3710, 114.1140, 0.08, 900),   # Tsuen Wan
+    (22.4450, 114.0250, 0.07, 1000),  # Yuen Long
+    (22.3910, 113.9770, 0.07, 1000),  # Tuen Mun
+    (22.2880, 113.9420, 0.06, 700),   # Tung Chung
+]
+PAGE_SIZE = 20
+MAX_RESULTS = 60
+
+SYLLABLES = ['ka', 'mi', 'to', 'ra', 'ne', 'so', 'lu', 'chi', 'bo', 'ya', 'shi', 'po', 'ten', 'gin', 'ma', 'ro',
+             'la', 'vi', 'do', 'ce', 'ban', 'kok', 'yum', 'fu', 'zen', 'tai', 'mo', 'pi', 'sa', 'le', 'dan', 'wok']
+WORDS = ['Kitchen', 'Bistro', 'Noodle', 'House', 'Grill', 'Cafe', 'Dim Sum', 'Ramen', 'Bar', 'Steak', 'Sushi', 'Tea']
+
+# Grid cell size of the stub's spatial index, in degrees
+_CELL = 0.01
+
+
+def synthetic_places(count, rng, scatter_share=0.15, realistic_names=False):
+    """Places in the shape nearbysearch returns them, plus a hidden prominence"""
+    south, west, north, east = geosweep.HONG_KONG_BOUNDS
+    places = []
+    for i in range(count):
+        if rng.random() < scatter_share:
+            lat, lng = rng.uniform(south, north), rng.uniform(west, east)
+        else:
+            lat0, lng0, _, spread = rng.choices(CLUSTERS, weights=[c[2] for c in CLUSTERS])[0]
+            lat = lat0 + rng.gauss(0, spread) / geosweep.METRES_PER_DEGREE
+            lng = lng0 + rng.gauss(0, spread) / (geosweep.METRES_PER_DEGREE * math.cos(math.radians(lat0)))
+        if realistic_names:
+            name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+            if rng.random() < 0.6:
+                name += ' ' + rng.choice(WORDS)
+            vicinity = f"Shop {rng.randint(1, 999)}, {rng.randint(1, 300)} {name.split()[0]} Street"
+        else:
+            name = f'Stub Restaurant {i}'
+            vicinity = f'{i} Stub Street'
+        places.append({
+            'place_id': f'stub{i}',
+            'name': name,
+            'vicinity': vicinity,
+            'geometry': {'location': {'lat': lat, 'lng': lng}},
+            'prominence': rng.random(),
+        })
+    return places
+
+
+class StubPlaces:
+    def __init__(self, places):
+        self.places = places
+        self.by_id = {p['place_id']: p for p in places}
+        self.cells = {}
+        for place in places:
+            location = place['geometry']['location']
+            self.cells.setdefault(self._cell(location['lat'], location['lng']), []).append(place)
+        self.pages = {}
+        self.calls = {'nearby': 0, 'details': 0}
+        self.lock = threading.Lock()
+
+    def _cell(self, lat, lng):
+        return int(lat // _CELL), int(lng // _CELL)
+
+    def _within(self, lat, lng, radius):
+        scale = math.cos(math.radians(lat))
+        reach_lat = radius / geosweep.METRES_PER_DEGREE
+        reach_lng = reach_lat / scale
+        low, high = self._cell(lat - reach_lat, lng - reach_lng), self._cell(lat + reach_lat, lng + reach_lng)
+        for row in range(low[0], high[0] + 1):
+            for col in range(low[1], high[1] + 1):
+                for p in self.cells.get((row, col), ()):
+                    location = p['geometry']['location']
+                    if math.hypot(location['lat'] - lat, (location['lng'] - lng) * scale) * 111320 <= radius:
+                        yield p
+
+    def nearby(self, params):
+        with self.lock:
+            self.calls['nearby'] += 1
+        token = params.get('pagetoken')
+        if token:
+            with self.lock:
+                results = self.pages.pop(token, None)
+            if results is None:
+                return {'status': 'INVALID_REQUEST', 'results': []}
+        else:
+            lat, lng = map(float, params['location'].split(','))
+            results = sorted(self._within(lat, lng, float(params['radius'])), key=lambda p: -p['prominence'])
+            results = results[:MAX_RESULTS]
+        body = {'status': 'OK' if results else 'ZERO_RESULTS', 'results': results[:PAGE_SIZE]}
+        if len(results) > PAGE_SIZE:
+            token = os.urandom(8).hex()
+            with self.lock:
+                self.pages[token] = results[PAGE_SIZE:]
+            body['next_page_token'] = token
+        return body
+
+    def details(self, params):
+        with self.lock:
+            self.calls['details'] += 1
+        place = self.by_id[params.get('place_id') or params['placeid']]
+        return {'status': 'OK', 'result': {
+            'name': place['name'],
+            'formatted_address': place['vicinity'] + ', Hong Kong',
+            'business_status': 'OPERATIONAL',
+        }}
+
+
+def serve(stub):
+    """Answer Places requests from `stub` on a free local port, in a background thread"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path.endswith('/nearbysearch/json'):
+                body = stub.nearby(params)
+            elif url.path.endswith('/details/json'):
+                body = stub.details(params)
+            else:
+                self.send_error(404)
+                return
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
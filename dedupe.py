@@ -0,0 +1,212 @@
+import hashlib
+import re
+import struct
+import unicodedata
+
+# MinHash LSH: names are split into NUM_BANDS bands of ROWS_PER_BAND
+# hashes. Two names land in a shared bucket with probability
+# 1 - (1 - J**ROWS_PER_BAND)**NUM_BANDS for shingle Jaccard similarity J,
+# about 89% at J=0.7, 99% at J=0.8 and 6% at J=0.3. Names that are equal
+# once normalized always share every bucket.
+NUM_BANDS = 8
+ROWS_PER_BAND = 4
+
+# Candidates sharing a bucket are only merged above these similarities
+NAME_THRESHOLD = 0.6
+ADDRESS_THRESHOLD = 0.6
+
+# Each 16-bit slice of one blake2b digest acts as a separate MinHash
+# function, so a shingle is hashed once for the whole signature (at most
+# 32). A band's four 16-bit rows read back as one 64-bit bucket key.
+_SIGNATURE = struct.Struct(f'<{NUM_BANDS * ROWS_PER_BAND}H')
+_BAND_KEYS = struct.Struct(f'<{NUM_BANDS}q')
+
+# Branch names and other qualifiers: "NOJO (Elgin Street)", "一蘭【尖沙咀】"
+_BRACKETED = re.compile(r'\([^)]*\)|\[[^\]]*\]|【[^】]*】|「[^」]*」|〔[^〕]*〕')
+# One character of kana, CJK ideographs (extension A included) or compatibility ideographs
+CJK_CHARACTER = r'[぀-ヿ㐀-䶿一-鿿豈-﫿]'
+_CJK = re.compile(CJK_CHARACTER)
+_TOKEN = re.compile(CJK_CHARACTER + r'|[^\W_]+')
+
+NAME_STOPWORDS = {'the', 'restaurant', 'hk', '餐廳', '餐厅', '酒家'}
+ADDRESS_STOPWORDS = {'hong', 'kong', 'hk', 'kowloon', 'new', 'territories', '香', '港', '九', '龍'}
+ADDRESS_ABBREVIATIONS = {
+    'rd': 'road', 'st': 'street', 'ave': 'avenue', 'bldg': 'building', 'blvd': 'boulevard',
+    'ctr': 'centre', 'center': 'centre', 'ctre': 'centre', 'sq': 'square', 'hse': 'house',
+    'plz': 'plaza', 'fl': 'f', 'floor': 'f', 'ln': 'lane', 'tce': 'terrace',
+}
+
+
+def _fold(text):
+    """NFKC, case-fold and strip accents; full-width forms become ASCII"""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    if text.isascii():
+        return text
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def normalize_name(name):
+    """Comparable form of a restaurant name, e.g. "NOJO (Elgin St.)" -> "nojo" """
+    text = _BRACKETED.sub(' ', _fold(name).replace('&', ' and '))
+    tokens = _TOKEN.findall(text.replace("'", '').replace('’', ''))
+    kept = [t for t in tokens if t not in NAME_STOPWORDS]
+    return ' '.join(kept or tokens)
+
+
+def address_tokens(address):
+    """Set of address tokens with common abbreviations expanded"""
+    text = _fold(address).replace('/f', 'f')
+    tokens = set()
+    for token in _TOKEN.findall(text):
+        token = ADDRESS_ABBREVIATIONS.get(token, token)
+        if token not in ADDRESS_STOPWORDS:
+            tokens.add(token)
+    return tokens
+
+
+def name_shingles(normalized):
+    """Character n-grams of a normalized name: bigrams for CJK, trigrams otherwise"""
+    compact = normalized.replace(' ', '')
+    n = 2 if _CJK.search(compact) else 3
+    if len(compact) <= n:
+        return {compact}
+    return {compact[i:i + n] for i in range(len(compact) - n + 1)}
+
+
+def band_keys(shingles):
+    """LSH bucket keys for a shingle set, one signed 64-bit int per band"""
+    hashes = [
+        _SIGNATURE.unpack(hashlib.blake2b(s.encode('utf-8'), digest_size=_SIGNATURE.size).digest())
+        for s in shingles
+    ]
+    signature = [min(column) for column in zip(*hashes)]
+    return list(_BAND_KEYS.unpack(_SIGNATURE.pack(*signature)))
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class Fingerprint:
+    """Normalized name, shingles, address tokens and LSH keys of one listing"""
+
+    __slots__ = ('name', 'shingles', 'address', 'numbers', '_keys')
+
+    def __init__(self, name, address):
+        self.name = normalize_name(name)
+        self.shingles = name_shingles(self.name) if self.name else {_fold(name)}
+        self.address = address_tokens(address)
+        # Street and shop numbers; "Tsim Sha Tsui, Hong Kong" has none and
+        # says nothing about which branch it is
+        self.numbers = {token for token in self.address if token.isdigit()}
+        self._keys = None
+
+    @property
+    def keys(self):
+        # Stored listings loaded for comparison never need their keys
+        if self._keys is None:
+            self._keys = band_keys(self.shingles)
+        return self._keys
+
+    @property
+    def specific(self):
+        return bool(self.numbers)
+
+    def matches(self, other):
+        """Same restaurant: similar names at the same address
+
+        When either address is only a district, the names must be equal
+        once normalized and the district must agree, so chain branches
+        are not merged through a listing that does not say which one it is.
+        """
+        if not (self.numbers and other.numbers):
+            if self.name != other.name:
+                return False
+            vague, full = (self, other) if len(self.address) <= len(other.address) else (other, self)
+            return vague.address <= full.address
+        if self.name != other.name and _jaccard(self.shingles, other.shingles) < NAME_THRESHOLD:
+            return False
+        if not self.numbers & other.numbers:
+            return False
+        shared = len(self.address & other.address)
+        return shared / min(len(self.address), len(other.address)) >= ADDRESS_THRESHOLD
+
+
+def fingerprint(name, address, known=None):
+    """Fingerprint of a listing, reused from `known` if given
+
+    `known` is a dict the steps of one store share, so a batch is
+    fingerprinted once when deduplicated, checked against the stored
+    restaurants and indexed, however large it is.
+    """
+    if known is None:
+        return Fingerprint(name, address)
+    found = known.get((name, address))
+    if found is None:
+        found = known[name, address] = Fingerprint(name, address)
+    return found
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster(fingerprints):
+    """Group fingerprints of the same restaurant; returns lists of indexes
+
+    Only fingerprints sharing an LSH bucket are compared, so the work
+    grows with the number of near-duplicates rather than with n squared.
+    Groups are merged with union-find, and only when their roots match
+    as well. Roots are kept on listings with a street address, so a
+    group can never span two addresses.
+    """
+    parent = list(range(len(fingerprints)))
+    buckets = {}
+    for i, fingerprint in enumerate(fingerprints):
+        compared = set()
+        for key in fingerprint.keys:
+            bucket = buckets.setdefault(key, [])
+            for j in bucket:
+                root_i, root_j = _find(parent, i), _find(parent, j)
+                if root_i == root_j or root_j in compared:
+                    continue
+                compared.add(root_j)
+                if not fingerprint.matches(fingerprints[j]):
+                    continue
+                if root_i != i and not fingerprints[root_i].matches(fingerprints[root_j]):
+                    continue
+                if root_j != j and not fingerprint.matches(fingerprints[root_j]):
+                    continue
+                if fingerprints[root_i].specific and not fingerprints[root_j].specific:
+                    parent[root_j] = root_i
+                else:
+                    parent[root_i] = root_j
+            bucket.append(i)
+
+    groups = {}
+    for i in range(len(fingerprints)):
+        groups.setdefault(_find(parent, i), []).append(i)
+    return list(groups.values())
+
+
+def dedupe_restaurants(restaurants, known=None):
+    """Collapse near-duplicate restaurant dicts, keeping the first of each group
+
+    A kept entry with only a district for an address takes the first
+    street address found among its duplicates. `known` is as for
+    fingerprint().
+    """
+    fingerprints = [fingerprint(r['name'], r['address'], known) for r in restaurants]
+    unique = []
+    for group in sorted(cluster(fingerprints), key=lambda g: g[0]):
+        restaurant = restaurants[group[0]]
+        if not fingerprints[group[0]].specific:
+            better = next((i for i in group if fingerprints[i].specific), None)
+            if better is not None:
+                restaurant = dict(restaurant, address=restaurants[better]['address'])
+        unique.append(restaurant)
+    return unique
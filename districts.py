@@ -0,0 +1,238 @@
+import unicodedata
+
+# The 18 districts of Hong Kong, each with the names an address may use
+# for it: the district itself, its neighbourhoods, and landmarks and malls
+# that addresses often give instead of an area, in English and Chinese.
+# Every name belongs to exactly one district.
+DISTRICT_ALIASES = {
+    'Central and Western': [
+        'Central and Western', 'Central & Western', 'Central', 'Sheung Wan', 'Sai Ying Pun', 'Kennedy Town',
+        'Shek Tong Tsui', 'Sai Wan', 'Mid-Levels', 'Admiralty', 'SoHo', 'Lan Kwai Fong', 'LKF', 'The Peak',
+        'Victoria Peak', 'IFC', 'IFC Mall', 'International Finance Centre', 'Pacific Place', 'The Landmark',
+        'Landmark', 'Exchange Square', 'PMQ', 'Tai Kwun', 'Peak Tower', 'Peak Galleria',
+        '中西區', '中環', '上環', '西環', '西營盤', '堅尼地城', '石塘咀', '半山', '金鐘', '蘭桂坊', '山頂',
+        '國際金融中心', '太古廣場', '置地廣場', '交易廣場', '元創方', '大館', '山頂廣場',
+    ],
+    'Wan Chai': [
+        'Wan Chai', 'Wanchai', 'Causeway Bay', 'Happy Valley', 'Tai Hang', "Jardine's Lookout", 'Times Square',
+        'Hysan Place', 'Lee Garden', 'Lee Gardens', 'SOGO', 'Fashion Walk', 'Hopewell Centre',
+        '灣仔', '灣仔區', '銅鑼灣', '跑馬地', '大坑', '渣甸山', '時代廣場', '希慎廣場', '利園', '崇光', '合和中心',
+    ],
+    'Eastern': [
+        'Eastern District', 'North Point', 'Fortress Hill', 'Tin Hau', 'Quarry Bay', 'Tai Koo', 'Taikoo',
+        'Taikoo Shing', 'Taikoo Place', 'Sai Wan Ho', 'Shau Kei Wan', 'Chai Wan', 'Heng Fa Chuen', 'Cityplaza',
+        '東區', '北角', '炮台山', '天后', '鰂魚涌', '太古', '太古城', '西灣河', '筲箕灣', '柴灣', '杏花邨',
+        '太古城中心',
+    ],
+    'Southern': [
+        'Southern District', 'Aberdeen', 'Ap Lei Chau', 'Wong Chuk Hang', 'Stanley', 'Repulse Bay',
+        'Deep Water Bay', 'Pok Fu Lam', 'Pokfulam', 'Cyberport', 'Shek O', 'Tin Wan', 'Horizon Plaza',
+        'Stanley Plaza', 'The Pulse',
+        '南區', '香港仔', '鴨脷洲', '黃竹坑', '赤柱', '淺水灣', '深水灣', '薄扶林', '數碼港', '石澳', '田灣',
+        '赤柱廣場',
+    ],
+    'Yau Tsim Mong': [
+        'Yau Tsim Mong', 'Tsim Sha Tsui', 'Tsim Sha Tsui East', 'TST', 'Jordan', 'Yau Ma Tei', 'Mong Kok',
+        'Mongkok', 'Prince Edward', 'Tai Kok Tsui', 'West Kowloon', 'Harbour City', 'Ocean Terminal',
+        'Ocean Centre', 'K11', 'K11 Art Mall', 'K11 MUSEA', 'Victoria Dockside', 'iSQUARE', 'The ONE',
+        'Elements', 'Langham Place', 'Olympian City', 'Moko',
+        '油尖旺', '尖沙咀', '尖東', '佐敦', '油麻地', '旺角', '太子', '大角咀', '西九龍', '海港城', '海運大廈',
+        '國際廣場', '圓方', '朗豪坊', '奧海城',
+    ],
+    'Sham Shui Po': [
+        'Sham Shui Po', 'Cheung Sha Wan', 'Lai Chi Kok', 'Mei Foo', 'Shek Kip Mei', 'Nam Cheong',
+        'Festival Walk', 'Dragon Centre', 'D2 Place',
+        '深水埗', '長沙灣', '荔枝角', '美孚', '石硤尾', '南昌', '又一城', '西九龍中心',
+    ],
+    'Kowloon City': [
+        'Kowloon City', 'Kowloon Tong', 'Hung Hom', 'Whampoa', 'To Kwa Wan', 'Ho Man Tin', 'Ma Tau Wai',
+        'Kai Tak',
+        '九龍城', '九龍塘', '紅磡', '黃埔', '土瓜灣', '何文田', '馬頭圍', '啟德',
+    ],
+    'Wong Tai Sin': [
+        'Wong Tai Sin', 'Diamond Hill', 'San Po Kong', 'Lok Fu', 'Tsz Wan Shan', 'Choi Hung', 'Ngau Chi Wan',
+        'Plaza Hollywood', 'Temple Mall',
+        '黃大仙', '鑽石山', '新蒲崗', '樂富', '慈雲山', '彩虹', '牛池灣', '荷里活廣場',
+    ],
+    'Kwun Tong': [
+        'Kwun Tong', 'Ngau Tau Kok', 'Kowloon Bay', 'Lam Tin', 'Yau Tong', 'Sau Mau Ping', 'Lei Yue Mun',
+        'apm', 'MegaBox', 'Telford Plaza',
+        '觀塘', '牛頭角', '九龍灣', '藍田', '油塘', '秀茂坪', '鯉魚門', '德福廣場',
+    ],
+    'Kwai Tsing': [
+        'Kwai Tsing', 'Kwai Chung', 'Kwai Fong', 'Kwai Hing', 'Tsing Yi', 'Metroplaza', 'Maritime Square',
+        '葵青', '葵涌', '葵芳', '葵興', '青衣', '新都會廣場', '青衣城',
+    ],
+    'Tsuen Wan': [
+        'Tsuen Wan', 'Sham Tseng', 'Ma Wan', 'Citywalk', 'Nina Mall', 'Discovery Park',
+        '荃灣', '深井', '馬灣', '荃新天地', '如心廣場', '愉景新城',
+    ],
+    'Tuen Mun': [
+        'Tuen Mun', 'Siu Hong', 'So Kwun Wat', 'V city', 'Tuen Mun Town Plaza',
+        '屯門', '兆康', '掃管笏', '屯門市廣場',
+    ],
+    'Yuen Long': [
+        'Yuen Long', 'Tin Shui Wai', 'Kam Tin', 'Hung Shui Kiu', 'Lau Fau Shan', 'YOHO Mall', 'T Town',
+        '元朗', '天水圍', '錦田', '洪水橋', '流浮山', '形點',
+    ],
+    'North': [
+        'North District', 'Sheung Shui', 'Fanling', 'Sha Tau Kok', 'Landmark North',
+        '北區', '上水', '粉嶺', '沙頭角', '上水廣場',
+    ],
+    'Tai Po': [
+        'Tai Po', 'Tai Po Market', 'Tai Wo', 'Tai Mei Tuk', 'Uptown Plaza',
+        '大埔', '大埔墟', '太和', '大美督', '新達廣場',
+    ],
+    'Sha Tin': [
+        'Sha Tin', 'Shatin', 'Tai Wai', 'Fo Tan', 'Ma On Shan', 'Siu Lek Yuen', 'Science Park',
+        'New Town Plaza', 'HomeSquare',
+        '沙田', '大圍', '火炭', '馬鞍山', '小瀝源', '科學園', '新城市廣場',
+    ],
+    'Sai Kung': [
+        'Sai Kung', 'Tseung Kwan O', 'TKO', 'Hang Hau', 'Po Lam', 'Tiu Keng Leng', 'LOHAS Park',
+        'Clear Water Bay', 'PopCorn',
+        '西貢', '將軍澳', '坑口', '寶琳', '調景嶺', '日出康城', '清水灣',
+    ],
+    'Islands': [
+        'Islands District', 'Lantau', 'Tung Chung', 'Discovery Bay', 'Mui Wo', 'Tai O', 'Ngong Ping',
+        'Cheung Chau', 'Lamma', 'Peng Chau', 'Chek Lap Kok', 'Hong Kong International Airport', 'Citygate',
+        '離島', '大嶼山', '東涌', '愉景灣', '梅窩', '大澳', '昂坪', '長洲', '南丫島', '坪洲', '赤鱲角',
+        '香港國際機場', '東薈城',
+    ],
+}
+
+# Macau's peninsula and islands, with the landmarks, casinos and malls
+# addresses give for them, in English, Portuguese and Chinese
+MACAU_DISTRICT_ALIASES = {
+    'Macau Peninsula': [
+        'Macau Peninsula', 'Macao Peninsula', 'NAPE', 'Senado Square', 'Largo do Senado',
+        'Avenida de Almeida Ribeiro', "Fisherman's Wharf", 'Macau Tower', 'Grand Lisboa', 'Wynn Macau',
+        'MGM Macau', 'Areia Preta', 'Red Market', 'Praia Grande', 'Barra', "Ruins of St. Paul's",
+        '澳門半島', '新口岸', '議事亭前地', '新馬路', '漁人碼頭', '澳門旅遊塔', '新葡京', '黑沙環', '紅街市',
+        '南灣', '媽閣', '大三巴', '高士德',
+    ],
+    'Taipa': [
+        'Taipa', 'Taipa Village', 'Old Taipa Village', 'Rua do Cunha',
+        '氹仔', '凼仔', '氹仔舊城區', '官也街',
+    ],
+    'Cotai': [
+        'Cotai', 'Cotai Strip', 'The Venetian', 'Venetian Macao', 'Galaxy Macau', 'City of Dreams',
+        'The Londoner', 'The Parisian', 'Studio City', 'Wynn Palace', 'MGM Cotai',
+        '路氹', '路氹城', '威尼斯人', '澳門銀河', '新濠天地', '倫敦人', '巴黎人', '新濠影滙', '永利皇宮',
+    ],
+    'Coloane': [
+        'Coloane', 'Coloane Village', 'Hac Sa', 'Cheoc Van',
+        '路環', '黑沙', '竹灣',
+    ],
+}
+
+
+def _fold(text):
+    """Case- and width-insensitive form used on both names and text"""
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+def _is_word_char(ch):
+    return ch.isascii() and ch.isalnum()
+
+
+class Matcher:
+    """Aho-Corasick automaton finding every name from a {name: value} map in one pass over a text
+
+    Names are matched without regard to case or full-width forms. Names
+    that start or end with a letter or digit only match as whole words,
+    so 'TST' is not found in 'TSTE' nor 'Central' in 'Centralised'.
+    """
+
+    def __init__(self, names):
+        self.goto = [{}]
+        self.fail = [0]
+        # Per state: (length, value, latin) of every name ending there
+        self.out = [[]]
+        for name, value in names.items():
+            folded = _fold(name)
+            state = 0
+            for ch in folded:
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.out[state].append((len(folded), value, folded.isascii()))
+
+        # Breadth-first, so a state's failure link is final before its children need it
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+                queue.append(child)
+
+    def find(self, text):
+        """(start, end, value, latin) for every name found in `text`, in order of end"""
+        text = _fold(text)
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, value, latin in out[state]:
+                start, end = i + 1 - length, i + 1
+                if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if _is_word_char(text[i]) and end < len(text) and _is_word_char(text[end]):
+                    continue
+                yield start, end, value, latin
+
+
+class RegionDistricts:
+    """A region's districts, matched from addresses by the names in a {district: [names]} map"""
+
+    def __init__(self, aliases):
+        self.aliases = aliases
+        self.names = tuple(aliases)
+        self.matcher = Matcher({alias: district for district, names in aliases.items() for alias in names})
+
+    def district_of(self, text):
+        """The district an address or text is in, e.g. 'Shop 5, K11 MUSEA, Tsim Sha Tsui' -> 'Yau Tsim Mong'
+
+        English addresses run from shop to area and Chinese ones from area to
+        shop, and street names repeat other areas' names ('Tai Po Road, Sham
+        Shui Po'), so the last English name found wins, or failing that the
+        first Chinese one; the longer name on a tie. None if no name is found.
+        """
+        if not text:
+            return None
+        latin = None
+        chinese = None
+        for start, end, district, is_latin in self.matcher.find(text):
+            if is_latin:
+                if latin is None or end > latin[0] or (end == latin[0] and start < latin[1]):
+                    latin = (end, start, district)
+            elif chinese is None or (start, -end) < chinese[:2]:
+                chinese = (start, -end, district)
+        if latin is not None:
+            return latin[2]
+        return chinese[2] if chinese is not None else None
+
+    def district_named(self, name):
+        """Canonical district for a name given in a request, such as 'wan chai' or 'Tsim Sha Tsui'"""
+        for district in self.names:
+            if _fold(district) == _fold(name or ''):
+                return district
+        return self.district_of(name)
+
+
+HONG_KONG = RegionDistricts(DISTRICT_ALIASES)
+MACAU = RegionDistricts(MACAU_DISTRICT_ALIASES)
+
+# Hong Kong's, for code that only deals with Hong Kong
+DISTRICTS = HONG_KONG.names
+MATCHER = HONG_KONG.matcher
+district_of = HONG_KONG.district_of
+district_named = HONG_KONG.district_named
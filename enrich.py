@@ -0,0 +1,147 @@
+import os
+from concurrent.futures import as_completed
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from models import db, EnrichmentCache
+from writer import write
+import metrics
+import regions
+
+# Restaurants listed without a real address get it, with coordinates and
+# cuisine, from their own OpenRice page. OPENRICE_ENRICH_WORKERS pages are
+# fetched at a time (the run's throttle still paces the host), at most
+# OPENRICE_ENRICH_MAX_PAGES per run; the rest are fetched on later runs.
+# Pages that are gone or give no address are tried again after
+# OPENRICE_ENRICH_RETRY_DAYS.
+ENRICH_WORKERS = int(os.environ.get('OPENRICE_ENRICH_WORKERS', 4))
+ENRICH_MAX_PAGES = int(os.environ.get('OPENRICE_ENRICH_MAX_PAGES', 200))
+ENRICH_RETRY_DAYS = float(os.environ.get('OPENRICE_ENRICH_RETRY_DAYS', 7))
+
+# Results are committed in batches of this size as pages come in, so an
+# interrupted run keeps what it fetched and the next one carries on from there
+ENRICH_COMMIT_EVERY = 20
+
+# Addresses that say nothing more than the city
+PLACEHOLDER_ADDRESSES = {''} | {name.casefold() for region in regions.REGIONS.values() for name in region.city_names}
+
+# Stay well below SQLite's bound parameter limit
+_CHUNK_SIZE = 500
+
+
+def needs_details(restaurant):
+    """Whether a scraped restaurant has a placeholder address and an OpenRice page to read it from"""
+    address = (restaurant.get('address') or '').strip().casefold()
+    host = urlsplit(restaurant.get('url') or '').hostname or ''
+    return address in PLACEHOLDER_ADDRESSES and (host == 'openrice.com' or host.endswith('.openrice.com'))
+
+
+def cached_details(urls):
+    """Stored details by URL: a dict for pages read, None for pages known to have none
+
+    URLs never fetched, or missing for longer than the retry period, are left out.
+    """
+    retry_before = datetime.utcnow() - timedelta(days=ENRICH_RETRY_DAYS)
+    found = {}
+    for i in range(0, len(urls), _CHUNK_SIZE):
+        rows = EnrichmentCache.query.filter(EnrichmentCache.url.in_(urls[i:i + _CHUNK_SIZE])).all()
+        for row in rows:
+            if row.status == 'ok':
+                found[row.url] = {
+                    'address': row.address,
+                    'latitude': row.latitude,
+                    'longitude': row.longitude,
+                    'cuisine': row.cuisine,
+                }
+            elif row.fetched_at >= retry_before:
+                found[row.url] = None
+    return found
+
+
+def store_details(results):
+    """Store {url: details or None} from pages just fetched, through the writer queue"""
+    def store():
+        now = datetime.utcnow()
+        for url, details in results.items():
+            details = details or {}
+            db.session.merge(EnrichmentCache(
+                url=url,
+                status='ok' if details else 'missing',
+                address=details.get('address'),
+                latitude=details.get('latitude'),
+                longitude=details.get('longitude'),
+                cuisine=details.get('cuisine'),
+                fetched_at=now
+            ))
+
+    try:
+        write(store)
+    except Exception as e:
+        print(f"Could not store restaurant details: {e}")
+
+
+def enrich_restaurants(restaurants, fetch, parse):
+    """Restaurants with placeholder addresses filled in from their OpenRice pages
+
+    `fetch(url)` returns a response, or None when the host is not to be
+    asked; `parse(response)` returns the page's details (see
+    extractor.extract_details). Pages read on an earlier run come from
+    the enrichment cache. Restaurants whose page is not read this run
+    are returned as they came.
+    """
+    urls = list(dict.fromkeys(r['url'] for r in restaurants if needs_details(r)))
+    if not urls:
+        return restaurants
+
+    try:
+        known = cached_details(urls)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Enrichment cache unavailable: {e}")
+        known = {}
+    missing = [url for url in urls if url not in known]
+    metrics.count('enrich_cache_hit', len(urls) - len(missing))
+    print(f"Fetching {min(len(missing), ENRICH_MAX_PAGES)} of {len(urls)} restaurant pages "
+          f"for missing addresses ({len(urls) - len(missing)} cached)")
+
+    def fetch_details(url):
+        """(found, details) for one page; found is False when it should be tried on a later run"""
+        response = fetch(url)
+        if response is None or response.status_code not in (200, 404, 410):
+            return False, None
+        if response.status_code != 200:
+            return True, None
+        details = parse(response)
+        return True, details if details.get('address') else None
+
+    batch = {}
+    with metrics.RunPool(max_workers=ENRICH_WORKERS) as pool:
+        futures = {pool.submit(fetch_details, url): url for url in missing[:ENRICH_MAX_PAGES]}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                found, details = future.result()
+            except Exception as e:
+                print(f"Error reading restaurant page {url}: {e}")
+                continue
+            if not found:
+                continue
+            metrics.count('enrich_fetch')
+            known[url] = batch[url] = details
+            if len(batch) >= ENRICH_COMMIT_EVERY:
+                store_details(batch)
+                batch = {}
+    if batch:
+        store_details(batch)
+
+    enriched = []
+    filled = 0
+    for restaurant in restaurants:
+        details = known.get(restaurant['url']) if needs_details(restaurant) else None
+        if details:
+            restaurant = dict(restaurant, **{field: value for field, value in details.items() if value is not None})
+            filled += 1
+        enriched.append(restaurant)
+    metrics.count('enrich_filled', filled)
+    print(f"Filled in details for {filled} restaurants")
+    return enriched
@@ -0,0 +1,267 @@
+import json
+from bs4 import BeautifulSoup, SoupStrainer, NavigableString
+
+import regions
+
+try:
+    import lxml  # noqa: F401
+    PARSER = 'lxml'
+except ImportError:
+    PARSER = 'html.parser'
+
+BASE_URL = 'https://www.openrice.com'
+
+# Bump when extraction output changes, so cached parse results are not reused
+EXTRACTOR_VERSION = 2
+
+# Containers OpenRice has used for a single restaurant in listing pages
+CARD_CLASSES = {'sr1-listing-item', 'poi-list-item', 'restaurant-item'}
+HEADING_CLASSES = {'title-name', 'sr1-listing-item-title'}
+
+NAME_TAGS = {'h2', 'h3', 'h4', 'span', 'a'}
+NAME_CLASSES = {'name', 'title', 'restaurant-name', 'poi-name'}
+ADDRESS_TAGS = {'span', 'div', 'p'}
+ADDRESS_CLASSES = {'address', 'location', 'district', 'address-info'}
+
+# Restaurant links that are really navigation, reviews or forms
+EXCLUDED_LINK_WORDS = ['review', 'search', 'submit', 'contact', 'info']
+
+
+def _classes(attrs):
+    value = attrs.get('class') or ()
+    return set(value.split() if isinstance(value, str) else value)
+
+
+def _is_restaurant_href(href):
+    return bool(href) and '/restaurant/' in href
+
+
+def _is_restaurant_link(href):
+    """Links to a restaurant page, excluding navigation"""
+    if not _is_restaurant_href(href) or '-r' not in href:
+        return False
+    href = href.lower()
+    return all(word not in href for word in EXCLUDED_LINK_WORDS)
+
+
+def _candidate_kind(name, attrs):
+    """Classify a tag as 'card', 'link', 'json_ld' or None"""
+    if name == 'div':
+        return 'card' if _classes(attrs) & CARD_CLASSES else None
+    if name == 'a':
+        href = attrs.get('href')
+        if attrs.get('title') and _is_restaurant_href(href):
+            return 'card'
+        return 'link' if _is_restaurant_link(href) else None
+    if name in ('h2', 'h3'):
+        return 'card' if _classes(attrs) & HEADING_CLASSES else None
+    if name == 'script':
+        return 'json_ld' if attrs.get('type') == 'application/ld+json' else None
+    return None
+
+
+# Only build tree nodes for candidate subtrees, the rest of the page is skipped
+STRAINER = SoupStrainer(lambda name, attrs={}: _candidate_kind(name, attrs) is not None)
+
+
+def _absolute(url):
+    if url and url.startswith('/'):
+        return BASE_URL + url
+    return url
+
+
+def _clean(text):
+    return text.replace('\n', ' ').strip()
+
+
+def _parse_card(card, region):
+    """Pull name, address and link out of a card in a single walk"""
+    name_elem = None
+    address_elem = None
+    district_text = None
+    link = card.get('href') if card.name == 'a' else None
+
+    for node in card.descendants:
+        if isinstance(node, NavigableString):
+            # Text naming any district, area or mall stands in for a missing address
+            if district_text is None and not node.isspace() and region.districts.district_of(node):
+                district_text = node
+            continue
+        classes = set(node.get('class') or ())
+        if name_elem is None and node.name in NAME_TAGS and classes & NAME_CLASSES:
+            name_elem = node
+        if address_elem is None and node.name in ADDRESS_TAGS and classes & ADDRESS_CLASSES:
+            address_elem = node
+        if link is None and node.name == 'a' and _is_restaurant_href(node.get('href')):
+            link = node.get('href')
+
+    if name_elem is None and card.name == 'a':
+        name_elem = card
+    if name_elem is not None:
+        name = name_elem.get_text(strip=True)
+    else:
+        name = next((str(s).strip() for s in card.find_all(string=True, recursive=False)), None)
+
+    if address_elem is not None:
+        address = address_elem.get_text(strip=True)
+    elif district_text is not None:
+        address = str(district_text).strip()
+    else:
+        address = None
+
+    if not name or not (address or link):
+        return None
+    return {
+        'name': _clean(name),
+        'address': _clean(address) if address else region.name,
+        'url': _absolute(link) or ''
+    }
+
+
+def _json_ld_restaurants(script):
+    try:
+        data = json.loads(script.string)
+    except (TypeError, ValueError):
+        return []
+    items = data if isinstance(data, list) else [data]
+    return [item for item in items if isinstance(item, dict) and item.get('@type') == 'Restaurant']
+
+
+def _parse_json_ld(script):
+    restaurants = []
+    for item in _json_ld_restaurants(script):
+        address = item.get('address', {})
+        restaurants.append({
+            'name': item.get('name', ''),
+            'address': address.get('streetAddress', '') if isinstance(address, dict) else str(address),
+            'url': item.get('url', '')
+        })
+    return restaurants
+
+
+def extract_candidates(html, region=regions.DEFAULT_REGION):
+    """Collect card, JSON-LD and link candidates from a page of `region` in one pass
+
+    Returns a dict with 'cards', 'json_ld' and 'links' lists of
+    restaurant dicts. Candidates nested inside a card are part of that
+    card and are not reported again. Restaurants without an address get
+    the region's name as one.
+    """
+    region = regions.REGIONS[region]
+    soup = BeautifulSoup(html, PARSER, parse_only=STRAINER)
+    found = {'cards': [], 'json_ld': [], 'links': []}
+
+    stack = [(child, False) for child in reversed(soup.contents)]
+    while stack:
+        node, in_card = stack.pop()
+        if isinstance(node, NavigableString):
+            continue
+
+        kind = _candidate_kind(node.name, node.attrs)
+        if kind == 'json_ld':
+            found['json_ld'].extend(_parse_json_ld(node))
+            continue
+        if kind == 'card' and not in_card:
+            found['cards'].append(node)
+            in_card = True
+        if node.name == 'a' and _is_restaurant_link(node.get('href')):
+            found['links'].append(node)
+
+        stack.extend((child, in_card) for child in reversed(node.contents))
+
+    found['cards'] = [r for r in (_parse_card(card, region) for card in found['cards']) if r]
+    found['links'] = [
+        {'name': link.get_text(strip=True), 'address': region.name, 'url': _absolute(link.get('href'))}
+        for link in found['links']
+    ]
+    found['links'] = [r for r in found['links'] if r['name']]
+    return found
+
+
+def extract_listing(html, region=regions.DEFAULT_REGION, max_cards=20):
+    """Restaurants on a listing page: JSON-LD entries plus parsed cards
+
+    Falls back to bare restaurant links when the page has no cards.
+    """
+    found = extract_candidates(html, region)
+    cards = found['cards'] or [r for r in found['links'] if r['url']]
+    return found['json_ld'] + cards[:max_cards]
+
+
+def extract_search_results(html, region=regions.DEFAULT_REGION, limit=5):
+    """Restaurant links from a `?what=` search results page"""
+    return extract_candidates(html, region)['links'][:limit]
+
+
+# Meta tags restaurant pages carry their coordinates in
+GEO_META = {
+    'place:location:latitude': 'latitude',
+    'place:location:longitude': 'longitude',
+    'og:latitude': 'latitude',
+    'og:longitude': 'longitude',
+}
+
+
+def _detail_kind(name, attrs):
+    """Classify a tag on a restaurant page as 'json_ld', 'geo', 'address' or None"""
+    if name == 'script':
+        return 'json_ld' if attrs.get('type') == 'application/ld+json' else None
+    if name == 'meta':
+        return 'geo' if attrs.get('property') in GEO_META else None
+    if name in ADDRESS_TAGS and _classes(attrs) & ADDRESS_CLASSES:
+        return 'address'
+    return None
+
+
+DETAIL_STRAINER = SoupStrainer(lambda name, attrs={}: _detail_kind(name, attrs) is not None)
+
+
+def _coordinate(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _json_ld_details(item):
+    address = item.get('address')
+    if isinstance(address, dict):
+        parts = [str(address.get(field) or '').strip() for field in ('streetAddress', 'addressLocality')]
+        address = ', '.join(dict.fromkeys(part for part in parts if part))
+    geo = item.get('geo') if isinstance(item.get('geo'), dict) else {}
+    cuisine = item.get('servesCuisine')
+    if isinstance(cuisine, list):
+        cuisine = ', '.join(str(c) for c in cuisine if c)
+    return {
+        'address': _clean(str(address)) if address else None,
+        'latitude': _coordinate(geo.get('latitude')),
+        'longitude': _coordinate(geo.get('longitude')),
+        'cuisine': _clean(str(cuisine)) if cuisine else None,
+    }
+
+
+def extract_details(html):
+    """Address, coordinates and cuisine from a restaurant's own page
+
+    Read from its JSON-LD, with the address block and geo meta tags as a
+    fallback. Fields the page does not give are None.
+    """
+    soup = BeautifulSoup(html, PARSER, parse_only=DETAIL_STRAINER)
+    found = []
+    fallback = {'address': None, 'latitude': None, 'longitude': None, 'cuisine': None}
+    for node in soup.find_all(True):
+        kind = _detail_kind(node.name, node.attrs)
+        if kind == 'json_ld':
+            found.extend(_json_ld_details(item) for item in _json_ld_restaurants(node))
+        elif kind == 'geo':
+            field = GEO_META[node['property']]
+            if fallback[field] is None:
+                fallback[field] = _coordinate(node.get('content'))
+        elif kind == 'address' and fallback['address'] is None:
+            fallback['address'] = _clean(node.get_text(' ', strip=True)) or None
+    found.append(fallback)
+
+    details = {}
+    for field in fallback:
+        details[field] = next((d[field] for d in found if d[field] is not None), None)
+    return details
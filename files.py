@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+
+def write_atomic(path, data):
+    """Replace `path` with `data` (bytes) so readers see the old file or the new one, never part
+
+    The temporary file gets a name of its own, so threads and processes
+    writing the same path at once never share one; the last rename wins.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
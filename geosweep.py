@@ -0,0 +1,140 @@
+import math
+
+# (south, west, north, east) of the Hong Kong SAR, outlying islands included
+HONG_KONG_BOUNDS = (22.15, 113.83, 22.57, 114.44)
+# Macau SAR: the peninsula, Taipa, Cotai and Coloane
+MACAU_BOUNDS = (22.10, 113.52, 22.22, 113.60)
+
+# Largest radius a Places nearby search accepts, in metres
+MAX_RADIUS = 50000
+
+METRES_PER_DEGREE = 111320
+
+# Two results this close with the same name are one place listed twice
+NEAR_METRES = 15
+_CELL_DEGREES = 0.0005
+
+
+class Tile:
+    """A lat/lng rectangle searched with the smallest circle covering it"""
+
+    def __init__(self, south, west, north, east, min_radius):
+        self.south, self.west, self.north, self.east = south, west, north, east
+        self.min_radius = min_radius
+        self.center = ((south + north) / 2, (west + east) / 2)
+        half_height = (north - south) / 2 * METRES_PER_DEGREE
+        half_width = (east - west) / 2 * METRES_PER_DEGREE * math.cos(math.radians(self.center[0]))
+        self.radius = math.ceil(math.hypot(half_height, half_width))
+
+    @property
+    def splittable(self):
+        # A quarter tile has half the radius
+        return self.radius / 2 >= self.min_radius
+
+    def children(self):
+        lat, lng = self.center
+        return [
+            Tile(self.south, self.west, lat, lng, self.min_radius),
+            Tile(self.south, lng, lat, self.east, self.min_radius),
+            Tile(lat, self.west, self.north, lng, self.min_radius),
+            Tile(lat, lng, self.north, self.east, self.min_radius),
+        ]
+
+    def __repr__(self):
+        return f'<Tile {self.center[0]:.4f},{self.center[1]:.4f} r={self.radius}m>'
+
+
+def root_tiles(bounds, min_radius):
+    """Split the bounding box until every tile fits in one search circle"""
+    tiles = [Tile(*bounds, min_radius)]
+    while any(tile.radius > MAX_RADIUS for tile in tiles):
+        tiles = [child for tile in tiles for child in (tile.children() if tile.radius > MAX_RADIUS else [tile])]
+    return tiles
+
+
+def _location(place):
+    location = place.get('geometry', {}).get('location', {})
+    return location.get('lat'), location.get('lng')
+
+
+class SeenPlaces:
+    """place_ids and positions of places found so far, in a grid of small cells
+
+    Search circles of neighbouring tiles overlap, so the same place comes
+    back several times. Besides repeated place_ids, a place with the same
+    name within NEAR_METRES of a known one is treated as already seen.
+    """
+
+    def __init__(self):
+        self.place_ids = set()
+        self.cells = {}
+
+    def _cell(self, lat, lng):
+        return int(lat // _CELL_DEGREES), int(lng // _CELL_DEGREES)
+
+    def _nearby(self, lat, lng):
+        row, col = self._cell(lat, lng)
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                yield from self.cells.get((row + d_row, col + d_col), ())
+
+    def add(self, place):
+        """Record a place; False if it was already seen"""
+        place_id = place.get('place_id')
+        if place_id in self.place_ids:
+            return False
+        lat, lng = _location(place)
+        name = place.get('name')
+        if lat is not None and lng is not None:
+            for other_lat, other_lng, other_name in self._nearby(lat, lng):
+                if other_name == name and _distance(lat, lng, other_lat, other_lng) <= NEAR_METRES:
+                    return False
+            self.cells.setdefault(self._cell(lat, lng), []).append((lat, lng, name))
+        self.place_ids.add(place_id)
+        return True
+
+    def __len__(self):
+        return len(self.place_ids)
+
+
+def _distance(lat1, lng1, lat2, lng2):
+    """Equirectangular distance in metres, accurate at city scale"""
+    x = (lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot(lat2 - lat1, x) * METRES_PER_DEGREE
+
+
+def sweep(search, bounds=HONG_KONG_BOUNDS, min_radius=300, pool=None):
+    """Cover `bounds` with nearby searches, refining only where results are dense
+
+    `search(tile)` returns (places, saturated): saturated means the tile
+    holds more places than one search returns, so its four quarters are
+    searched next. Tiles of one depth run concurrently on `pool`. Returns
+    the unique places in the order found, and counts of tiles searched
+    and split.
+    """
+    seen = SeenPlaces()
+    places = []
+    stats = {'tiles': 0, 'split': 0}
+    pending = root_tiles(bounds, min_radius)
+
+    while pending:
+        if pool is not None:
+            futures = [(tile, pool.submit(search, tile)) for tile in pending]
+            results = []
+            for tile, future in futures:
+                try:
+                    results.append((tile, future.result()))
+                except Exception as e:
+                    print(f"Error searching {tile}: {e}")
+        else:
+            results = [(tile, search(tile)) for tile in pending]
+
+        pending = []
+        for tile, (found, saturated) in results:
+            stats['tiles'] += 1
+            places.extend(place for place in found if seen.add(place))
+            if saturated and tile.splittable:
+                stats['split'] += 1
+                pending.extend(tile.children())
+
+    return places, stats
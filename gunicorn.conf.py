@@ -0,0 +1,14 @@
+# gunicorn reads this file from the working directory on startup
+
+
+def on_starting(server):
+    # Metrics start from zero with the server, as they would in one process
+    from app import METRICS_DIR
+    from metrics import clear_snapshots
+    clear_snapshots(METRICS_DIR)
+
+
+def post_worker_init(worker):
+    # Every worker joins the scheduler leader election; only the lease holder runs jobs
+    from app import start_scheduler
+    start_scheduler(worker.wsgi)
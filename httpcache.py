@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import time
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from files import write_atomic
+
+# Request headers that change the body the server sends back. The
+# User-Agent is rotated on every run, so it is deliberately left out.
+VARY_HEADERS = ('Accept', 'Accept-Language')
+
+# Response headers worth replaying from disk
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Date', 'Content-Language')
+
+
+class CacheAdapter(BaseAdapter):
+    """Transport adapter that keeps GET bodies on disk and revalidates them
+
+    Stored responses are revalidated with If-None-Match/If-Modified-Since.
+    A 304 is answered from disk. Every response gets `content_hash`,
+    `from_cache` and `unchanged` attributes so callers can skip work when
+    the body is the same as last time. With offline=True nothing is sent
+    and requests are answered from disk only (504 when not stored).
+    """
+
+    def __init__(self, cache_dir, inner=None, offline=False, vary_headers=VARY_HEADERS):
+        super().__init__()
+        self.cache_dir = cache_dir
+        self.inner = inner or HTTPAdapter()
+        self.offline = offline
+        self.vary_headers = vary_headers
+
+    def cache_key(self, request):
+        parts = [request.method, request.url]
+        parts.extend(f"{name}:{request.headers.get(name, '')}" for name in self.vary_headers)
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        directory = os.path.join(self.cache_dir, key[:2])
+        return os.path.join(directory, key + '.json'), os.path.join(directory, key + '.body')
+
+    def load(self, key):
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return meta, body
+
+    def store(self, key, meta, body=None):
+        meta_path, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        if body is not None:
+            write_atomic(body_path, body)
+        write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+
+    def build_cached_response(self, request, meta, body):
+        response = requests.Response()
+        response.status_code = meta['status']
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.content_hash = meta['sha256']
+        response.from_cache = True
+        response.unchanged = True
+        return response
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return self.inner.send(request, **kwargs)
+
+        key = self.cache_key(request)
+        cached = self.load(key)
+
+        if self.offline:
+            if cached:
+                return self.build_cached_response(request, *cached)
+            response = requests.Response()
+            response.status_code = 504
+            response.reason = 'Not cached'
+            response._content = b''
+            response.url = request.url
+            response.request = request
+            return response
+
+        if cached:
+            meta, _ = cached
+            etag = meta['headers'].get('ETag')
+            last_modified = meta['headers'].get('Last-Modified')
+            if etag:
+                request.headers['If-None-Match'] = etag
+            if last_modified:
+                request.headers['If-Modified-Since'] = last_modified
+
+        response = self.inner.send(request, **kwargs)
+
+        if response.status_code == 304 and cached:
+            meta, body = cached
+            # Keep validators fresh in case the server rotated them
+            for name in ('ETag', 'Last-Modified', 'Date'):
+                if name in response.headers:
+                    meta['headers'][name] = response.headers[name]
+            meta['stored_at'] = time.time()
+            response.close()
+            self.store(key, meta)
+            return self.build_cached_response(request, meta, body)
+
+        body = response.content
+        digest = hashlib.sha256(body).hexdigest()
+        response.content_hash = digest
+        response.from_cache = False
+        response.unchanged = bool(cached) and cached[0]['sha256'] == digest
+        if response.status_code == 200:
+            self.store(key, {
+                'url': response.url,
+                'status': response.status_code,
+                'headers': {name: response.headers[name] for name in STORED_HEADERS if name in response.headers},
+                'sha256': digest,
+                'stored_at': time.time(),
+            }, body)
+        return response
+
+    def close(self):
+        self.inner.close()
+
+
+class ParseCache:
+    """Parsed page results keyed by body hash, so identical pages are parsed once"""
+
+    def __init__(self, cache_dir, version):
+        self.cache_dir = os.path.join(cache_dir, 'parsed')
+        self.version = version
+
+    def _path(self, response, kind):
+        return os.path.join(self.cache_dir, f"{response.content_hash}-{kind}-v{self.version}.json")
+
+    def get(self, response, kind):
+        if not getattr(response, 'content_hash', None):
+            return None
+        try:
+            with open(self._path(response, kind), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, response, kind, results):
+        if not getattr(response, 'content_hash', None):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_atomic(self._path(response, kind), json.dumps(results).encode('utf-8'))
+
+
+def cached_session(cache_dir, offline=False, inner=None):
+    """A requests.Session whose http(s) traffic goes through a CacheAdapter
+
+    `inner` is the adapter the cache sends requests on with, a plain
+    HTTPAdapter by default.
+    """
+    session = requests.Session()
+    adapter = CacheAdapter(cache_dir, inner=inner, offline=offline)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
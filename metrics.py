@@ -0,0 +1,403 @@
+import atexit
+import contextvars
+import fcntl
+import glob
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from files import write_atomic
+
+# Prometheus' default buckets, extended for scrape stages that take minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Snapshot of the processes sharing a directory that have exited, and the
+# lock taken to fold one in or to read the directory consistently
+EXITED_SNAPSHOT = 'exited.json'
+SNAPSHOT_LOCK = 'snapshots.lock'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return self.dump(self.values)
+
+    def dump(self, values):
+        return [[list(key), value] for key, value in values.items()]
+
+    def combine(self, values, snapshot):
+        for key, value in snapshot:
+            key = tuple(key)
+            values[key] = values.get(key, 0) + value
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            yield f'{self.name}_total{_labels(self.labelnames, key)} {_number(value)}'
+
+
+class Histogram:
+    """Observation counts in cumulative buckets, plus sum and count, per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    def snapshot(self):
+        with self.lock:
+            return self.dump(self.values)
+
+    def dump(self, values):
+        return [[list(key), list(counts), total] for key, (counts, total) in values.items()]
+
+    def combine(self, values, snapshot):
+        for key, counts, total in snapshot:
+            key = tuple(key)
+            if len(counts) != len(self.buckets):
+                # Written by a process with other buckets, e.g. before a deploy
+                continue
+            merged, merged_total = values.get(key, ([0] * len(self.buckets), 0.0))
+            values[key] = ([a + b for a, b in zip(merged, counts)], merged_total + total)
+
+    def samples(self, values):
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}'
+
+
+class Registry:
+    """Metrics of this process, and of every process sharing a snapshot directory
+
+    Counters and histograms live in memory. Once share() names a
+    directory, each process writes a snapshot of its values there every
+    `interval` seconds, and render() adds up the snapshots of every other
+    process with its own values. A process that exits folds its snapshot
+    into EXITED_SNAPSHOT and removes its own; those of processes that were
+    killed are folded in by the next process to flush. Whichever gunicorn
+    worker answers a scrape, the totals are those of the whole server,
+    shard and CLI processes included, at most `interval` seconds behind.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.directory = None
+        self.interval = None
+        self.lock = threading.Lock()
+        self.pid = None
+        self.path = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def share(self, directory, interval):
+        """Write this process's snapshots under `directory` and read the others' from there"""
+        with self.lock:
+            self.directory = directory
+            self.interval = interval
+            if self.pid == os.getpid():
+                return
+            # A forked or spawned process gets a snapshot file of its own
+            self.pid = os.getpid()
+            self.path = os.path.join(directory, f'{self.pid}-{uuid.uuid4().hex[:8]}.json')
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+        atexit.register(self.retire)
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self.pid == pid:
+            time.sleep(self.interval)
+            self.flush()
+            try:
+                self.fold_exited()
+            except OSError as e:
+                print(f"Could not fold metrics snapshots of exited processes: {e}")
+
+    def _snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def flush(self):
+        """Write this process's snapshot now"""
+        if self.path is None or self.pid != os.getpid():
+            return
+        try:
+            with self._locked(fcntl.LOCK_SH):
+                # Not once retire() has folded it in
+                if self.path is not None:
+                    write_atomic(self.path, json.dumps(self._snapshot()).encode('utf-8'))
+        except OSError as e:
+            print(f"Could not write metrics snapshot: {e}")
+
+    @contextmanager
+    def _locked(self, operation):
+        # Readers take it shared, so they never see a snapshot both folded
+        # in and still there, or neither
+        with open(os.path.join(self.directory, SNAPSHOT_LOCK), 'a') as lock:
+            fcntl.flock(lock, operation)
+            yield
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Removed, or not finished writing by an older version
+            return None
+
+    def _fold(self, snapshots, paths):
+        """Add `snapshots` to the exited processes' snapshot and remove `paths`; holding the lock"""
+        exited_path = os.path.join(self.directory, EXITED_SNAPSHOT)
+        exited = self._read(exited_path) or {}
+        folded = {}
+        for metric in self.metrics:
+            values = {}
+            for snapshot in [exited] + snapshots:
+                metric.combine(values, snapshot.get(metric.name, ()))
+            folded[metric.name] = metric.dump(values)
+        write_atomic(exited_path, json.dumps(folded).encode('utf-8'))
+        for path in paths:
+            os.remove(path)
+
+    def retire(self):
+        """Fold this process's values into the exited processes' snapshot, when it exits"""
+        if self.path is None or self.pid != os.getpid():
+            return
+        try:
+            with self._locked(fcntl.LOCK_EX):
+                paths = [self.path] if os.path.exists(self.path) else []
+                self._fold([self._snapshot()], paths)
+                self.path = None
+        except OSError as e:
+            print(f"Could not fold metrics snapshot: {e}")
+            self.flush()
+
+    def fold_exited(self):
+        """Fold in the snapshots of processes that died without doing it themselves"""
+        dead = []
+        for path in glob.glob(os.path.join(self.directory, '*-*.json')):
+            try:
+                os.kill(int(os.path.basename(path).split('-')[0]), 0)
+            except ProcessLookupError:
+                dead.append(path)
+            except (ValueError, OSError):
+                continue
+        if not dead:
+            return
+        with self._locked(fcntl.LOCK_EX):
+            snapshots, paths = [], []
+            for path in dead:
+                snapshot = self._read(path)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+                    paths.append(path)
+            self._fold(snapshots, paths)
+
+    def collect(self):
+        """Values of every metric, by name, summed over the processes sharing the directory"""
+        values = {metric.name: {} for metric in self.metrics}
+        snapshots = [self._snapshot()]
+        if self.directory and self.pid == os.getpid():
+            try:
+                with self._locked(fcntl.LOCK_SH):
+                    for path in glob.glob(os.path.join(self.directory, '*.json')):
+                        if path != self.path:
+                            snapshots.append(self._read(path) or {})
+            except OSError as e:
+                print(f"Could not read metrics snapshots: {e}")
+        for snapshot in snapshots:
+            for metric in self.metrics:
+                metric.combine(values[metric.name], snapshot.get(metric.name, ()))
+        return values
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        values = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples(values[metric.name]))
+        return '\n'.join(lines) + '\n'
+
+
+def clear_snapshots(directory):
+    """Remove the snapshots of earlier processes, e.g. when the server starts over"""
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'scrape_stage_seconds', 'Time spent in each scrape stage', ['stage']))
+SCRAPE_EVENTS = registry.register(Counter(
+    'scrape_events', 'Scrape events such as API calls, cache hits and rows written', ['event']))
+FETCH_TTFB_SECONDS = registry.register(Histogram(
+    'scrape_fetch_ttfb_seconds', 'Time from sending a page request until its response headers arrived',
+    ['host']))
+REQUEST_SECONDS = registry.register(Histogram(
+    'http_request_duration_seconds', 'Time to produce a response, per route', ['route', 'method', 'status']))
+WRITE_BATCH_SIZE = registry.register(Histogram(
+    'db_write_batch_size', 'Writes committed together by the writer thread', buckets=(1, 2, 4, 8, 16, 32, 64)))
+WRITE_BATCH_SECONDS = registry.register(Histogram(
+    'db_write_batch_seconds', 'Time to run and commit one batch of writes'))
+
+
+# Runs the current thread is timing stages for; RunPool hands them on to its threads
+_active_runs = contextvars.ContextVar('active_runs', default=())
+
+
+class RunStages:
+    """Per-stage seconds and event counts of one scrape run
+
+    Stages count toward the runs entered on the thread that times them,
+    or on the thread that submitted its work to a RunPool, so runs going
+    on at the same time, such as the weekly scrape and a refresh, each
+    collect only their own.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.events = {}
+        self._token = None
+
+    def __enter__(self):
+        self._token = _active_runs.set(_active_runs.get() + (self,))
+        return self
+
+    def __exit__(self, *exc):
+        _active_runs.reset(self._token)
+
+    @staticmethod
+    def active():
+        return _active_runs.get()
+
+    def merge(self, breakdown):
+        """Add in a to_dict() breakdown, such as one of a part of the run done in another process"""
+        with self._lock:
+            for name, stage in breakdown['stages'].items():
+                self.seconds[name] = self.seconds.get(name, 0.0) + stage['seconds']
+                self.calls[name] = self.calls.get(name, 0) + stage['calls']
+            for event, amount in breakdown['events'].items():
+                self.events[event] = self.events.get(event, 0) + amount
+
+    def to_dict(self):
+        return {
+            'stages': {
+                name: {'seconds': round(self.seconds[name], 4), 'calls': self.calls[name]}
+                for name in sorted(self.seconds, key=self.seconds.get, reverse=True)
+            },
+            'events': dict(sorted(self.events.items()))
+        }
+
+
+class RunPool(ThreadPoolExecutor):
+    """ThreadPoolExecutor whose tasks count toward the runs of the thread submitting them"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        runs = _active_runs.get()
+
+        def run_task():
+            token = _active_runs.set(runs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _active_runs.reset(token)
+
+        return super().submit(run_task)
+
+
+def record_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    for run in RunStages.active():
+        with RunStages._lock:
+            run.seconds[name] = run.seconds.get(name, 0.0) + seconds
+            run.calls[name] = run.calls.get(name, 0) + 1
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one occurrence of a scrape stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def count(event, amount=1):
+    """Count a scrape event, globally and for the runs in progress"""
+    SCRAPE_EVENTS.inc(amount, event=event)
+    for run in RunStages.active():
+        with RunStages._lock:
+            run.events[event] = run.events.get(event, 0) + amount
+
+
+def sleep(seconds):
+    """time.sleep that shows up as the 'sleep' stage"""
+    with stage('sleep'):
+        time.sleep(seconds)
@@ -0,0 +1,155 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+
+from regions import DEFAULT_REGION
+
+db = SQLAlchemy()
+
+class Restaurant(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    # Key of the regions.REGIONS entry the restaurant was scraped for
+    region = db.Column(db.String(20), nullable=False, default=DEFAULT_REGION, server_default=DEFAULT_REGION)
+    name = db.Column(db.String(255), nullable=False, index=True)
+    address = db.Column(db.String(500), nullable=False)
+    openrice_url = db.Column(db.String(500))
+    date_added = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # One of districts.DISTRICTS, matched from the address when the row is written
+    district = db.Column(db.String(40))
+    # From the restaurant's own page where the listing gave none (see enrich.py)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    cuisine = db.Column(db.String(255))
+    
+    # (region, name, address) identifies a restaurant; inserts skip rows that
+    # already exist. A region's pages, whole or filtered to a district, are
+    # read in (name, id) order straight off an index, as id is the rowid
+    # every SQLite index ends with.
+    __table_args__ = (
+        db.Index('uq_restaurant_region_name_address', 'region', 'name', 'address', unique=True),
+        db.Index('ix_restaurant_region_name', 'region', 'name'),
+        db.Index('ix_restaurant_region_district_name', 'region', 'district', 'name'),
+    )
+    
+    def __repr__(self):
+        return f'<Restaurant {self.name}>'
+
+class RestaurantStaging(db.Model):
+    """A scrape's restaurants on their way into the restaurant table
+
+    Written in chunks under one `batch` id, then moved over in one
+    statement (see app.store_restaurants) and cleared.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    batch = db.Column(db.String(32), nullable=False, index=True)
+    region = db.Column(db.String(20), nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+    address = db.Column(db.String(500), nullable=False)
+    openrice_url = db.Column(db.String(500))
+    date_added = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False)
+    district = db.Column(db.String(40))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    cuisine = db.Column(db.String(255))
+
+class ScrapingLog(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    region = db.Column(db.String(20), nullable=False, default=DEFAULT_REGION, server_default=DEFAULT_REGION)
+    restaurants_found = db.Column(db.Integer, default=0)
+    status = db.Column(db.String(100), default='success')
+    message = db.Column(db.Text)
+    # JSON breakdown of the run: seconds and calls per stage, event counts
+    stages = db.Column(db.Text)
+    
+    __table_args__ = (
+        # A region's latest entry is the last key of its range
+        db.Index('ix_scraping_log_region_timestamp', 'region', 'timestamp'),
+    )
+
+class RefreshJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    # 'refresh' while queued or running and NULL afterwards; being unique,
+    # it lets only one job be in flight across all workers
+    active = db.Column(db.String(20), unique=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    # Bumped by the worker running the job while it is alive
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    restaurants_found = db.Column(db.Integer)
+    message = db.Column(db.Text)
+    
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'restaurants_found': self.restaurants_found,
+            'message': self.message
+        }
+
+class SchedulerLease(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(255))
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class PlaceDetails(db.Model):
+    place_id = db.Column(db.String(255), primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_used = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class EnrichmentCache(db.Model):
+    """Details read from a restaurant's OpenRice page, keyed by URL so each page is fetched once
+    
+    status is 'ok', or 'missing' when the page is gone or has no address;
+    missing pages are tried again after a while.
+    """
+    url = db.Column(db.String(500), primary_key=True)
+    status = db.Column(db.String(20), nullable=False)
+    address = db.Column(db.String(500))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    cuisine = db.Column(db.String(255))
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class DedupeKey(db.Model):
+    """LSH bucket keys of stored restaurants (see dedupe.py), so new listings
+    are only compared with the restaurants sharing a bucket"""
+    id = db.Column(db.Integer, primary_key=True)
+    band_key = db.Column(db.BigInteger, nullable=False, index=True)
+    restaurant_id = db.Column(db.Integer, nullable=False, index=True)
+
+class RestaurantHistory(db.Model):
+    """Every restaurant ever found, kept when it leaves the current week
+
+    Rows are only appended. iso_week is the ISO week, in the region's
+    timezone, the restaurant was first found in, e.g. '2026-W42', and
+    leads the index so one week's rows are read as a single index range.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    region = db.Column(db.String(20), nullable=False, default=DEFAULT_REGION, server_default=DEFAULT_REGION)
+    iso_week = db.Column(db.String(8), nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+    address = db.Column(db.String(500), nullable=False)
+    openrice_url = db.Column(db.String(500))
+    district = db.Column(db.String(100), nullable=False)
+    first_seen = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_restaurant_history_week_district', 'iso_week', 'district'),
+        db.Index('uq_restaurant_history_region_name_address', 'region', 'name', 'address', unique=True),
+    )
+
+class WeeklyDistrictRollup(db.Model):
+    """New openings per region, ISO week and district, kept up to date as history is appended"""
+    region = db.Column(db.String(20), primary_key=True)
+    iso_week = db.Column(db.String(8), primary_key=True)
+    district = db.Column(db.String(100), primary_key=True)
+    new_openings = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker hitting the same API"""
+
+    def __init__(self, rate, capacity=None):
+        # rate is tokens per second; capacity is the allowed burst size
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then consume them"""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry_after_seconds(value):
+    """Seconds a Retry-After header asks to wait (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class HostThrottle:
+    """Spacing between requests to each host that follows how the host responds
+
+    Healthy responses shrink the delay step by step towards min_delay.
+    429, 403 and 5xx responses double it (at least to the Retry-After
+    the host asked for) up to max_delay, and `breaker_threshold` of them
+    in a row open the host's circuit for `cooldown` seconds, during which
+    no request should be sent to it. A Retry-After longer than max_delay
+    opens the circuit for that long straight away rather than waiting it
+    out. Retries come out of one budget shared by all hosts, so a bad run
+    ends instead of retrying forever.
+    """
+
+    THROTTLED = {403, 429}
+
+    def __init__(self, min_delay, max_delay, initial_delay, retry_budget,
+                 breaker_threshold, cooldown, speedup=0.75, rng=None):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.retries_left = retry_budget
+        self.breaker_threshold = breaker_threshold
+        self.cooldown = cooldown
+        self.speedup = speedup
+        self.rng = rng or random.Random()
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def _state(self, host):
+        return self.hosts.setdefault(host, {
+            'delay': self.initial_delay, 'next_at': 0.0, 'failures': 0, 'open_until': 0.0
+        })
+
+    def is_open(self, host):
+        """True while the host's circuit is open and it should be left alone"""
+        with self.lock:
+            return time.monotonic() < self._state(host)['open_until']
+
+    def reserve(self, host):
+        """Claim the next slot for `host`; returns the seconds to wait for it"""
+        with self.lock:
+            state = self._state(host)
+            now = time.monotonic()
+            start = max(now, state['next_at'])
+            # Jitter keeps the spacing from looking machine-made
+            state['next_at'] = start + state['delay'] * self.rng.uniform(0.8, 1.2)
+            return start - now
+
+    def record(self, host, status, retry_after=None):
+        """Adjust the host's delay to a response; True if it was throttled or failed"""
+        with self.lock:
+            state = self._state(host)
+            if status in self.THROTTLED or status >= 500:
+                now = time.monotonic()
+                state['failures'] += 1
+                state['delay'] = min(self.max_delay, max(state['delay'] * 2, retry_after or 0.0))
+                state['next_at'] = max(state['next_at'], now + min(self.max_delay, retry_after or 0.0))
+                if retry_after and retry_after > self.max_delay:
+                    state['open_until'] = max(state['open_until'], now + retry_after)
+                elif state['failures'] >= self.breaker_threshold:
+                    state['open_until'] = max(state['open_until'], now + self.cooldown)
+                return True
+            state['failures'] = 0
+            state['delay'] = max(self.min_delay, state['delay'] * self.speedup)
+            return False
+
+    def backoff(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (from 0), or None when out of budget
+
+        Exponential with full jitter, never shorter than Retry-After nor
+        longer than max_delay.
+        """
+        with self.lock:
+            if self.retries_left <= 0:
+                return None
+            self.retries_left -= 1
+        delay = self.rng.uniform(0, min(self.max_delay, self.initial_delay * 2 ** (attempt + 1)))
+        return min(self.max_delay, max(delay, retry_after or 0.0))
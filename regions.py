@@ -0,0 +1,85 @@
+import os
+
+import pytz
+
+import districts
+from geosweep import HONG_KONG_BOUNDS, MACAU_BOUNDS
+
+OPENRICE_BASE_URL = 'https://www.openrice.com'
+
+
+class Region:
+    """One OpenRice region: where its pages live, what area to search and when to scrape it
+
+    `key` is the region's path on OpenRice ('/en/hongkong') and the
+    value stored with its restaurants. Weekly windows and ISO weeks are
+    counted in `timezone`; `schedule` holds the CronTrigger fields of its
+    weekly scrape, in that timezone.
+    """
+
+    def __init__(self, key, name, timezone, bounds, districts, schedule,
+                 city_names, new_condition_id=2005, search_terms=()):
+        self.key = key
+        self.name = name
+        self.timezone = timezone
+        self.bounds = bounds
+        self.districts = districts
+        self.schedule = schedule
+        # How addresses name the city itself; a bare city name is no address
+        self.city_names = city_names
+        self.new_condition_id = new_condition_id
+        self.search_terms = search_terms
+
+    @property
+    def tz(self):
+        return pytz.timezone(self.timezone)
+
+    def openrice_url(self, path=''):
+        return f'{OPENRICE_BASE_URL}/en/{self.key}{path}'
+
+    def __repr__(self):
+        return f'<Region {self.key}>'
+
+
+SEARCH_TERMS = ('新開張', 'new opening', '2025', 'newly opened', 'grand opening')
+
+HONG_KONG = Region(
+    'hongkong', 'Hong Kong', 'Asia/Hong_Kong', HONG_KONG_BOUNDS, districts.HONG_KONG,
+    schedule={'day_of_week': 'mon', 'hour': 2, 'minute': 0},
+    city_names=('Hong Kong', 'HK', '香港'),
+    search_terms=SEARCH_TERMS,
+)
+MACAU = Region(
+    'macau', 'Macau', 'Asia/Macau', MACAU_BOUNDS, districts.MACAU,
+    schedule={'day_of_week': 'mon', 'hour': 3, 'minute': 0},
+    city_names=('Macau', 'Macao', '澳門'),
+    search_terms=SEARCH_TERMS + ('新開業',),
+)
+
+REGIONS = {region.key: region for region in (HONG_KONG, MACAU)}
+
+# Rows stored before regions existed are Hong Kong's, as are requests naming none
+DEFAULT_REGION = HONG_KONG.key
+
+# Regions scraped, as a comma-separated list of keys
+SCRAPE_REGIONS = [key.strip().lower() for key in os.environ.get('SCRAPE_REGIONS', DEFAULT_REGION).split(',') if key.strip()]
+
+
+def region_named(name):
+    """The region with a key or name such as 'macau' or 'Hong Kong', or None"""
+    folded = (name or '').strip().casefold()
+    for region in REGIONS.values():
+        if folded in (region.key, region.name.casefold()):
+            return region
+    return None
+
+
+def enabled_regions():
+    """Regions listed in SCRAPE_REGIONS, in that order; unknown keys are skipped"""
+    enabled = []
+    for key in SCRAPE_REGIONS:
+        if key in REGIONS:
+            enabled.append(REGIONS[key])
+        else:
+            print(f"Unknown region in SCRAPE_REGIONS: {key}")
+    return enabled
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import timedelta
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from files import write_atomic
+
+# Query parameters left out of fixture keys: credentials, and values that
+# change on every run without changing the response
+IGNORED_PARAMS = {'key', 'client', 'signature', 'sessiontoken'}
+
+# Response headers kept with a fixture
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Retry-After')
+
+
+def fixture_key(method, url):
+    """Stable name of a request: method and URL without credentials, params sorted"""
+    parts = urlsplit(url)
+    params = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in IGNORED_PARAMS)
+    canonical = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(params), ''))
+    return hashlib.sha256(f"{method} {canonical}".encode('utf-8')).hexdigest()
+
+
+class FixtureStore:
+    """Recorded responses on disk: a JSON file of status and headers, and the raw body"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _paths(self, key):
+        directory = os.path.join(self.directory, key[:2])
+        return os.path.join(directory, key + '.json'), os.path.join(directory, key + '.body')
+
+    def save(self, method, url, status, headers, body):
+        meta_path, body_path = self._paths(fixture_key(method, url))
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        write_atomic(body_path, body)
+        write_atomic(meta_path, json.dumps({
+            'method': method,
+            'url': url,
+            'status': status,
+            'headers': {name: headers[name] for name in STORED_HEADERS if name in headers},
+        }, indent=1).encode('utf-8'))
+
+    def load(self, method, url):
+        meta_path, body_path = self._paths(fixture_key(method, url))
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return meta, body
+
+
+def _response(request, status, headers, body, connection):
+    response = requests.Response()
+    response.status_code = status
+    response.reason = HTTPStatus(status).phrase
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = body
+    response.url = request.url
+    response.request = request
+    response.connection = connection
+    return response
+
+
+class RecordingAdapter(BaseAdapter):
+    """Transport adapter that sends requests as usual and saves every response as a fixture"""
+
+    def __init__(self, directory, inner=None):
+        super().__init__()
+        self.store = FixtureStore(directory)
+        self.inner = inner or HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        response = self.inner.send(request, **kwargs)
+        self.store.save(request.method, request.url, response.status_code, response.headers, response.content)
+        return response
+
+    def close(self):
+        self.inner.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter that answers from recorded fixtures without network access
+
+    Each response is held back for `latency` seconds, give or take
+    `jitter`, and a share `error_rate` of requests fails with a 503, so
+    retries and error handling run as they would against the real sites.
+    Requests with no fixture get a 404. The time every request took is
+    kept in `timings`.
+    """
+
+    def __init__(self, directory, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        super().__init__()
+        self.store = FixtureStore(directory)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.timings = []
+        self.misses = 0
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        with self.lock:
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            failed = self.rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            response = _response(request, 503, {'Retry-After': '1'}, b'', self)
+        else:
+            stored = self.store.load(request.method, request.url)
+            if stored is None:
+                with self.lock:
+                    self.misses += 1
+                response = _response(request, 404, {}, b'', self)
+            else:
+                meta, body = stored
+                response = _response(request, meta['status'], meta['headers'], body, self)
+        elapsed = time.perf_counter() - start
+        response.elapsed = timedelta(seconds=elapsed)
+        with self.lock:
+            self.timings.append(elapsed)
+        return response
+
+    def close(self):
+        pass
+
+
+def fixture_adapter(mode, directory, inner=None, **replay_options):
+    """Adapter for HTTP_FIXTURES_MODE: 'record', 'replay', or None for live traffic
+
+    `replay_options` (latency, jitter, error_rate, seed) only apply to replays.
+    """
+    if not mode:
+        return inner
+    if mode == 'record':
+        return RecordingAdapter(directory, inner)
+    if mode == 'replay':
+        return ReplayAdapter(directory, **replay_options)
+    raise ValueError(f"HTTP_FIXTURES_MODE must be 'record' or 'replay', not {mode!r}")
+
+
+def mount(session, adapter):
+    """Route a session's http and https traffic through `adapter`"""
+    if adapter is not None:
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+    return session
@@ -0,0 +1,673 @@
+from flask import current_app
+from datetime import datetime, timedelta
+import random
+import math
+import os
+import json
+import multiprocessing
+import googlemaps
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, as_completed
+from models import db, PlaceDetails
+from writer import write, submit_write
+from ratelimit import TokenBucket, HostThrottle, retry_after_seconds
+from extractor import extract_listing, extract_search_results, extract_details, EXTRACTOR_VERSION
+from httpcache import cached_session, ParseCache
+import replay
+from dedupe import dedupe_restaurants
+from enrich import enrich_restaurants
+from geosweep import sweep
+import metrics
+import regions
+from urllib.parse import urlsplit
+
+# Google Places quota: requests per second shared by all fetch workers of a
+# process, so each region shard has its own
+PLACES_QPS = float(os.environ.get('PLACES_QPS', 10))
+PLACES_MAX_WORKERS = int(os.environ.get('PLACES_MAX_WORKERS', 8))
+# Nearby search returns at most 3 pages of 20 results
+PLACES_MAX_PAGES = int(os.environ.get('PLACES_MAX_PAGES', 3))
+# Sweep tiles are not split below this search radius, in metres
+PLACES_MIN_TILE_RADIUS = float(os.environ.get('PLACES_MIN_TILE_RADIUS', 300))
+PLACES_BASE_URL = os.environ.get('PLACES_BASE_URL', 'https://maps.googleapis.com')
+PAGE_TOKEN_DELAY = 2
+PAGE_TOKEN_RETRIES = 3
+PLACE_DETAIL_FIELDS = [
+    'name', 'formatted_address', 'opening_hours',
+    'website', 'url', 'type', 'business_status'
+]
+
+places_limiter = TokenBucket(PLACES_QPS)
+
+# Place details cache: entries older than the TTL are fetched again,
+# least recently used entries are evicted beyond the size limit
+PLACES_CACHE_TTL_DAYS = float(os.environ.get('PLACES_CACHE_TTL_DAYS', 30))
+PLACES_CACHE_MAX_ENTRIES = int(os.environ.get('PLACES_CACHE_MAX_ENTRIES', 5000))
+
+# HTTP_CACHE_OFFLINE=1 replays the on-disk page cache without network access
+HTTP_CACHE_OFFLINE = os.environ.get('HTTP_CACHE_OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+# HTTP_FIXTURES_MODE=record saves every Places and OpenRice response under
+# HTTP_FIXTURES_DIR; =replay answers from those fixtures instead, holding
+# each response back by the given latency and failing a share with 503s
+HTTP_FIXTURES_MODE = os.environ.get('HTTP_FIXTURES_MODE', '').lower() or None
+HTTP_FIXTURES_DIR = os.environ.get('HTTP_FIXTURES_DIR', 'fixtures')
+HTTP_REPLAY_LATENCY_MS = float(os.environ.get('HTTP_REPLAY_LATENCY_MS', 0))
+HTTP_REPLAY_JITTER_MS = float(os.environ.get('HTTP_REPLAY_JITTER_MS', 0))
+HTTP_REPLAY_ERROR_RATE = float(os.environ.get('HTTP_REPLAY_ERROR_RATE', 0))
+
+# OpenRice pacing: the delay between requests to a host starts at
+# OPENRICE_INITIAL_DELAY and shrinks towards OPENRICE_MIN_DELAY while
+# responses are healthy; 429/403/5xx double it up to OPENRICE_MAX_DELAY.
+# A run retries at most OPENRICE_RETRY_BUDGET times in total, and
+# OPENRICE_BREAKER_THRESHOLD failures in a row leave the host alone for
+# OPENRICE_BREAKER_COOLDOWN seconds. A host asking for a Retry-After
+# beyond OPENRICE_MAX_DELAY is left alone for the rest of the run instead.
+OPENRICE_MIN_DELAY = float(os.environ.get('OPENRICE_MIN_DELAY', 0.5))
+OPENRICE_INITIAL_DELAY = float(os.environ.get('OPENRICE_INITIAL_DELAY', 2))
+OPENRICE_MAX_DELAY = float(os.environ.get('OPENRICE_MAX_DELAY', 60))
+OPENRICE_RETRY_BUDGET = int(os.environ.get('OPENRICE_RETRY_BUDGET', 6))
+OPENRICE_BREAKER_THRESHOLD = int(os.environ.get('OPENRICE_BREAKER_THRESHOLD', 3))
+OPENRICE_BREAKER_COOLDOWN = float(os.environ.get('OPENRICE_BREAKER_COOLDOWN', 600))
+
+# OpenRice pages are fetched by OPENRICE_FETCH_WORKERS threads sharing one
+# keep-alive session of at most OPENRICE_MAX_CONNECTIONS connections per
+# host, and parsed by OPENRICE_PARSE_WORKERS processes (0 parses inline)
+OPENRICE_FETCH_WORKERS = int(os.environ.get('OPENRICE_FETCH_WORKERS', 4))
+OPENRICE_MAX_CONNECTIONS = int(os.environ.get('OPENRICE_MAX_CONNECTIONS', 4))
+OPENRICE_PARSE_WORKERS = int(os.environ.get('OPENRICE_PARSE_WORKERS', 2))
+
+# With more than one region, the first is scraped in this process and each
+# of the others as a shard in a worker process of its own, with its own
+# OpenRice throttle and Places quota, at most REGION_WORKERS shards at a
+# time; 0 scrapes them one after another in this process
+REGION_WORKERS = int(os.environ.get('REGION_WORKERS', 4))
+
+# POLITENESS_DELAYS=0 skips the pauses between pages and page token
+# retries; only meant for replays and benchmarks
+POLITENESS_DELAYS = os.environ.get('POLITENESS_DELAYS', '1').lower() not in ('0', 'false', 'no')
+
+_fixture_transport = None
+
+def fixture_transport():
+    """The recording or replaying transport adapter, or None for live traffic"""
+    global _fixture_transport
+    if HTTP_FIXTURES_MODE and _fixture_transport is None:
+        _fixture_transport = replay.fixture_adapter(
+            HTTP_FIXTURES_MODE, HTTP_FIXTURES_DIR,
+            latency=HTTP_REPLAY_LATENCY_MS / 1000,
+            jitter=HTTP_REPLAY_JITTER_MS / 1000,
+            error_rate=HTTP_REPLAY_ERROR_RATE
+        )
+    return _fixture_transport
+
+def pause(seconds):
+    """Politeness delay, skipped when POLITENESS_DELAYS is off"""
+    if POLITENESS_DELAYS:
+        metrics.sleep(seconds)
+
+def places_client(api_key):
+    """googlemaps client sending its requests through the fixture transport, if any"""
+    session = replay.mount(requests.Session(), fixture_transport())
+    # places_limiter paces requests; keep the client's own throttle from
+    # adding a lower limit (it insists on ints)
+    quota = max(1, math.ceil(PLACES_QPS))
+    return googlemaps.Client(
+        key=api_key, base_url=PLACES_BASE_URL, requests_session=session,
+        queries_per_second=quota, queries_per_minute=quota * 60
+    )
+
+class PlaceDetailsCache:
+    """Google Places details cache keyed by place_id, stored next to Restaurant"""
+    
+    # Stay well below SQLite's bound parameter limit
+    chunk_size = 500
+    
+    def __init__(self, ttl_days, max_entries):
+        self.ttl = timedelta(days=ttl_days)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+    
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+    
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+    
+    def stats(self):
+        return f"place details cache: {self.hits} hits, {self.misses} misses ({self.hit_ratio():.0%} hit ratio)"
+    
+    def get_many(self, place_ids):
+        """Return cached, unexpired details for the given place ids"""
+        place_ids = list(place_ids)
+        now = datetime.utcnow()
+        fresh_after = now - self.ttl
+        found = {}
+        
+        for i in range(0, len(place_ids), self.chunk_size):
+            chunk = place_ids[i:i + self.chunk_size]
+            rows = PlaceDetails.query.filter(
+                PlaceDetails.place_id.in_(chunk),
+                PlaceDetails.fetched_at >= fresh_after
+            ).all()
+            for row in rows:
+                found[row.place_id] = json.loads(row.payload)
+        if found:
+            # Nothing waits for the recency update
+            touched = list(found)
+            submit_write(lambda: self.touch(touched, now))
+        
+        self.hits += len(found)
+        self.misses += len(place_ids) - len(found)
+        metrics.count('places_cache_hit', len(found))
+        metrics.count('places_cache_miss', len(place_ids) - len(found))
+        return found
+    
+    def touch(self, place_ids, now):
+        """Mark entries as used; a write for the writer queue"""
+        for i in range(0, len(place_ids), self.chunk_size):
+            PlaceDetails.query.filter(
+                PlaceDetails.place_id.in_(place_ids[i:i + self.chunk_size])
+            ).update({'last_used': now}, synchronize_session=False)
+    
+    def put_many(self, details_by_id):
+        """Store freshly fetched details and evict anything over the limits"""
+        def store():
+            now = datetime.utcnow()
+            for place_id, details in details_by_id.items():
+                db.session.merge(PlaceDetails(
+                    place_id=place_id,
+                    payload=json.dumps(details),
+                    fetched_at=now,
+                    last_used=now
+                ))
+            self.evict()
+        
+        write(store)
+    
+    def evict(self):
+        """Drop expired entries, then the least recently used beyond max_entries, in the caller's transaction"""
+        PlaceDetails.query.filter(
+            PlaceDetails.fetched_at < datetime.utcnow() - self.ttl
+        ).delete(synchronize_session=False)
+        
+        overflow = db.session.query(PlaceDetails.place_id).order_by(
+            PlaceDetails.last_used.desc()
+        ).offset(self.max_entries).subquery()
+        PlaceDetails.query.filter(
+            PlaceDetails.place_id.in_(db.select(overflow.c.place_id))
+        ).delete(synchronize_session=False)
+
+places_cache = PlaceDetailsCache(PLACES_CACHE_TTL_DAYS, PLACES_CACHE_MAX_ENTRIES)
+
+def search_tile(gmaps, tile):
+    """Nearby restaurants in one sweep tile, as (places, saturated)
+    
+    A full first page on a tile that can still be split is reported as
+    saturated straight away, its quarters get searched instead of paging
+    through it. Only the smallest tiles follow next_page_token.
+    """
+    places = []
+    page_token = None
+    
+    for page in range(PLACES_MAX_PAGES):
+        for attempt in range(PAGE_TOKEN_RETRIES + 1):
+            with metrics.stage('rate_limit_wait'):
+                places_limiter.acquire()
+            metrics.count('places_nearby_call')
+            try:
+                with metrics.stage('places_nearby'):
+                    if page_token:
+                        places_result = gmaps.places_nearby(page_token=page_token)
+                    else:
+                        places_result = gmaps.places_nearby(
+                            location=tile.center,
+                            radius=tile.radius,
+                            type='restaurant',
+                            language='en',
+                            keyword='new restaurant'
+                        )
+                break
+            except googlemaps.exceptions.ApiError as e:
+                # A fresh next_page_token takes a moment to become valid
+                if page_token and e.status == 'INVALID_REQUEST' and attempt < PAGE_TOKEN_RETRIES:
+                    pause(PAGE_TOKEN_DELAY)
+                    continue
+                raise
+        
+        places.extend(places_result.get('results', []))
+        page_token = places_result.get('next_page_token')
+        if not page_token:
+            return places, False
+        if tile.splittable:
+            return places, True
+        pause(PAGE_TOKEN_DELAY)
+    
+    return places, True
+
+def fetch_place_details(gmaps, place_id):
+    """Fetch details for one place, waiting for a token from the shared quota"""
+    with metrics.stage('rate_limit_wait'):
+        places_limiter.acquire()
+    metrics.count('places_details_call')
+    with metrics.stage('places_details'):
+        return gmaps.place(place_id, fields=PLACE_DETAIL_FIELDS)
+
+def fetch_page(session, url, **kwargs):
+    """GET a page through the response cache, timing the fetch and its time to first byte"""
+    with metrics.stage('openrice_fetch'):
+        response = session.get(url, **kwargs)
+    metrics.count('openrice_fetch')
+    if getattr(response, 'from_cache', False):
+        metrics.count('openrice_cache_hit')
+    if not HTTP_CACHE_OFFLINE:
+        # requests' elapsed runs from sending the request to parsing the
+        # response headers: connecting (DNS included), TLS and server time
+        metrics.FETCH_TTFB_SECONDS.observe(response.elapsed.total_seconds(), host=urlsplit(url).hostname)
+    return response
+
+def openrice_throttle():
+    """A fresh per-run pacing controller for OpenRice hosts"""
+    return HostThrottle(
+        OPENRICE_MIN_DELAY, OPENRICE_MAX_DELAY, OPENRICE_INITIAL_DELAY,
+        OPENRICE_RETRY_BUDGET, OPENRICE_BREAKER_THRESHOLD, OPENRICE_BREAKER_COOLDOWN
+    )
+
+def fetch_politely(throttle, session, url, **kwargs):
+    """GET a page at the pace `throttle` sets for its host
+    
+    Throttled and failed responses are retried after an exponential
+    backoff (at least the Retry-After asked for) while the run's retry
+    budget lasts; the last response is returned either way. Returns None
+    without sending anything while the host's circuit is open.
+    """
+    if HTTP_CACHE_OFFLINE:
+        return fetch_page(session, url, **kwargs)
+    
+    host = urlsplit(url).hostname
+    attempt = 0
+    while True:
+        if throttle.is_open(host):
+            metrics.count('openrice_circuit_open')
+            print(f"{host} keeps refusing requests, skipping {url}")
+            return None
+        pause(throttle.reserve(host))
+        
+        try:
+            response = fetch_page(session, url, **kwargs)
+        except requests.RequestException as e:
+            response, error = None, e
+            throttled = throttle.record(host, 503)
+            retry_after = None
+        else:
+            retry_after = retry_after_seconds(response.headers.get('Retry-After'))
+            throttled = throttle.record(host, response.status_code, retry_after)
+        if not throttled:
+            return response
+        
+        metrics.count('openrice_throttled')
+        # An open circuit (e.g. a Retry-After beyond OPENRICE_MAX_DELAY) is not waited out
+        delay = None if throttle.is_open(host) else throttle.backoff(attempt, retry_after)
+        if delay is None:
+            if response is None:
+                raise error
+            return response
+        status = response.status_code if response is not None else error
+        print(f"Got {status} for {url}, retrying in {delay:.1f}s")
+        metrics.count('openrice_retry')
+        pause(delay)
+        attempt += 1
+
+def openrice_session(http_cache_dir):
+    """Pooled keep-alive session for every OpenRice fetch of a run, behind the response cache"""
+    inner = fixture_transport() or HTTPAdapter(
+        pool_connections=2, pool_maxsize=OPENRICE_MAX_CONNECTIONS, pool_block=True
+    )
+    return cached_session(http_cache_dir, offline=HTTP_CACHE_OFFLINE, inner=inner)
+
+_parse_pool = None
+
+# The app of a region shard process (see start_shard)
+_shard_app = None
+
+def parse_pool():
+    """Worker processes for page parsing, started on first use and kept for later runs
+    
+    Shard processes parse inline: they are already one process per region.
+    """
+    global _parse_pool
+    if _parse_pool is None and OPENRICE_PARSE_WORKERS > 0 and _shard_app is None:
+        # spawn, as forking a process that runs threads can copy held locks
+        _parse_pool = ProcessPoolExecutor(OPENRICE_PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _parse_pool
+
+# Extractor for each kind of OpenRice page
+PAGE_EXTRACTORS = {
+    'listing': extract_listing,
+    'search': extract_search_results,
+    'details': extract_details,
+}
+
+def parse_page(parse_cache, response, kind, **options):
+    """Restaurants on a listing or search page, or a restaurant page's details, parsed in the worker pool
+    
+    `options` go to the page's extractor. Pages with the same body as on
+    a previous run come from the parse cache.
+    """
+    results = parse_cache.get(response, kind)
+    if results is not None:
+        print(f"Page unchanged since last run, reusing parsed results for {response.url}")
+        return results
+    extract = PAGE_EXTRACTORS[kind]
+    pool = parse_pool()
+    results = None
+    with metrics.stage('parse'):
+        if pool:
+            try:
+                results = pool.submit(extract, response.content, **options).result()
+            except BrokenExecutor as e:
+                print(f"Parse workers unavailable, parsing in process: {e}")
+        if results is None:
+            results = extract(response.content, **options)
+    parse_cache.put(response, kind, results)
+    return results
+
+def search_google_maps_restaurants(region=regions.HONG_KONG):
+    """Search for new restaurants in a region using Google Maps API"""
+    # Debug: Show all env vars starting with GOOGLE
+    print("Environment variables check:")
+    for key in os.environ:
+        if 'GOOGLE' in key.upper():
+            print(f"Found env var: {key}")
+    
+    api_key = os.environ.get('GOOGLE_MAPS_API_KEY2')
+    if not api_key:
+        print("WARNING: No Google Maps API key found in environment variables")
+        print(f"Looking for: GOOGLE_MAPS_API_KEY2")
+        print(f"Available keys: {list(os.environ.keys())[:5]}...")  # Show first 5 keys
+        return []
+    
+    print(f"Google Maps API key found: {api_key[:8]}...")
+    
+    try:
+        gmaps = places_client(api_key)
+        new_restaurants = []
+        
+        with metrics.RunPool(max_workers=PLACES_MAX_WORKERS) as pool:
+            # Cover the whole territory, splitting tiles only where results are dense;
+            # places found again by overlapping tiles are only looked up once
+            places, sweep_stats = sweep(
+                lambda tile: search_tile(gmaps, tile),
+                region.bounds, PLACES_MIN_TILE_RADIUS, pool
+            )
+            print(f"Searched {sweep_stats['tiles']} tiles ({sweep_stats['split']} split) "
+                  f"in {region.name}, found {len(places)} places")
+            candidates = {place['place_id']: place for place in places}
+            
+            # Only call the Places API for new or expired place ids
+            places_cache.reset_stats()
+            try:
+                with metrics.stage('places_cache'):
+                    cached = places_cache.get_many(candidates)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Place details cache unavailable: {e}")
+                cached = {}
+            
+            missing = [place_id for place_id in candidates if place_id not in cached]
+            print(f"Fetching details for {len(missing)} of {len(candidates)} places "
+                  f"({PLACES_MAX_WORKERS} workers, {PLACES_QPS:g} req/s)")
+            details_futures = {
+                place_id: pool.submit(fetch_place_details, gmaps, place_id)
+                for place_id in missing
+            }
+            
+            fetched = {}
+            for place_id, place in candidates.items():
+                if place_id in cached:
+                    details = cached[place_id]
+                else:
+                    try:
+                        details = details_futures[place_id].result()
+                    except Exception as e:
+                        print(f"Error fetching place details for {place.get('name')}: {e}")
+                        continue
+                    if details['status'] == 'OK':
+                        fetched[place_id] = details
+                
+                if details['status'] == 'OK':
+                    result = details['result']
+                    
+                    # Only include if business is operational
+                    if result.get('business_status') == 'OPERATIONAL':
+                        # Always use Google Maps URL for consistency
+                        restaurant_name = result.get('name', '')
+                        
+                        # Create Google Maps search URL using place name and address
+                        search_query = f"{restaurant_name} {place.get('vicinity', '')} {region.name}"
+                        restaurant_url = f"https://www.google.com/maps/search/{search_query.replace(' ', '+')}"
+                        
+                        address = result.get('formatted_address', '')
+                        for city in region.city_names:
+                            address = address.replace(f', {city}', '')
+                        location = place.get('geometry', {}).get('location', {})
+                        new_restaurants.append({
+                            'name': restaurant_name,
+                            'address': address,
+                            'url': restaurant_url,
+                            'latitude': location.get('lat'),
+                            'longitude': location.get('lng')
+                        })
+                        print(f"Found via Google Maps: {restaurant_name}")
+        
+        if fetched:
+            try:
+                with metrics.stage('places_cache'):
+                    places_cache.put_many(fetched)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Could not store place details: {e}")
+        print(places_cache.stats())
+        
+        return new_restaurants
+        
+    except Exception as e:
+        print(f"Google Maps API error: {e}")
+        return []
+
+def scrape_openrice_new_restaurants(region=regions.HONG_KONG):
+    """Get a region's new restaurants from Google Maps first, then fall back to OpenRice scraping"""
+    
+    # Try Google Maps API first
+    new_restaurants = search_google_maps_restaurants(region)
+    
+    if new_restaurants:
+        print(f"Got {len(new_restaurants)} restaurants in {region.name} from Google Maps")
+        return new_restaurants
+    
+    # Fall back to OpenRice scraping
+    print(f"Google Maps unavailable, trying OpenRice scraping for {region.name}...")
+    http_cache_dir = current_app.config['HTTP_CACHE_DIR']
+    session = openrice_session(http_cache_dir)
+    parse_cache = ParseCache(http_cache_dir, EXTRACTOR_VERSION)
+    throttle = openrice_throttle()
+    
+    # Rotate user agents for better success
+    user_agents = [
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
+        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    ]
+    
+    headers = {
+        'User-Agent': random.choice(user_agents),
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9,zh-TW;q=0.8,zh;q=0.7',
+        'Accept-Encoding': 'gzip, deflate',
+        'DNT': '1',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        'Sec-Fetch-Site': 'none',
+        'Sec-Fetch-User': '?1',
+        'Cache-Control': 'no-cache',
+        'Pragma': 'no-cache',
+    }
+    
+    new_restaurants = []
+    
+    # Try the new restaurant condition URL first
+    urls_to_check = [
+        region.openrice_url(f'/restaurants?sortBy=ORScoreDesc&conditionId={region.new_condition_id}'),  # New restaurants!
+        region.openrice_url(f'/restaurants?conditionId={region.new_condition_id}'),
+    ]
+    
+    # First, try to establish a session by visiting the home page
+    try:
+        home_response = fetch_politely(throttle, session, region.openrice_url(), headers=headers, timeout=15)
+    except:
+        pass
+    headers['Referer'] = region.openrice_url()
+    
+    def fetch_listing(url):
+        print(f"Scraping: {url}")
+        response = fetch_politely(throttle, session, url, headers=headers, timeout=30)
+        if response is None:
+            return []
+        if response.status_code != 200:
+            print(f"Got status code {response.status_code} for {url}")
+            return []
+        return parse_page(parse_cache, response, 'listing', region=region.key)
+    
+    def fetch_search(term):
+        search_url = region.openrice_url(f'/restaurants?what={term}')
+        response = fetch_politely(throttle, session, search_url,
+                                  headers=dict(headers, **{'User-Agent': random.choice(user_agents)}), timeout=20)
+        if response is None or response.status_code != 200:
+            return []
+        # Look for any restaurant links in search results (exclude navigation)
+        return parse_page(parse_cache, response, 'search', region=region.key)
+    
+    # The pages are independent: fetch them concurrently, the throttle
+    # still spaces out requests to the host
+    with metrics.RunPool(max_workers=OPENRICE_FETCH_WORKERS) as pool:
+        for url, future in [(url, pool.submit(fetch_listing, url)) for url in urls_to_check]:
+            try:
+                page_restaurants = future.result()
+            except Exception as e:
+                print(f"Error scraping {url}: {e}")
+                continue
+            for restaurant in page_restaurants:
+                print(f"Found: {restaurant['name']} - {restaurant['address']}")
+            new_restaurants.extend(page_restaurants)
+        
+        # Try alternative approach: search for specific new restaurants
+        if len(new_restaurants) < 5:
+            print("Trying search approach...")
+            for term, future in [(term, pool.submit(fetch_search, term)) for term in region.search_terms]:
+                try:
+                    search_results = future.result()
+                except Exception as e:
+                    print(f"Search error: {e}")
+                    continue
+                for restaurant in search_results:
+                    print(f"Found via search: {restaurant['name']}")
+                new_restaurants.extend(search_results)
+    
+    # Links and search hits come without an address; read it from each
+    # restaurant's page so they can be told apart and deduplicated
+    def fetch_restaurant_page(url):
+        return fetch_politely(throttle, session, url, headers=headers, timeout=20)
+    
+    with metrics.stage('enrich'):
+        new_restaurants = enrich_restaurants(
+            new_restaurants, fetch_restaurant_page,
+            lambda response: parse_page(parse_cache, response, 'details')
+        )
+    
+    # Remove duplicates, including the same place listed on several pages under variant names
+    with metrics.stage('dedupe'):
+        new_restaurants = dedupe_restaurants(new_restaurants)
+    
+    # If still no restaurants found from scraping, add real recent restaurants from OpenRice
+    if not new_restaurants and region is regions.HONG_KONG:
+        # These are actual new restaurants from OpenRice HK as of 2025
+        real_restaurants = [
+            {'name': 'Hotaru', 'address': 'Shop 301, 3/F, K11 Art Mall, 18 Hanoi Road, Tsim Sha Tsui', 'url': 'https://www.openrice.com/en/hongkong/r-hotaru-tsim-sha-tsui-japanese-omakase-r776234'},
+            {'name': 'Carna by Dario Cecchini', 'address': 'Shop OTE 401A, 4/F, Ocean Terminal, Harbour City, Tsim Sha Tsui', 'url': 'https://www.openrice.com/en/hongkong/r-carna-by-dario-cecchini-tsim-sha-tsui-italian-steak-house-r749615'},
+            {'name': 'NOJO', 'address': '1-13 Elgin Street, Central', 'url': 'https://www.openrice.com/en/hongkong/r-nojo-central-japanese-ramen-r772543'},
+            {'name': 'HEXA', 'address': 'Shop 301-305, 3/F, K11 MUSEA, Victoria Dockside, Tsim Sha Tsui', 'url': 'https://www.openrice.com/en/hongkong/r-hexa-tsim-sha-tsui-guangdong-dim-sum-r692876'},
+            {'name': 'TONO DAIKIYA', 'address': 'Shop 2201, 2/F, Gateway Arcade, Harbour City, Tsim Sha Tsui', 'url': 'https://www.openrice.com/en/hongkong/r-tono-daikiya-tsim-sha-tsui-japanese-sushi-r768432'},
+            {'name': 'Mr. Steak Buffet à la minute', 'address': '13/F, V Point, 18 Tang Lung Street, Causeway Bay', 'url': 'https://www.openrice.com/en/hongkong/r-mr-steak-buffet-a-la-minute-causeway-bay-international-buffet-r772102'},
+            {'name': 'Maison Beirut', 'address': 'G/F, 65 Hollywood Road, Central', 'url': 'https://www.openrice.com/en/hongkong/r-maison-beirut-central-lebanese-r765891'},
+            {'name': 'Morton\'s of Chicago', 'address': 'Shop 411-413, Level 4, Ocean Centre, Harbour City, Tsim Sha Tsui', 'url': 'https://www.openrice.com/en/hongkong/r-mortons-of-chicago-tsim-sha-tsui-american-steak-house-r769234'},
+        ]
+        new_restaurants.extend(real_restaurants)
+        print("Added real new restaurants from OpenRice")
+    
+    return new_restaurants
+
+def start_shard():
+    """Initializer of region shard processes: an app of their own, for the caches and writes"""
+    global _shard_app
+    from app import create_app
+    _shard_app = create_app()
+
+def scrape_region(region_key):
+    """Scrape one region: (restaurants, stage breakdown, place details cache stats or '')"""
+    region = regions.REGIONS[region_key]
+    with metrics.RunStages() as run:
+        with metrics.stage('scrape'):
+            restaurants = scrape_openrice_new_restaurants(region)
+    cache_stats = places_cache.stats() if places_cache.hits or places_cache.misses else ''
+    return restaurants, run.to_dict(), cache_stats
+
+def run_shard(region_key):
+    """Scrape one region in a shard process"""
+    with _shard_app.app_context():
+        result = scrape_region(region_key)
+        # Writes queued without waiting, such as cache recency updates, land before the process is let go
+        write(lambda: None)
+    # The parent's /metrics reads the shard's counters from its snapshot
+    metrics.registry.flush()
+    return result
+
+def scrape_regions(region_list):
+    """Yield (region, result) for each region as its scrape finishes
+    
+    result is what scrape_region returns, or the exception the scrape
+    raised. With several regions, the first is scraped in this process
+    while the others run in shard processes, so no region waits for
+    another and each paces its own requests; the first does not wait
+    for the shards to start either.
+    """
+    def scrape_here(region):
+        try:
+            return region, scrape_region(region.key)
+        except Exception as e:
+            return region, e
+    
+    if len(region_list) < 2 or REGION_WORKERS <= 0:
+        for region in region_list:
+            yield scrape_here(region)
+        return
+    
+    # spawn, as for the parse pool
+    with ProcessPoolExecutor(
+        min(len(region_list) - 1, REGION_WORKERS),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=start_shard
+    ) as pool:
+        futures = {pool.submit(run_shard, region.key): region for region in region_list[1:]}
+        yield scrape_here(region_list[0])
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = e
+            yield futures[future], result
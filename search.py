@@ -0,0 +1,90 @@
+import re
+import unicodedata
+
+from dedupe import CJK_CHARACTER
+
+# FTS5 index over restaurant_history. unicode61 splits text on spaces and
+# punctuation but keeps a run of Chinese characters as one token, so
+# text is passed through cjk_segment() first: every CJK character becomes
+# its own token, and a Chinese query is matched as a phrase of single
+# characters. Prefix indexes keep "ka*" style queries off a full scan of
+# the term list.
+TABLE = 'restaurant_search'
+
+CREATE_TABLE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+    name, address,
+    content='restaurant_history', content_rowid='id',
+    tokenize="unicode61 remove_diacritics 2", prefix='2 3'
+)
+"""
+
+# External content tables are kept in sync by the application; these
+# triggers do it for every write to restaurant_history
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS restaurant_history_search_insert AFTER INSERT ON restaurant_history BEGIN
+        INSERT INTO {TABLE}(rowid, name, address)
+        VALUES (new.id, cjk_segment(new.name), cjk_segment(new.address));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS restaurant_history_search_delete AFTER DELETE ON restaurant_history BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, name, address)
+        VALUES ('delete', old.id, cjk_segment(old.name), cjk_segment(old.address));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS restaurant_history_search_update AFTER UPDATE ON restaurant_history BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, name, address)
+        VALUES ('delete', old.id, cjk_segment(old.name), cjk_segment(old.address));
+        INSERT INTO {TABLE}(rowid, name, address)
+        VALUES (new.id, cjk_segment(new.name), cjk_segment(new.address));
+    END
+    """,
+]
+
+# 'rebuild' would index the raw content, so backfills segment it here
+BACKFILL = f"""
+INSERT INTO {TABLE}(rowid, name, address)
+SELECT id, cjk_segment(name), cjk_segment(address) FROM restaurant_history
+"""
+
+# Name matches count ten times as much as address matches
+RANK = f'bm25({TABLE}, 10.0, 1.0)'
+
+_CJK = re.compile(f'({CJK_CHARACTER})')
+_QUERY_TOKEN = re.compile(CJK_CHARACTER + r'+|[^\W_]+')
+
+
+def cjk_segment(text):
+    """Text with each CJK character spaced out into its own token
+
+    Full-width forms are folded to ASCII on the way, so 'ＮＯＪＯ' is indexed as 'NOJO'.
+    """
+    if text is None:
+        return None
+    text = unicodedata.normalize('NFKC', text)
+    if text.isascii():
+        return text
+    return _CJK.sub(r' \1 ', text)
+
+
+def match_query(text):
+    """FTS5 MATCH expression for a search box query, or None if it has no terms
+
+    Every word must match, and the last letters typed may be the start
+    of a longer word. Chinese runs must appear as written.
+    """
+    terms = []
+    for token in _QUERY_TOKEN.findall(unicodedata.normalize('NFKC', text or '')):
+        if _CJK.match(token):
+            terms.append('"' + ' '.join(token) + '"')
+        else:
+            terms.append(f'"{token}"*')
+    return ' '.join(terms) or None
+
+
+def register_functions(dbapi_connection):
+    """Make cjk_segment() available to the triggers on a new SQLite connection"""
+    dbapi_connection.create_function('cjk_segment', 1, cjk_segment, deterministic=True)
@@ -0,0 +1,144 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from flask import current_app
+
+from models import db
+import metrics
+
+# Most writes committed together in one transaction
+WRITE_BATCH_MAX = int(os.environ.get('WRITE_BATCH_MAX', 64))
+
+# A caller gives up on a write after waiting WRITE_TIMEOUT seconds for it,
+# below gunicorn's 30 s worker timeout, so a request stuck behind other
+# writes answers with an error instead of getting its worker killed
+WRITE_TIMEOUT = float(os.environ.get('WRITE_TIMEOUT', 20))
+
+
+class WriteQueue:
+    """Runs every database write of a process on one thread, committing queued writes together
+
+    A write is a function that changes db.session without committing.
+    Writes queued while a batch runs make up the next batch, which commits
+    once. If a batch fails, its writes are run again one at a time, so
+    only the failing one reports the error. With a single writer per
+    process, SQLite's write lock is only contended between processes,
+    where the busy timeout makes them take turns; writes are kept short
+    (large stores are split up, see app.store_restaurants) so no process
+    holds the lock for long.
+    """
+
+    def __init__(self, app, batch_max=WRITE_BATCH_MAX, timeout=WRITE_TIMEOUT):
+        self.app = app
+        self.batch_max = batch_max
+        self.timeout = timeout
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def submit(self, fn):
+        """Queue `fn` and return a Future for its result"""
+        future = Future()
+        if threading.current_thread() is self.thread:
+            # A write made from inside another write joins its transaction
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._ensure_thread()
+        self.jobs.put((fn, future))
+        return future
+
+    def run(self, fn):
+        """Run `fn` on the writer thread, wait for its batch to commit and return its result
+
+        Raises TimeoutError if it has not started within the timeout; it
+        is then dropped from the queue. A write already running is waited
+        on for one more timeout, after which it may still commit.
+        """
+        future = self.submit(fn)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise TimeoutError(f'Write not started after {self.timeout:g}s, the writer is busy') from None
+        return future.result(self.timeout)
+
+    def _ensure_thread(self):
+        with self.lock:
+            # A forked worker inherits the attribute but not the thread, and
+            # a writer thread that died would leave every write waiting
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                if self.pid != os.getpid():
+                    self.jobs = queue.Queue()
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self._loop, name='db-writer', daemon=True)
+                self.thread.start()
+
+    def _loop(self):
+        with self.app.app_context():
+            while True:
+                batch = []
+                while len(batch) < self.batch_max:
+                    try:
+                        fn, future = self.jobs.get() if not batch else self.jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    # Writes their callers gave up on are skipped
+                    if future.set_running_or_notify_cancel():
+                        batch.append((fn, future))
+                if not batch:
+                    continue
+                start = time.perf_counter()
+                try:
+                    self._run_batch(batch)
+                except Exception as e:
+                    # E.g. the rollback itself failed; the thread lives on for later writes
+                    print(f"Database writer failed: {e}")
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                metrics.WRITE_BATCH_SIZE.observe(len(batch))
+                metrics.WRITE_BATCH_SECONDS.observe(time.perf_counter() - start)
+                # Hand the connection back to the pool between batches
+                try:
+                    db.session.remove()
+                except Exception as e:
+                    print(f"Could not release the writer's connection: {e}")
+
+    def _run_batch(self, batch):
+        if len(batch) > 1:
+            try:
+                results = [fn() for fn, _ in batch]
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+                return
+
+        for fn, future in batch:
+            try:
+                result = fn()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+
+def write(fn):
+    """Run `fn` as a write of the current app and return its result, raising what it raised"""
+    return current_app.extensions['writer'].run(fn)
+
+
+def submit_write(fn):
+    """Queue `fn` as a write of the current app without waiting for it"""
+    return current_app.extensions['writer'].submit(fn)